@@ -0,0 +1,225 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import ast
+import re
+from dataclasses import dataclass, field
+
+DEFAULT_CHUNK_TOKENS = 2000
+
+_CLOSING = re.compile(r"^(?:[}\])]|end\b|fi\b|done\b|esac\b)")
+_PYTHON_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text, at roughly four characters per
+    token like the rate limiter does.
+
+    Args:
+        text (str): The text to estimate.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return 1 + len(text) // 4
+
+
+@dataclass(frozen=True)
+class Chunks:
+    """
+    A source split into chunks. Joining the chunks gives back the source,
+    context is the start of the source that precedes its first definition,
+    such as imports and module level constants.
+    """
+    chunks: list[str] = field(default_factory=list)
+    context: str = ""
+
+    def messages(self, instruction: str = "") -> list[str]:
+        """
+        Build the message to query the model with for each chunk. A single
+        chunk is sent after the instruction, otherwise chunks are numbered
+        and every chunk after the first is sent with the context.
+
+        Args:
+            instruction (str): The request to send with every chunk, if any.
+
+        Returns:
+            list[str]: The messages, in the order of the chunks.
+        """
+        if len(self.chunks) == 1:
+            return ["\n\n".join(filter(None, [instruction, self.chunks[0]]))]
+
+        messages = []
+        for index, chunk in enumerate(self.chunks):
+            parts = [instruction] if instruction else []
+            if index and self.context:
+                parts.append(
+                    "The start of the file, for reference only:\n"
+                    + self.context.rstrip("\n")
+                )
+
+            parts.append(f"Part {index + 1} of {len(self.chunks)} of the file:\n" + chunk)
+            messages.append("\n\n".join(parts))
+
+        return messages
+
+
+def _python_boundaries(source: str) -> tuple[list[int], int]:
+    """
+    Find the lines where top level statements start in Python source.
+    Decorators belong to the definition they decorate and comments to the
+    statement that follows them.
+
+    Args:
+        source (str): The source to split.
+
+    Raises:
+        SyntaxError: If the source is not valid Python.
+
+    Returns:
+        tuple[list[int], int]: The zero based start lines of the statements
+            and the line of the first definition.
+    """
+    lines = source.splitlines(keepends=True)
+    boundaries = []
+    first_definition = len(lines)
+    for node in ast.parse(source).body:
+        start = min(
+            [node.lineno]
+            + [decorator.lineno for decorator in getattr(node, "decorator_list", [])]
+        ) - 1
+        while start > 0 and lines[start - 1].lstrip().startswith("#"):
+            start -= 1
+        if boundaries and start <= boundaries[-1]:
+            continue
+
+        boundaries.append(start)
+        if isinstance(node, _PYTHON_DEFINITIONS):
+            first_definition = min(first_definition, start)
+
+    return boundaries, first_definition
+
+
+def _block_boundaries(lines: list[str]) -> tuple[list[int], int]:
+    """
+    Find the lines where top level blocks start in source of any language.
+    A block starts at an unindented line that follows a blank line, unless
+    it closes the block before it.
+
+    Args:
+        lines (list[str]): The lines of the source to split.
+
+    Returns:
+        tuple[list[int], int]: The zero based start lines of the blocks and
+            the line of the first block after the header.
+    """
+    boundaries = [0]
+    for number in range(1, len(lines)):
+        line = lines[number]
+        if (
+            line.strip()
+            and not line[0].isspace()
+            and not _CLOSING.match(line)
+            and not lines[number - 1].strip()
+        ):
+            boundaries.append(number)
+
+    return boundaries, boundaries[1] if len(boundaries) > 1 else len(lines)
+
+
+def _pack(pieces: list[str], budget: int) -> list[str]:
+    """
+    Pack consecutive pieces into chunks within the budget. A piece larger
+    than the budget is split on line boundaries.
+
+    Args:
+        pieces (list[str]): The pieces to pack, in order.
+        budget (int): The number of tokens a chunk may hold.
+
+    Returns:
+        list[str]: The chunks.
+    """
+    chunks: list[str] = []
+    current = ""
+    for piece in pieces:
+        if estimate_tokens(piece) > budget:
+            pieces_of_piece = piece.splitlines(keepends=True)
+        else:
+            pieces_of_piece = [piece]
+
+        for part in pieces_of_piece:
+            if current and estimate_tokens(current + part) > budget:
+                chunks.append(current)
+                current = ""
+            current += part
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+def split_source(source: str, budget: int = DEFAULT_CHUNK_TOKENS) -> Chunks:
+    """
+    Split source code into chunks within a token budget on syntactic
+    boundaries, so that functions and classes are kept whole where they fit.
+    Python is split on its top level statements, other languages and
+    source that does not parse on unindented blocks.
+
+    Args:
+        source (str): The source to split.
+        budget (int): The number of tokens a chunk may hold.
+
+    Returns:
+        Chunks: The chunks and the context shared by them. Source within
+            the budget is returned as a single chunk without context.
+    """
+    if estimate_tokens(source) <= budget:
+        return Chunks([source])
+
+    lines = source.splitlines(keepends=True)
+    try:
+        boundaries, header = _python_boundaries(source)
+    except (SyntaxError, ValueError):
+        boundaries, header = _block_boundaries(lines)
+
+    if not boundaries or boundaries[0] != 0:
+        boundaries.insert(0, 0)
+
+    pieces = [
+        "".join(lines[start:end])
+        for start, end in zip(boundaries, boundaries[1:] + [len(lines)])
+    ]
+
+    context = "".join(lines[:header])
+    context_budget = budget // 2
+    while context and estimate_tokens(context) > context_budget:
+        context = context[:context.rstrip("\n").rfind("\n") + 1]
+
+    return Chunks(_pack(pieces, budget), context)
+
+
+__all__ = [
+    "Chunks",
+    "DEFAULT_CHUNK_TOKENS",
+    "estimate_tokens",
+    "split_source",
+]
@@ -0,0 +1,185 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional, TextIO, Union
+
+from shell_craft.services import (AsyncCoalescingService, AsyncOpenAIService,
+                                  OpenAISettings)
+
+BatchService = Union[AsyncOpenAIService, AsyncCoalescingService]
+
+
+@dataclass
+class BatchRequest:
+    index: int
+    request: str
+    id: Optional[str] = None
+    prompt: Optional[str] = None
+    model: Optional[str] = None
+    temperature: Optional[float] = None
+    count: Optional[int] = None
+
+    @staticmethod
+    def from_line(index: int, line: str) -> "BatchRequest":
+        """
+        Parses a line of a batch file. A line is either a JSON object with
+        a "request" key and optional "id", "prompt", "model", "temperature"
+        and "count" overrides, or plain text used as the request.
+
+        Args:
+            index (int): The position of the request in the batch.
+            line (str): The line to parse.
+
+        Raises:
+            ValueError: If the line is a JSON object without a request.
+
+        Returns:
+            BatchRequest: The parsed request.
+        """
+        line = line.strip()
+        if not line.startswith('{'):
+            return BatchRequest(index=index, request=line)
+
+        fields = json.loads(line)
+        if not isinstance(fields.get('request'), str):
+            raise ValueError('Batch request is missing a "request" string.')
+
+        return BatchRequest(
+            index=index,
+            request=fields['request'],
+            id=fields.get('id'),
+            prompt=fields.get('prompt'),
+            model=fields.get('model'),
+            temperature=fields.get('temperature'),
+            count=fields.get('count'),
+        )
+
+
+async def _run_batch(
+    lines: Iterable[str],
+    service: BatchService,
+    settings: Callable[[BatchRequest], OpenAISettings],
+    output: TextIO,
+    workers: int,
+    ordered: bool,
+) -> int:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    pending: dict[int, dict] = {}
+    written = 0
+    failures = 0
+
+    def write(index: int, record: dict) -> None:
+        nonlocal written
+        if not ordered:
+            output.write(json.dumps(record) + '\n')
+            return
+
+        pending[index] = record
+        while written in pending:
+            output.write(json.dumps(pending.pop(written)) + '\n')
+            written += 1
+
+    async def work() -> None:
+        nonlocal failures
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+
+            index, line = item
+            record: dict = {'index': index}
+            try:
+                request = BatchRequest.from_line(index, line)
+                if request.id is not None:
+                    record['id'] = request.id
+                record['request'] = request.request
+                record['results'] = await service.with_settings(
+                    settings(request)
+                ).query(request.request)
+            except Exception as error:
+                failures += 1
+                record['error'] = str(error) or type(error).__name__
+
+            write(index, record)
+
+    tasks = [asyncio.ensure_future(work()) for _ in range(workers)]
+    try:
+        index = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            await queue.put((index, line))
+            index += 1
+
+        for _ in tasks:
+            await queue.put(None)
+
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await service.aclose()
+
+    return failures
+
+
+def run_batch(
+    lines: Iterable[str],
+    service: BatchService,
+    settings: Callable[[BatchRequest], OpenAISettings],
+    output: TextIO,
+    workers: int = 8,
+    ordered: bool = True,
+) -> int:
+    """
+    Processes a batch of requests concurrently and writes one JSON line
+    per request to the output. Each line holds the "index" of the request,
+    its "id" if one was given, the "request" and either the "results" or
+    the "error" that occurred. Blank lines are skipped.
+
+    Lines are read lazily and at most workers requests are in flight, so
+    arbitrarily large batches run in bounded memory when unordered. When
+    ordered, results are written in input order as soon as every earlier
+    request has finished.
+
+    Args:
+        lines (Iterable[str]): The lines of the batch.
+        service (BatchService): The service to query with.
+        settings (Callable[[BatchRequest], OpenAISettings]): Builds the
+            settings for a request, applying its overrides.
+        output (TextIO): The stream to write results to.
+        workers (int): The number of requests to process concurrently.
+        ordered (bool): Whether to write results in input order.
+
+    Returns:
+        int: The number of requests that failed.
+    """
+    return asyncio.run(
+        _run_batch(lines, service, settings, output, max(1, workers), ordered)
+    )
+
+
+__all__ = [
+    "BatchRequest",
+    "run_batch",
+]
@@ -0,0 +1,350 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import IO, Optional
+
+from .execute import _kill_group, shell_arguments
+
+DEFAULT_RUNS = 5
+_CHUNK_SIZE = 64 * 1024
+_RSS_TOLERANCE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Measurement:
+    """
+    A single run of a command. Peak RSS is in bytes and None where the
+    system does not report it, the digest identifies the output.
+    """
+    wall: float
+    status: Optional[int]
+    rss: Optional[int]
+    digest: str
+    size: int
+
+
+@dataclass
+class Candidate:
+    """
+    A generated command and the measurements of its runs. A child process
+    inherits the peak RSS of the process that forked it, so sizes close to the
+    floor measured for a trivial command are not attributed to the command.
+    """
+    command: str
+    runs: list[Measurement] = field(default_factory=list)
+    floor: int = 0
+
+    @property
+    def median(self) -> float:
+        walls = sorted(run.wall for run in self.runs)
+        middle = len(walls) // 2
+        if len(walls) % 2:
+            return walls[middle]
+
+        return (walls[middle - 1] + walls[middle]) / 2
+
+    @property
+    def peak_rss(self) -> Optional[int]:
+        sizes = [run.rss for run in self.runs if run.rss is not None]
+        if not sizes or max(sizes) <= self.floor + _RSS_TOLERANCE:
+            return None
+
+        return max(sizes)
+
+    @property
+    def status(self) -> Optional[int]:
+        """
+        Get the exit status shared by every run, the first failing status if
+        any run failed, or None if a run timed out.
+        """
+        for run in self.runs:
+            if run.status != 0:
+                return run.status
+
+        return 0
+
+    @property
+    def digest(self) -> Optional[str]:
+        """
+        Get the digest of the output, None if the runs did not agree.
+        """
+        digests = {run.digest for run in self.runs}
+        return digests.pop() if len(digests) == 1 else None
+
+    @property
+    def succeeded(self) -> bool:
+        return bool(self.runs) and self.status == 0
+
+
+def _max_rss(usage) -> int:
+    """
+    Get the peak resident set size from resource usage in bytes, which is
+    reported in kilobytes on Linux and in bytes on macOS.
+
+    Args:
+        usage (resource.struct_rusage): The resource usage.
+
+    Returns:
+        int: The peak resident set size in bytes.
+    """
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def _prepare(directory: str, sample: Optional[str]) -> Optional[str]:
+    """
+    Copy the sample into a scratch directory. A sample directory has its
+    contents copied, a sample file is copied under its own name.
+
+    Args:
+        directory (str): The scratch directory.
+        sample (Optional[str]): The path of the sample, if any.
+
+    Returns:
+        Optional[str]: The copy of the sample file to use as stdin, if the
+            sample is a file.
+    """
+    if not sample:
+        return None
+
+    if os.path.isdir(sample):
+        shutil.copytree(sample, directory, dirs_exist_ok=True)
+        return None
+
+    return shutil.copy(sample, directory)
+
+
+def measure(
+    command: str,
+    shell: str = "bash",
+    sample: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> Measurement:
+    """
+    Run a command once in a fresh scratch directory and measure it. The
+    output is hashed as it is read instead of being kept in memory.
+
+    Args:
+        command (str): The command to run.
+        shell (str): The shell to run the command with.
+        sample (Optional[str]): A file or directory copied into the scratch
+            directory, a file is also given to the command as stdin.
+        timeout (Optional[float]): The number of seconds after which the
+            command is killed with everything it started, defaults to None
+            for no limit.
+
+    Returns:
+        Measurement: The wall time, exit status, peak RSS and output digest.
+    """
+    with tempfile.TemporaryDirectory(prefix="shell-craft-") as directory:
+        stdin_path = _prepare(directory, sample)
+        stdin = open(stdin_path, "rb") if stdin_path else subprocess.DEVNULL
+        try:
+            start = time.perf_counter()
+            process = subprocess.Popen(
+                shell_arguments(shell, command),
+                cwd=directory,
+                stdin=stdin,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                start_new_session=os.name == "posix",
+            )
+        finally:
+            if stdin_path:
+                stdin.close()
+
+        digest = hashlib.sha256()
+        size = 0
+        deadline = start + timeout if timeout else None
+        timer = None
+        if deadline:
+            timer = threading.Timer(timeout, _kill_group, [process])
+            timer.start()
+
+        try:
+            while chunk := process.stdout.read1(_CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+        finally:
+            process.stdout.close()
+            if timer:
+                timer.cancel()
+
+        rss = None
+        if hasattr(os, "wait4"):
+            _, wait_status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(wait_status)
+            rss = _max_rss(usage)
+        else:
+            process.wait()
+        wall = time.perf_counter() - start
+
+    timed_out = bool(deadline) and time.perf_counter() >= deadline
+    return Measurement(
+        wall=wall,
+        status=None if timed_out else process.returncode,
+        rss=rss,
+        digest=digest.hexdigest(),
+        size=size,
+    )
+
+
+def benchmark(
+    commands: list[str],
+    shell: str = "bash",
+    runs: int = DEFAULT_RUNS,
+    sample: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> list[Candidate]:
+    """
+    Measure every command a number of times, after a discarded warm up run,
+    and rank them. Commands are run in turns so a slowly changing system
+    affects them alike.
+
+    Args:
+        commands (list[str]): The commands to measure, duplicates are run
+            once.
+        shell (str): The shell to run the commands with.
+        runs (int): The number of measured runs per command.
+        sample (Optional[str]): A file or directory to run the commands on.
+        timeout (Optional[float]): The number of seconds after which a run
+            is killed.
+
+    Returns:
+        list[Candidate]: The candidates, ranked by rank.
+    """
+    floor = measure(":", shell).rss or 0
+    candidates = [
+        Candidate(command, floor=floor) for command in dict.fromkeys(commands)
+    ]
+    for candidate in candidates:
+        measure(candidate.command, shell, sample, timeout)
+
+    for _ in range(runs):
+        for candidate in candidates:
+            if candidate.runs and candidate.runs[-1].status is None:
+                continue
+            candidate.runs.append(measure(candidate.command, shell, sample, timeout))
+
+    return rank(candidates)
+
+
+def rank(candidates: list[Candidate]) -> list[Candidate]:
+    """
+    Order candidates by median wall time and then peak RSS. Candidates that
+    failed come last.
+
+    Args:
+        candidates (list[Candidate]): The measured candidates.
+
+    Returns:
+        list[Candidate]: The ranked candidates.
+    """
+    return sorted(
+        candidates,
+        key=lambda candidate: (
+            not candidate.succeeded,
+            candidate.median if candidate.runs else float("inf"),
+            candidate.peak_rss or 0,
+        ),
+    )
+
+
+def consensus(candidates: list[Candidate]) -> Optional[str]:
+    """
+    Get the output digest most successful candidates agree on.
+
+    Args:
+        candidates (list[Candidate]): The measured candidates.
+
+    Returns:
+        Optional[str]: The most common digest, or None if no candidate
+            succeeded with consistent output.
+    """
+    digests = Counter(
+        candidate.digest
+        for candidate in candidates
+        if candidate.succeeded and candidate.digest
+    )
+    return digests.most_common(1)[0][0] if digests else None
+
+
+def _format_size(size: Optional[int]) -> str:
+    if size is None:
+        return "-"
+
+    for unit in ["B", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+
+    return f"{size:.1f}GiB"
+
+
+def write_ranking(candidates: list[Candidate], output: IO[str]) -> None:
+    """
+    Write the ranked candidates as a table, with whether their output
+    agrees with the output most candidates produced.
+
+    Args:
+        candidates (list[Candidate]): The ranked candidates.
+        output (IO[str]): The stream to write to.
+    """
+    reference = consensus(candidates)
+    print(
+        f"{'#':>2}  {'median':>10}  {'peak rss':>9}  {'status':>6}  {'output':<9}  command",
+        file=output,
+    )
+    for position, candidate in enumerate(candidates, 1):
+        if candidate.digest is None:
+            agreement = "unstable"
+        elif candidate.digest == reference:
+            agreement = "agrees"
+        else:
+            agreement = "differs"
+
+        status = "timeout" if candidate.status is None else str(candidate.status)
+        median = f"{candidate.median * 1000:.1f}ms" if candidate.runs else "-"
+        print(
+            f"{position:>2}  {median:>10}  {_format_size(candidate.peak_rss):>9}  "
+            f"{status:>6}  {agreement:<9}  {candidate.command}",
+            file=output,
+        )
+
+
+__all__ = [
+    "benchmark",
+    "Candidate",
+    "consensus",
+    "DEFAULT_RUNS",
+    "measure",
+    "Measurement",
+    "rank",
+    "write_ranking",
+]
@@ -18,14 +18,23 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+from argparse import BooleanOptionalAction
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional, Type
+from typing import Iterable, Optional, Type
 
-import shell_craft.prompts as prompts
+from shell_craft.chunking import DEFAULT_CHUNK_TOKENS
+from shell_craft.history import DEFAULT_HISTORY_PATH
+from shell_craft.prompts import REGISTRY
+from shell_craft.services.cache import DEFAULT_CACHE_TTL
+from shell_craft.services.retry import DEFAULT_MAX_RETRIES
+from shell_craft.services.openai.settings import (DEFAULT_POOL_SIZE,
+                                                  DEFAULT_TIMEOUT)
 
-from .prompt import get_calling_shell
-from .types import limited_float
+from .benchmark import DEFAULT_RUNS
+from .execute import DEFAULT_OUTPUT_LIMIT
+from .git_diff import DEFAULT_DIFF_CONTEXT
+from .types import comma_separated, limited_float
 
 
 class CommandRestriction(Enum):
@@ -47,7 +56,7 @@ class Command:
     action: Optional[str] = None
     help: Optional[str] = None
     nargs: Optional[str] = None
-    choices: Optional[list] = None
+    choices: Optional[Iterable] = None
     restrictions: Optional[dict[CommandRestriction, list]] = None
 
 @dataclass
@@ -57,6 +66,22 @@ class CommandGroup:
     restrictions: Optional[dict[CommandRestriction, list]] = None
     exclusive: Optional[bool] = False
 
+_MODELS = [
+    "gpt-4",
+    "gpt-4-0314",
+    "gpt-4-0613",
+    "gpt-4-1106",
+    "gpt-4-32k",
+    "gpt-4-32k-0314",
+    "gpt-4-32k-0613",
+    "gpt-3.5-turbo",
+    "gpt-3.5-turbo-0613",
+    "gpt-3.5-turbo-0301",
+    "gpt-3.5-turbo-1106",
+    'gpt-3.5-turbo-16k',
+    'gpt-3.5-turbo-16k-0613'
+]
+
 _COMMANDS = [
     CommandGroup(
         name="prompt_input",
@@ -79,9 +104,31 @@ _COMMANDS = [
                                                      'POWERSHELL_PROMPT']
                 }
             ),
+            Command(
+                flags=['--batch'],
+                dest='batch',
+                type=str,
+                action='store',
+                help='Process a file of requests, one per line, and write the results as JSON lines. Use - to read from stdin.',
+            ),
         ],
         exclusive=True
     ),
+    Command(
+        flags=['--unordered'],
+        dest='unordered',
+        action='store_true',
+        help='Write batch results as they complete instead of in input order.',
+    ),
+    Command(
+        flags=['--workers'],
+        dest='workers',
+        type=int,
+        config='shell_craft_workers',
+        default=8,
+        action='store',
+        help='The number of requests to process concurrently.',
+    ),
     Command(
         flags=['--api-key'],
         dest='api_key',
@@ -97,21 +144,7 @@ _COMMANDS = [
         default="gpt-3.5-turbo",
         action='store',
         help='The OpenAI model to use.',
-        choices=[
-            "gpt-4",
-            "gpt-4-0314",
-            "gpt-4-0613",
-            "gpt-4-1106",
-            "gpt-4-32k",
-            "gpt-4-32k-0314",
-            "gpt-4-32k-0613",
-            "gpt-3.5-turbo",
-            "gpt-3.5-turbo-0613",
-            "gpt-3.5-turbo-0301",
-            "gpt-3.5-turbo-1106",
-            'gpt-3.5-turbo-16k',
-            'gpt-3.5-turbo-16k-0613'
-        ]
+        choices=_MODELS,
     ),
     Command(
         flags=['-t', '--temperature'],
@@ -131,19 +164,109 @@ _COMMANDS = [
         action='store',
         help='The number of responses to generate.',
     ),
+    Command(
+        flags=['--stream'],
+        dest='stream',
+        action=BooleanOptionalAction,
+        help='Print responses as they are generated. Defaults to on when writing to a terminal.',
+    ),
+    Command(
+        flags=['--timeout'],
+        dest='timeout',
+        type=float,
+        config='openai_timeout',
+        default=DEFAULT_TIMEOUT,
+        action='store',
+        help='The number of seconds to wait for a response from OpenAI.',
+    ),
+    Command(
+        flags=['--pool-size'],
+        dest='pool_size',
+        type=int,
+        config='openai_pool_size',
+        default=DEFAULT_POOL_SIZE,
+        action='store',
+        help='The number of connections to OpenAI to keep alive.',
+    ),
+    Command(
+        flags=['--max-retries'],
+        dest='max_retries',
+        type=int,
+        config='openai_max_retries',
+        default=DEFAULT_MAX_RETRIES,
+        action='store',
+        help='The number of times to retry rate limited or failed requests.',
+    ),
+    Command(
+        flags=['--requests-per-minute'],
+        dest='requests_per_minute',
+        type=int,
+        config='openai_requests_per_minute',
+        action='store',
+        help='The maximum number of requests to send to OpenAI per minute.',
+    ),
+    Command(
+        flags=['--tokens-per-minute'],
+        dest='tokens_per_minute',
+        type=int,
+        config='openai_tokens_per_minute',
+        action='store',
+        help='The maximum number of tokens to send to OpenAI per minute.',
+    ),
+    Command(
+        flags=['--no-cache'],
+        dest='no_cache',
+        action='store_true',
+        help='Do not answer from or store responses in the response cache.',
+    ),
+    Command(
+        flags=['--cache-ttl'],
+        dest='cache_ttl',
+        type=int,
+        config='shell_craft_cache_ttl',
+        default=DEFAULT_CACHE_TTL,
+        action='store',
+        help='The number of seconds a cached response stays valid.',
+    ),
+    Command(
+        flags=['--exec-timeout'],
+        dest='exec_timeout',
+        type=float,
+        config='shell_craft_exec_timeout',
+        action='store',
+        help='The number of seconds after which a command executed in interactive mode is killed.',
+    ),
+    Command(
+        flags=['--output-limit'],
+        dest='output_limit',
+        type=int,
+        config='shell_craft_output_limit',
+        default=DEFAULT_OUTPUT_LIMIT,
+        action='store',
+        help='The number of bytes of command output to keep in memory in interactive mode.',
+    ),
+    Command(
+        flags=['--timings'],
+        dest='timings',
+        action='store_true',
+        help='Print how long each phase of the run took to stderr.',
+    ),
+    Command(
+        flags=['--trace'],
+        dest='trace',
+        type=str,
+        config='shellcraft_trace',
+        action='store',
+        help='Append the timings of each phase as JSON lines to this file.',
+    ),
     Command(
         flags=['--prompt'],
         dest='prompt',
         config='shell_craft_prompt',
         type=str,
-        choices=[
-            prompt.removesuffix('_PROMPT').lower()
-            for prompt in dir(prompts)
-            if prompt.endswith("PROMPT")
-        ],
-        default=get_calling_shell(),
+        choices=REGISTRY,
         action='store',
-        help='The type of prompt to use.',
+        help='The type of prompt to use. Defaults to the calling shell.',
         nargs='?',
     ),
     Command(
@@ -157,6 +280,63 @@ _COMMANDS = [
                                              'FEATURE_REQUEST_PROMPT']
         }
     ),
+    Command(
+        flags=['--rank-by-runtime'],
+        dest='rank_by_runtime',
+        action='store_true',
+        help='Run each generated command after confirmation and rank them by median wall time and peak memory.',
+        restrictions={
+            CommandRestriction.PROMPT_NAME: ['BASH_PROMPT',
+                                             'POWERSHELL_PROMPT']
+        }
+    ),
+    Command(
+        flags=['--runs'],
+        dest='runs',
+        type=int,
+        config='shell_craft_benchmark_runs',
+        default=DEFAULT_RUNS,
+        action='store',
+        help='The number of timed runs of each command when ranking by runtime.',
+        restrictions={
+            CommandRestriction.PROMPT_NAME: ['BASH_PROMPT',
+                                             'POWERSHELL_PROMPT']
+        }
+    ),
+    Command(
+        flags=['--dry-input'],
+        dest='dry_input',
+        type=str,
+        action='store',
+        help='A sample file or directory copied into the scratch directory commands are ranked in. A file is also given to them as stdin.',
+        restrictions={
+            CommandRestriction.PROMPT_NAME: ['BASH_PROMPT',
+                                             'POWERSHELL_PROMPT']
+        }
+    ),
+    Command(
+        flags=['--history'],
+        dest='history',
+        type=str,
+        config='shell_craft_history',
+        default=DEFAULT_HISTORY_PATH,
+        action='store',
+        help='The database interactive mode stores requests, responses and the results of executing them in. Search it with !search and recall answers with !recall.',
+        restrictions={
+            CommandRestriction.PROMPT_NAME: ['BASH_PROMPT',
+                                             'POWERSHELL_PROMPT']
+        }
+    ),
+    Command(
+        flags=['--no-history'],
+        dest='no_history',
+        action='store_true',
+        help='Do not store the requests of interactive mode in the history.',
+        restrictions={
+            CommandRestriction.PROMPT_NAME: ['BASH_PROMPT',
+                                             'POWERSHELL_PROMPT']
+        }
+    ),
     CommandGroup(
         name='code',
         commands=[
@@ -181,6 +361,107 @@ _COMMANDS = [
         },
         exclusive=True
     ),   
+    Command(
+        flags=['--chunk-tokens'],
+        dest='chunk_tokens',
+        type=int,
+        config='shell_craft_chunk_tokens',
+        default=DEFAULT_CHUNK_TOKENS,
+        action='store',
+        help='The number of tokens of code sent per request. Larger code is split between functions and classes and processed concurrently.',
+        restrictions={
+            CommandRestriction.PROMPT_TYPE: ['LanguagePrompt']
+        }
+    ),
+    Command(
+        flags=['--cascade'],
+        dest='cascade',
+        type=comma_separated(_MODELS),
+        config='shell_craft_cascade',
+        action='store',
+        help='A comma separated chain of models, fastest first. Each response is syntax checked locally and only failures are sent to the next model.',
+        restrictions={
+            CommandRestriction.PROMPT_TYPE: ['LanguagePrompt']
+        }
+    ),
+    Command(
+        flags=['--validate'],
+        dest='validate',
+        action='store_true',
+        help='Check the syntax of every response locally and only print the ones that pass.',
+        restrictions={
+            CommandRestriction.PROMPT_TYPE: ['LanguagePrompt']
+        }
+    ),
+    Command(
+        flags=['--first-valid'],
+        dest='first_valid',
+        action='store_true',
+        help='Print only the first response that passes the syntax check. When streaming, return as soon as it has finished.',
+        restrictions={
+            CommandRestriction.PROMPT_TYPE: ['LanguagePrompt']
+        }
+    ),
+    Command(
+        flags=['--diff'],
+        dest='diff',
+        action='store_true',
+        help='Ask for a unified diff of the changes when refactoring or documenting instead of the whole code. Diffs that do not apply are generated again in full.',
+        restrictions={
+            CommandRestriction.PROMPT_TYPE: ['LanguagePrompt']
+        }
+    ),
+    Command(
+        flags=['--apply'],
+        dest='apply',
+        action='store_true',
+        help='Write changes in place with --tree and --git-diff, or print the changed code instead of a patch with --diff.',
+        restrictions={
+            CommandRestriction.PROMPT_TYPE: ['LanguagePrompt']
+        }
+    ),
+    Command(
+        flags=['--tree'],
+        dest='tree',
+        type=str,
+        action='store',
+        help='Process every file of the language in a directory with --refactor, --document or --test. Files that did not change since the last run are skipped.',
+        restrictions={
+            CommandRestriction.PROMPT_TYPE: ['LanguagePrompt']
+        }
+    ),
+    Command(
+        flags=['--output-dir'],
+        dest='output_dir',
+        type=str,
+        action='store',
+        help='The directory to write the results of --tree to. Defaults to writing them next to the sources.',
+        restrictions={
+            CommandRestriction.PROMPT_TYPE: ['LanguagePrompt']
+        }
+    ),
+    Command(
+        flags=['--git-diff'],
+        dest='git_diff',
+        type=str,
+        action='store',
+        help='Refactor, document or test only the code below the current directory changed since this revision and print the result as a patch with paths relative to the current directory.',
+        restrictions={
+            CommandRestriction.PROMPT_TYPE: ['LanguagePrompt']
+        }
+    ),
+    Command(
+        flags=['--git-diff-context'],
+        dest='git_diff_context',
+        type=int,
+        config='shell_craft_git_diff_context',
+        default=DEFAULT_DIFF_CONTEXT,
+        action='store',
+        help='The number of unchanged lines around each change sent with --git-diff.',
+        restrictions={
+            CommandRestriction.PROMPT_TYPE: ['LanguagePrompt']
+        }
+    ),
     Command(
         flags=['--help'],
         action='help',
@@ -0,0 +1,443 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import shlex
+from argparse import BooleanOptionalAction
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from shell_craft.prompts import PromptRegistry
+
+from .commands import Command, CommandGroup, CommandRestriction
+
+SHELLS = ("bash", "zsh", "fish", "powershell")
+
+_SUBCOMMANDS = ["daemon", "completion"]
+
+
+@dataclass(frozen=True)
+class Option:
+    """
+    A flag as offered by the completion scripts. Prompts lists the prompts
+    the flag is available for, or is None when it is always available.
+    """
+    flags: tuple[str, ...]
+    takes_value: bool
+    choices: tuple[str, ...] = ()
+    help: str = ""
+    prompts: Optional[tuple[str, ...]] = None
+
+
+def _allowed(restrictions: dict[CommandRestriction, list], prompts: dict[str, str]) -> tuple[str, ...]:
+    """
+    Get the prompts that satisfy every restriction, the same way the parser
+    decides whether to add a restricted command.
+
+    Args:
+        restrictions (dict[CommandRestriction, list]): The restrictions.
+        prompts (dict[str, str]): The type name of every prompt, by name.
+
+    Returns:
+        tuple[str, ...]: The names of the prompts the restrictions allow.
+    """
+    def allows(name: str, prompt_type: str) -> bool:
+        for restriction, values in restrictions.items():
+            if restriction == CommandRestriction.PROMPT_TYPE and prompt_type in values:
+                continue
+            if restriction == CommandRestriction.PROMPT_NAME and name.upper() + "_PROMPT" in values:
+                continue
+            return False
+        return True
+
+    return tuple(name for name, prompt_type in prompts.items() if allows(name, prompt_type))
+
+def get_options(commands: list[Command | CommandGroup], prompts: dict[str, str]) -> list[Option]:
+    """
+    Get the flags of the commands with their values and the prompts they are
+    available for. Commands of a group share the group's restrictions.
+
+    Args:
+        commands (list[Command | CommandGroup]): The commands of the CLI.
+        prompts (dict[str, str]): The type name of every prompt, by name.
+
+    Returns:
+        list[Option]: The flags, positional arguments are left out.
+    """
+    options = []
+    for command in commands:
+        members = command.commands if isinstance(command, CommandGroup) else [command]
+        for member in members:
+            flags = [flag for flag in member.flags if flag.startswith("-")]
+            if not flags:
+                continue
+
+            if member.action is BooleanOptionalAction:
+                flags += ["--no-" + flag[2:] for flag in flags if flag.startswith("--")]
+
+            restrictions = command.restrictions or member.restrictions
+            options.append(Option(
+                flags=tuple(flags),
+                takes_value=member.action in (None, "store"),
+                choices=tuple(str(choice) for choice in member.choices or ()),
+                help=member.help or "",
+                prompts=_allowed(restrictions, prompts) if restrictions else None,
+            ))
+
+    return options
+
+def _flags_by_prompt(options: list[Option], prompts: Iterable[str]) -> list[tuple[list[str], list[str]]]:
+    """
+    Get the flags available for each prompt, with prompts offering the same
+    flags grouped together so the scripts need one branch per group.
+
+    Args:
+        options (list[Option]): The flags.
+        prompts (Iterable[str]): The names of the prompts.
+
+    Returns:
+        list[tuple[list[str], list[str]]]: The names of the prompts of each
+            group and the flags available for them.
+    """
+    groups: dict[tuple[str, ...], list[str]] = {}
+    for prompt in prompts:
+        flags = tuple(
+            flag
+            for option in options
+            if option.prompts is None or prompt in option.prompts
+            for flag in option.flags
+        )
+        groups.setdefault(flags, []).append(prompt)
+
+    return [(names, list(flags)) for flags, names in groups.items()]
+
+def _always(options: list[Option]) -> list[str]:
+    """
+    Get the flags that are available whatever prompt is selected, which are
+    offered for prompts the script does not know.
+
+    Args:
+        options (list[Option]): The flags.
+
+    Returns:
+        list[str]: The flags without restrictions.
+    """
+    return [flag for option in options if option.prompts is None for flag in option.flags]
+
+def _words(words: Iterable[str]) -> str:
+    """
+    Join words into the space separated list the shells complete from.
+
+    Args:
+        words (Iterable[str]): The words.
+
+    Returns:
+        str: The words separated by spaces.
+    """
+    return " ".join(words)
+
+def _bash(options: list[Option], prompts: list[str], default: str) -> str:
+    """
+    Generate the completion script for bash, a function registered with
+    complete -F.
+
+    Args:
+        options (list[Option]): The flags.
+        prompts (list[str]): The names of the prompts.
+        default (str): The prompt used when --prompt is not given.
+
+    Returns:
+        str: The script.
+    """
+    lines = [
+        "# shell-craft completion for bash, generated by `shell-craft completion bash`.",
+        "_shell_craft() {",
+        "    local cur prev prompt flags i",
+        '    cur="${COMP_WORDS[COMP_CWORD]}"',
+        '    prev="${COMP_WORDS[COMP_CWORD-1]}"',
+        '    if [[ $COMP_CWORD -eq 1 && $cur != -* ]]; then',
+        f'        COMPREPLY=($(compgen -W {shlex.quote(_words(_SUBCOMMANDS))} -- "$cur"))',
+        "        return",
+        "    fi",
+        '    if [[ $COMP_CWORD -eq 2 && ${COMP_WORDS[1]} == completion ]]; then',
+        f'        COMPREPLY=($(compgen -W {shlex.quote(_words(SHELLS))} -- "$cur"))',
+        "        return",
+        "    fi",
+        '    case "$prev" in',
+    ]
+    for option in options:
+        if option.choices:
+            lines.append(f"        {'|'.join(option.flags)})")
+            lines.append(f'            COMPREPLY=($(compgen -W {shlex.quote(_words(option.choices))} -- "$cur"))')
+            lines.append("            return;;")
+    values = [flag for option in options if option.takes_value and not option.choices for flag in option.flags]
+    lines += [
+        f"        {'|'.join(values)})",
+        "            return;;",
+        "    esac",
+        f"    prompt={default}",
+        "    for ((i = 1; i < COMP_CWORD - 1; i++)); do",
+        '        if [[ ${COMP_WORDS[i]} == --prompt ]]; then',
+        '            prompt="${COMP_WORDS[i+1]}"',
+        "        fi",
+        "    done",
+        '    prompt="${prompt,,}"',
+        '    case "${prompt%_prompt}" in',
+    ]
+    for names, flags in _flags_by_prompt(options, prompts):
+        lines.append(f"        {'|'.join(shlex.quote(name) for name in names)})")
+        lines.append(f"            flags={shlex.quote(_words(flags))};;")
+    lines += [
+        "        *)",
+        f"            flags={shlex.quote(_words(_always(options)))};;",
+        "    esac",
+        '    if [[ $cur == -* ]]; then',
+        '        COMPREPLY=($(compgen -W "$flags" -- "$cur"))',
+        "    fi",
+        "}",
+        "complete -o default -F _shell_craft shell-craft",
+    ]
+    return "\n".join(lines) + "\n"
+
+def _zsh(options: list[Option], prompts: list[str], default: str) -> str:
+    """
+    Generate the completion script for zsh, a function registered with compdef.
+
+    Args:
+        options (list[Option]): The flags.
+        prompts (list[str]): The names of the prompts.
+        default (str): The prompt used when --prompt is not given.
+
+    Returns:
+        str: The script.
+    """
+    lines = [
+        "#compdef shell-craft",
+        "# shell-craft completion for zsh, generated by `shell-craft completion zsh`.",
+        "_shell_craft() {",
+        "    local prompt i cur=${words[CURRENT]} prev=${words[CURRENT-1]}",
+        "    local -a flags",
+        "    if (( CURRENT == 2 )) && [[ $cur != -* ]]; then",
+        f"        compadd -- {_words(_SUBCOMMANDS)}",
+        "        return",
+        "    fi",
+        "    if (( CURRENT == 3 )) && [[ ${words[2]} == completion ]]; then",
+        f"        compadd -- {_words(SHELLS)}",
+        "        return",
+        "    fi",
+        "    case $prev in",
+    ]
+    for option in options:
+        if option.choices:
+            lines.append(f"        {'|'.join(option.flags)})")
+            lines.append(f"            compadd -- {_words(shlex.quote(choice) for choice in option.choices)}")
+            lines.append("            return;;")
+    values = [flag for option in options if option.takes_value and not option.choices for flag in option.flags]
+    lines += [
+        f"        {'|'.join(values)})",
+        "            _files",
+        "            return;;",
+        "    esac",
+        f"    prompt={default}",
+        "    for (( i = 2; i < CURRENT - 1; i++ )); do",
+        "        if [[ ${words[i]} == --prompt ]]; then",
+        "            prompt=${words[i+1]}",
+        "        fi",
+        "    done",
+        "    case ${${prompt:l}%_prompt} in",
+    ]
+    for names, flags in _flags_by_prompt(options, prompts):
+        lines.append(f"        {'|'.join(shlex.quote(name) for name in names)})")
+        lines.append(f"            flags=({_words(flags)});;")
+    lines += [
+        "        *)",
+        f"            flags=({_words(_always(options))});;",
+        "    esac",
+        "    if [[ $cur == -* ]]; then",
+        "        compadd -- $flags",
+        "    else",
+        "        _files",
+        "    fi",
+        "}",
+        "compdef _shell_craft shell-craft",
+    ]
+    return "\n".join(lines) + "\n"
+
+def _fish(options: list[Option], prompts: list[str], default: str) -> str:
+    """
+    Generate the completion script for fish, complete commands whose
+    conditions call a function reading the selected prompt from the command
+    line.
+
+    Args:
+        options (list[Option]): The flags.
+        prompts (list[str]): The names of the prompts.
+        default (str): The prompt used when --prompt is not given.
+
+    Returns:
+        str: The script.
+    """
+    lines = [
+        "# shell-craft completion for fish, generated by `shell-craft completion fish`.",
+        "function __shell_craft_prompt",
+        "    set -l tokens (commandline -opc)",
+        f"    set -l prompt {default}",
+        "    for i in (seq 2 (math (count $tokens) - 1))",
+        "        if test $tokens[$i] = --prompt",
+        "            set prompt $tokens[(math $i + 1)]",
+        "        end",
+        "    end",
+        "    string replace -r '_prompt$' '' -- (string lower -- $prompt)",
+        "end",
+        "",
+        "function __shell_craft_prompt_is",
+        "    contains -- (__shell_craft_prompt) $argv",
+        "end",
+        "",
+        "complete -c shell-craft -f",
+        f"complete -c shell-craft -n __fish_use_subcommand -a {shlex.quote(_words(_SUBCOMMANDS))}",
+        f"complete -c shell-craft -n '__fish_seen_subcommand_from completion' -a {shlex.quote(_words(SHELLS))}",
+    ]
+    for option in options:
+        line = "complete -c shell-craft"
+        for flag in option.flags:
+            line += f" -l {flag[2:]}" if flag.startswith("--") else f" -s {flag[1:]}"
+        if option.prompts is not None:
+            condition = _words(["__shell_craft_prompt_is", *option.prompts])
+            line += f" -n {shlex.quote(condition)}"
+        if option.choices:
+            line += f" -x -a {shlex.quote(_words(option.choices))}"
+        elif option.takes_value:
+            line += " -r -F"
+        if option.help:
+            line += f" -d {shlex.quote(option.help)}"
+        lines.append(line)
+
+    return "\n".join(lines) + "\n"
+
+def _powershell_list(words: Iterable[str]) -> str:
+    """
+    Write words as a PowerShell array of single quoted strings.
+
+    Args:
+        words (Iterable[str]): The words.
+
+    Returns:
+        str: The array expression.
+    """
+    return "@(" + ", ".join("'" + word.replace("'", "''") + "'" for word in words) + ")"
+
+def _powershell(options: list[Option], prompts: list[str], default: str) -> str:
+    """
+    Generate the completion script for PowerShell, a native argument completer.
+
+    Args:
+        options (list[Option]): The flags.
+        prompts (list[str]): The names of the prompts.
+        default (str): The prompt used when --prompt is not given.
+
+    Returns:
+        str: The script.
+    """
+    values = [flag for option in options if option.takes_value and not option.choices for flag in option.flags]
+    lines = [
+        "# shell-craft completion for PowerShell, generated by `shell-craft completion powershell`.",
+        "Register-ArgumentCompleter -Native -CommandName shell-craft -ScriptBlock {",
+        "    param($wordToComplete, $commandAst, $cursorPosition)",
+        "    $words = @($commandAst.CommandElements |",
+        "        Where-Object { $_.Extent.EndOffset -lt $cursorPosition } |",
+        "        ForEach-Object { $_.ToString() })",
+        f"    $prompt = '{default}'",
+        "    for ($i = 1; $i -lt $words.Count - 1; $i++) {",
+        "        if ($words[$i] -eq '--prompt') { $prompt = $words[$i + 1] }",
+        "    }",
+        "    $prompt = $prompt.ToLower() -replace '_prompt$', ''",
+        "    $previous = $words[-1]",
+        "    if ($words.Count -eq 1 -and $wordToComplete -notlike '-*') {",
+        f"        $candidates = {_powershell_list(_SUBCOMMANDS)}",
+        "    } elseif ($words.Count -eq 2 -and $words[1] -eq 'completion') {",
+        f"        $candidates = {_powershell_list(SHELLS)}",
+    ]
+    for option in options:
+        if option.choices:
+            lines.append(f"    }} elseif ({_powershell_list(option.flags)} -contains $previous) {{")
+            lines.append(f"        $candidates = {_powershell_list(option.choices)}")
+    lines += [
+        f"    }} elseif ({_powershell_list(values)} -contains $previous) {{",
+        "        return",
+        "    } else {",
+        "        $candidates = switch ($prompt) {",
+    ]
+    for names, flags in _flags_by_prompt(options, prompts):
+        lines.append(f"            {{ {_powershell_list(names)} -contains $_ }} {{ {_powershell_list(flags)}; break }}")
+    lines += [
+        f"            default {{ {_powershell_list(_always(options))} }}",
+        "        }",
+        "    }",
+        "    $candidates | Where-Object { $_ -like \"$wordToComplete*\" } | ForEach-Object {",
+        "        [System.Management.Automation.CompletionResult]::new($_, $_, 'ParameterValue', $_)",
+        "    }",
+        "}",
+    ]
+    return "\n".join(lines) + "\n"
+
+_GENERATORS = {
+    "bash": _bash,
+    "zsh": _zsh,
+    "fish": _fish,
+    "powershell": _powershell,
+}
+
+def completion_script(
+    shell: str,
+    commands: list[Command | CommandGroup],
+    registry: PromptRegistry,
+) -> str:
+    """
+    Generate a static completion script for the shell. The flags, their
+    choices and the prompts that restricted flags are available for are
+    written into the script, so completing runs in the shell alone without
+    starting Python. Flags restricted to prompts are offered once --prompt
+    selects one of them, or for the shell's own prompt when it is not given.
+
+    Args:
+        shell (str): One of SHELLS.
+        commands (list[Command | CommandGroup]): The commands of the CLI.
+        registry (PromptRegistry): The prompts that can be selected.
+
+    Raises:
+        ValueError: If the shell is not supported.
+
+    Returns:
+        str: The completion script.
+    """
+    if shell not in _GENERATORS:
+        raise ValueError(f"Unsupported shell: {shell}")
+
+    prompts = {name: type(registry.get(name)).__name__ for name in registry.names}
+    default = "powershell" if shell == "powershell" else "bash"
+    return _GENERATORS[shell](get_options(commands, prompts), list(prompts), default)
+
+
+__all__ = [
+    "completion_script",
+    "get_options",
+    "Option",
+    "SHELLS",
+]
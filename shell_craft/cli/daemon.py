@@ -0,0 +1,347 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import io
+import json
+import os
+import pathlib
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+from typing import Callable, Iterable, Optional
+
+from .prompt import get_calling_shell
+
+DEFAULT_SOCKET_PATH = "~/.shell-craft/daemon.sock"
+
+_LOCAL_FLAGS = [
+    '--batch',
+    '--git-diff',
+    '--interactive',
+    '--rank-by-runtime',
+    '--tree',
+]
+
+Handler = Callable[[list[str], str, dict[str, str], Optional[str]], None]
+
+
+def socket_path() -> str:
+    """
+    Get the path of the daemon's Unix socket, from $SHELLCRAFT_SOCKET or
+    ~/.shell-craft/daemon.sock.
+
+    Returns:
+        str: The path of the socket.
+    """
+    return pathlib.Path(
+        os.environ.get('SHELLCRAFT_SOCKET') or DEFAULT_SOCKET_PATH
+    ).expanduser().as_posix()
+
+
+def _local_only(arguments: list[str]) -> bool:
+    """
+    Determine if the arguments must be processed in this process, because
+    they interact with the terminal or read files relative to it.
+
+    Args:
+        arguments (list[str]): The arguments to process.
+
+    Returns:
+        bool: True if the arguments cannot be forwarded to the daemon.
+    """
+    return any(
+        argument == flag or argument.startswith(flag + '=')
+        for argument in arguments
+        for flag in _LOCAL_FLAGS
+    )
+
+
+def _gives_prompt(arguments: list[str]) -> bool:
+    """
+    Determine if the arguments select a prompt, in which case the calling
+    shell is not needed to pick one.
+
+    Args:
+        arguments (list[str]): The arguments to process.
+
+    Returns:
+        bool: True if the arguments give --prompt a value.
+    """
+    return any(
+        argument.startswith('--prompt=')
+        or (argument == '--prompt' and following[:1] != '-' and following != '')
+        for argument, following in zip(arguments, arguments[1:] + [''])
+    )
+
+
+class _FrameWriter(io.TextIOBase):
+    def __init__(self, file: io.BufferedIOBase, name: str, tty: bool, lock: threading.Lock) -> None:
+        """
+        Initialize a text stream that sends everything written to it to the
+        client as a frame, a JSON line of the form {name: text}.
+
+        Args:
+            file (io.BufferedIOBase): The connection to the client.
+            name (str): The name of the stream, "out" or "err".
+            tty (bool): Whether the client's stream is a terminal.
+            lock (threading.Lock): The lock serializing frames.
+        """
+        self._file = file
+        self._name = name
+        self._tty = tty
+        self._lock = lock
+
+    def isatty(self) -> bool:
+        return self._tty
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            with self._lock:
+                self._file.write((json.dumps({self._name: text}) + '\n').encode('utf-8'))
+                self._file.flush()
+        return len(text)
+
+
+class _ThreadLocalStream(io.TextIOBase):
+    def __init__(self, default: io.TextIOBase) -> None:
+        """
+        Initialize a text stream that writes to the stream bound to the
+        current thread, or to the default stream. The daemon installs it as
+        sys.stdout and sys.stderr, so each request prints to its own client.
+
+        Args:
+            default (io.TextIOBase): The stream used by unbound threads.
+        """
+        self._default = default
+        self._local = threading.local()
+
+    @property
+    def _stream(self) -> io.TextIOBase:
+        return getattr(self._local, 'stream', None) or self._default
+
+    def bind(self, stream: Optional[io.TextIOBase]) -> None:
+        self._local.stream = stream
+
+    def isatty(self) -> bool:
+        return self._stream.isatty()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        return self._stream.write(text)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        """
+        Handle a request from a client. The request is a single JSON line
+        with the arguments, working directory, environment, calling shell and
+        whether the client's stdout is a terminal. Output is sent back as frames while
+        it is produced, followed by a final {"exit": status} frame.
+        """
+        request = json.loads(self.rfile.readline())
+        lock = threading.Lock()
+        stdout, stderr = self.server.stdout, self.server.stderr
+        stdout.bind(_FrameWriter(self.wfile, 'out', request.get('tty', False), lock))
+        stderr.bind(_FrameWriter(self.wfile, 'err', False, lock))
+
+        status = 0
+        try:
+            self.server.handler(
+                request['arguments'],
+                request['cwd'],
+                request['environ'],
+                request.get('shell'),
+            )
+        except SystemExit as exit:
+            if isinstance(exit.code, int):
+                status = exit.code
+            elif exit.code is not None:
+                print(exit.code, file=sys.stderr)
+                status = 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            stdout.bind(None)
+            stderr.bind(None)
+
+        self.wfile.write((json.dumps({'exit': status}) + '\n').encode('utf-8'))
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, handler: Handler) -> None:
+        """
+        Initialize a server listening on a Unix socket only accessible to
+        the current user. Each connection is handled in its own thread by
+        calling the handler with the client's arguments, working directory,
+        environment and calling shell.
+
+        Output of a request is sent to its client when written to the
+        server's stdout and stderr streams, which must be installed as
+        sys.stdout and sys.stderr while the server runs.
+
+        Args:
+            path (str): The path of the socket.
+            handler (Handler): The function processing a request.
+        """
+        self.handler = handler
+        self.stdout = _ThreadLocalStream(sys.stdout)
+        self.stderr = _ThreadLocalStream(sys.stderr)
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        pathlib.Path(path).unlink(missing_ok=True)
+
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, _RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self) -> None:
+        super().server_close()
+        pathlib.Path(self.server_address).unlink(missing_ok=True)
+
+
+def _connect(path: str) -> Optional[socket.socket]:
+    """
+    Connect to the daemon's socket.
+
+    Args:
+        path (str): The path of the socket.
+
+    Returns:
+        Optional[socket.socket]: The connection, or None if no daemon is
+            listening.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except OSError:
+        connection.close()
+        return None
+
+    return connection
+
+
+def serve(handler: Handler, path: Optional[str] = None) -> None:
+    """
+    Run the daemon until interrupted. While it runs, sys.stdout and
+    sys.stderr write to the client of the request handled by the current
+    thread.
+
+    Args:
+        handler (Handler): The function processing a request.
+        path (Optional[str]): The path of the socket, defaults to socket_path().
+    """
+    path = path or socket_path()
+    connection = _connect(path)
+    if connection:
+        connection.close()
+        print(f"A shell-craft daemon is already listening on {path}.", file=sys.stderr)
+        return
+
+    stdout, stderr = sys.stdout, sys.stderr
+    server = DaemonServer(path, handler)
+    sys.stdout, sys.stderr = server.stdout, server.stderr
+    print(f"Listening on {path}. Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        sys.stdout, sys.stderr = stdout, stderr
+
+
+def forward(
+    arguments: list[str],
+    path: Optional[str] = None,
+    environ_keys: Iterable[str] = (),
+) -> Optional[int]:
+    """
+    Forward the arguments to a running daemon and print its output as it
+    arrives. Nothing is forwarded when $SHELLCRAFT_NO_DAEMON is set, when
+    the arguments must be processed locally or when no daemon is running.
+
+    Only the environment variables the daemon reads are sent, and the
+    calling shell is only looked up when no prompt is given.
+
+    Args:
+        arguments (list[str]): The arguments to process, including stdin.
+        path (Optional[str]): The path of the socket, defaults to socket_path().
+        environ_keys (Iterable[str]): The names of the environment variables
+            to send, those that are not set are left out.
+
+    Returns:
+        Optional[int]: The exit status of the request, or None if it was
+            not forwarded.
+    """
+    if os.environ.get('SHELLCRAFT_NO_DAEMON') or _local_only(arguments):
+        return None
+
+    connection = _connect(path or socket_path())
+    if not connection:
+        return None
+
+    with connection, connection.makefile('rwb') as file:
+        file.write((json.dumps({
+            'arguments': arguments,
+            'cwd': os.getcwd(),
+            'environ': {
+                key: os.environ[key] for key in environ_keys if key in os.environ
+            },
+            'shell': None if _gives_prompt(arguments) else get_calling_shell(),
+            'tty': sys.stdout.isatty(),
+        }) + '\n').encode('utf-8'))
+        file.flush()
+
+        for line in file:
+            frame = json.loads(line)
+            if 'exit' in frame:
+                return frame['exit']
+
+            stream = sys.stdout if 'out' in frame else sys.stderr
+            stream.write(frame.get('out', frame.get('err', '')))
+            stream.flush()
+
+    print("Error: The shell-craft daemon closed the connection.", file=sys.stderr)
+    return 1
+
+
+__all__ = [
+    "DaemonServer",
+    "forward",
+    "serve",
+    "socket_path",
+]
@@ -0,0 +1,518 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import base64
+import codecs
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import IO, Optional
+
+DEFAULT_OUTPUT_LIMIT = 64 * 1024
+_CHUNK_SIZE = 4096
+_KILL_GRACE = 2.0
+
+
+@dataclass
+class ExecutionResult:
+    """
+    The outcome of an executed command. Only the last bytes of the output
+    are retained, truncated is set when earlier output was dropped. The
+    status is None if the command had to be killed after timing out.
+    """
+    status: Optional[int]
+    output: str
+    truncated: bool = False
+    timed_out: bool = False
+    duration: float = 0.0
+
+
+def _partial_marker(data: bytes, marker: bytes) -> int:
+    """
+    Get the length of the end of the data that could be the start of a
+    marker, which must be held back until the next read shows whether it is.
+
+    Args:
+        data (bytes): The data read so far.
+        marker (bytes): The marker.
+
+    Returns:
+        int: The number of bytes to hold back.
+    """
+    for length in range(min(len(marker) - 1, len(data)), 0, -1):
+        if data.endswith(marker[:length]):
+            return length
+
+    return 0
+
+
+def _is_powershell(shell: str) -> bool:
+    """
+    Determine if a shell is PowerShell.
+
+    Args:
+        shell (str): The shell.
+
+    Returns:
+        bool: True for PowerShell.
+    """
+    return os.path.basename(shell).lower().startswith(("powershell", "pwsh"))
+
+
+def shell_arguments(shell: str, command: str) -> list[str]:
+    """
+    Get the arguments that run a command with a shell. The command is
+    passed as a single argument, so it is never re-quoted or expanded by
+    another shell.
+
+    Args:
+        shell (str): The shell to run the command with.
+        command (str): The command to run.
+
+    Returns:
+        list[str]: The arguments to execute.
+    """
+    if _is_powershell(shell):
+        return [shell, "-NoProfile", "-Command", command]
+
+    return [shell, "-c", command]
+
+
+class _Tail:
+    def __init__(self, limit: int) -> None:
+        """
+        Initialize a buffer that keeps the last limit bytes written to it.
+
+        Args:
+            limit (int): The number of bytes to keep.
+        """
+        self._limit = limit
+        self._data = bytearray()
+        self.truncated = False
+
+    def write(self, data: bytes) -> None:
+        self._data += data
+        if len(self._data) > self._limit:
+            del self._data[:len(self._data) - self._limit]
+            self.truncated = True
+
+    def text(self) -> str:
+        return self._data.decode("utf-8", errors="replace")
+
+
+class _Writer:
+    def __init__(self, output: IO[str]) -> None:
+        """
+        Initialize a writer that passes output through to a text stream as
+        it arrives, writing raw bytes when the stream has a binary buffer.
+
+        Args:
+            output (IO[str]): The stream to write to.
+        """
+        self._output = output
+        self._buffer = getattr(output, "buffer", None)
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(self, data: bytes) -> None:
+        if self._buffer is not None:
+            self._buffer.write(data)
+            self._buffer.flush()
+        else:
+            self._output.write(self._decoder.decode(data))
+            self._output.flush()
+
+    def close(self) -> None:
+        if self._buffer is None:
+            self._output.write(self._decoder.decode(b"", final=True))
+            self._output.flush()
+
+
+def _signal_group(process: subprocess.Popen, sig: int) -> bool:
+    """
+    Send a signal to a process and everything it started, which share the
+    session the process was started in. Only available on POSIX systems.
+
+    Args:
+        process (subprocess.Popen): The process to signal.
+        sig (int): The signal to send.
+
+    Returns:
+        bool: False if the processes no longer exist.
+    """
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        return False
+
+    return True
+
+
+def _kill_group(process: subprocess.Popen) -> None:
+    """
+    Kill a process and everything it started at once, without waiting for
+    them to exit, so the caller can still collect the status itself.
+
+    Args:
+        process (subprocess.Popen): The process to kill.
+    """
+    if os.name != "posix":
+        process.kill()
+        return
+
+    _signal_group(process, signal.SIGKILL)
+
+
+def _kill(process: subprocess.Popen) -> None:
+    """
+    Terminate a process and everything it started, killing them if they
+    do not exit within a grace period.
+
+    Args:
+        process (subprocess.Popen): The process to stop.
+    """
+    if os.name != "posix":
+        process.kill()
+        return
+
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        if not _signal_group(process, sig):
+            return
+
+        try:
+            process.wait(_KILL_GRACE)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def _open_output(use_pty: bool) -> tuple[int, int]:
+    """
+    Open the channel a command writes its output to.
+
+    Args:
+        use_pty (bool): Whether to use a pseudo-terminal instead of a pipe.
+
+    Returns:
+        tuple[int, int]: The descriptor to read from and the descriptor to
+            give to the command.
+    """
+    if use_pty:
+        import pty
+
+        return pty.openpty()
+
+    return os.pipe()
+
+
+def _spawn(arguments: list[str], use_pty: bool, **kwargs) -> tuple[subprocess.Popen, int]:
+    """
+    Start a process writing its output and errors to a pipe or a
+    pseudo-terminal, in a session of its own so it can be stopped with
+    everything it starts.
+
+    Args:
+        arguments (list[str]): The arguments to execute.
+        use_pty (bool): Whether to use a pseudo-terminal instead of a pipe.
+        **kwargs: Further arguments for subprocess.Popen.
+
+    Returns:
+        tuple[subprocess.Popen, int]: The process and the descriptor to
+            read its output from.
+    """
+    reader, writer = _open_output(use_pty)
+    try:
+        process = subprocess.Popen(
+            arguments,
+            stdout=writer,
+            stderr=writer,
+            start_new_session=os.name == "posix",
+            **kwargs,
+        )
+    except OSError:
+        os.close(reader)
+        raise
+    finally:
+        os.close(writer)
+
+    return process, reader
+
+
+def _read(descriptor: int, deadline: Optional[float]) -> Optional[bytes]:
+    """
+    Read the next output of a process. On systems without select for pipes
+    the read blocks, a timer is expected to stop the process at the deadline.
+
+    Args:
+        descriptor (int): The descriptor to read from.
+        deadline (Optional[float]): The monotonic time to stop waiting at.
+
+    Returns:
+        Optional[bytes]: The output, empty at the end of the output, or
+            None if the deadline passed.
+    """
+    if deadline and os.name == "posix":
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+
+        readable, _, _ = select.select([descriptor], [], [], remaining)
+        if not readable:
+            return None
+
+    try:
+        return os.read(descriptor, _CHUNK_SIZE)
+    except OSError:
+        return b""
+
+
+def _timer(process: subprocess.Popen, timeout: Optional[float]) -> Optional[threading.Timer]:
+    """
+    Start a timer stopping the process after the timeout, on systems where
+    reads cannot wait with a deadline.
+
+    Args:
+        process (subprocess.Popen): The process to stop.
+        timeout (Optional[float]): The number of seconds to allow.
+
+    Returns:
+        Optional[threading.Timer]: The started timer, or None if not needed.
+    """
+    if not timeout or os.name == "posix":
+        return None
+
+    timer = threading.Timer(timeout, _kill, [process])
+    timer.start()
+    return timer
+
+
+def _default_pty(output: IO[str]) -> bool:
+    """
+    Determine if commands writing to the output should run on a
+    pseudo-terminal, which is when it is a terminal on a POSIX system.
+
+    Args:
+        output (IO[str]): The stream the output is written to.
+
+    Returns:
+        bool: True if a pseudo-terminal should be used.
+    """
+    return os.name == "posix" and output.isatty()
+
+
+class ShellSession:
+    def __init__(
+        self,
+        shell: str = "bash",
+        output: Optional[IO[str]] = None,
+        use_pty: Optional[bool] = None,
+    ) -> None:
+        """
+        Initialize a long-lived shell that commands are run in one after
+        another, so the working directory, variables and functions a
+        command sets are kept for the next. The shell is started on the
+        first command and restarted if it exits, is killed after a timeout
+        or is interrupted.
+
+        Each command is followed by a sentinel, a random token and the exit
+        status, which marks the end of its output. Commands
+        read from /dev/null, so they cannot consume the commands that
+        follow them.
+
+        Args:
+            shell (str): The shell to run commands with, bash or PowerShell.
+            output (Optional[IO[str]]): The stream to write the output to,
+                defaults to sys.stdout.
+            use_pty (Optional[bool]): Whether to use a pseudo-terminal,
+                defaults to whether the output is a terminal on POSIX
+                systems.
+        """
+        self._shell = shell
+        self._output = output or sys.stdout
+        self._use_pty = _default_pty(self._output) if use_pty is None else use_pty
+        self._process: Optional[subprocess.Popen] = None
+        self._reader: Optional[int] = None
+
+    def _arguments(self) -> list[str]:
+        """
+        Get the arguments that start the shell reading commands from stdin.
+
+        Returns:
+            list[str]: The arguments to execute.
+        """
+        if _is_powershell(self._shell):
+            return [self._shell, "-NoProfile", "-NoLogo", "-NonInteractive", "-Command", "-"]
+
+        if os.path.basename(self._shell) == "bash":
+            return [self._shell, "--noprofile", "--norc"]
+
+        return [self._shell]
+
+    def _script(self, command: str, token: str) -> str:
+        """
+        Get the input that runs a command in the shell and prints the
+        sentinel after it.
+
+        Args:
+            command (str): The command to run.
+            token (str): The token of the sentinel.
+
+        Returns:
+            str: The input to write to the shell.
+        """
+        if _is_powershell(self._shell):
+            encoded = base64.b64encode(command.encode("utf-8")).decode("ascii")
+            return (
+                "$global:LASTEXITCODE = 0; $__status = 0; "
+                "try { . ([ScriptBlock]::Create([Text.Encoding]::UTF8.GetString("
+                f"[Convert]::FromBase64String('{encoded}')))) | Out-Host; "
+                "if ($global:LASTEXITCODE) { $__status = $global:LASTEXITCODE } } "
+                "catch { $_ | Out-Host; $__status = 1 }; "
+                f"[Console]::Out.Write(\"{token}:$__status`n\")\n"
+            )
+
+        return (
+            f"eval \"$(cat <<'{token}'\n{command}\n{token}\n)\" < /dev/null\n"
+            f"printf '{token}:%d\\n' \"$?\"\n"
+        )
+
+    def _start(self) -> None:
+        """
+        Start the shell if it is not running.
+        """
+        if self._process and self._process.poll() is None:
+            return
+
+        self.close()
+        self._process, self._reader = _spawn(
+            self._arguments(), self._use_pty, stdin=subprocess.PIPE
+        )
+
+    def run(
+        self,
+        command: str,
+        timeout: Optional[float] = None,
+        limit: int = DEFAULT_OUTPUT_LIMIT,
+    ) -> ExecutionResult:
+        """
+        Run a command in the shell, streaming its output as it is produced.
+        Only the last limit bytes of the output are kept in memory.
+
+        Args:
+            command (str): The command to run.
+            timeout (Optional[float]): The number of seconds after which the
+                shell is killed, defaults to None for no limit.
+            limit (int): The number of bytes of output to retain.
+
+        Returns:
+            ExecutionResult: The exit status and the retained output.
+        """
+        self._start()
+        start = time.monotonic()
+        deadline = start + timeout if timeout else None
+        token = f"__SHELLCRAFT_{os.urandom(8).hex()}__"
+        marker = token.encode("ascii") + b":"
+
+        try:
+            self._process.stdin.write(self._script(command, token).encode("utf-8"))
+            self._process.stdin.flush()
+        except OSError:
+            pass
+
+        tail = _Tail(limit)
+        stream = _Writer(self._output)
+        timer = _timer(self._process, timeout)
+        pending = b""
+        status = None
+        try:
+            while (data := _read(self._reader, deadline)) is not None:
+                pending += data
+                index = pending.find(marker)
+                if index >= 0 and b"\n" in pending[index:]:
+                    status = int(pending[index + len(marker):].split(b"\n", 1)[0])
+                    pending = pending[:index]
+                    break
+
+                if not data:
+                    status = self._process.wait()
+                    self.close()
+                    break
+
+                ready = len(pending) - _partial_marker(pending, marker)
+                if index >= 0:
+                    ready = index
+                tail.write(pending[:ready])
+                stream.write(pending[:ready])
+                pending = pending[ready:]
+        except KeyboardInterrupt:
+            self.close()
+            raise
+        finally:
+            tail.write(pending)
+            stream.write(pending)
+            stream.close()
+            if timer:
+                timer.cancel()
+
+        timed_out = data is None or bool(timer and time.monotonic() >= deadline)
+        if timed_out:
+            self.close()
+            status = None
+
+        return ExecutionResult(
+            status=status,
+            output=tail.text(),
+            truncated=tail.truncated,
+            timed_out=timed_out,
+            duration=time.monotonic() - start,
+        )
+
+    def close(self) -> None:
+        """
+        Stop the shell and everything it started.
+        """
+        if self._process:
+            if self._process.poll() is None:
+                _kill(self._process)
+            if self._process.stdin:
+                self._process.stdin.close()
+            self._process = None
+
+        if self._reader is not None:
+            os.close(self._reader)
+            self._reader = None
+
+    def __enter__(self) -> "ShellSession":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+__all__ = [
+    "DEFAULT_OUTPUT_LIMIT",
+    "ExecutionResult",
+    "shell_arguments",
+    "ShellSession",
+]
@@ -0,0 +1,257 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import pathlib
+import re
+import subprocess
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from shell_craft.patch import unified_diff
+
+DEFAULT_DIFF_CONTEXT = 10
+
+_HUNK = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+
+
+@dataclass(frozen=True)
+class Region:
+    """
+    A changed region of a file, as zero based line numbers with the end
+    excluded, and the lines of the file it covers.
+    """
+    path: str
+    start: int
+    end: int
+    text: str
+
+
+def changed_lines(diff: str) -> dict[str, list[tuple[int, int]]]:
+    """
+    Parse the changed line ranges of each file from a diff made with
+    --unified=0. Ranges are zero based with the end excluded, a hunk that
+    only removes lines is an empty range at the position of the removal.
+    Deleted and binary files have no ranges.
+
+    Args:
+        diff (str): The output of git diff.
+
+    Returns:
+        dict[str, list[tuple[int, int]]]: The ranges by path.
+    """
+    ranges: dict[str, list[tuple[int, int]]] = {}
+    path: Optional[str] = None
+    for line in diff.splitlines():
+        if line.startswith("+++ "):
+            target = line[4:]
+            path = target[2:] if target.startswith("b/") else None
+            if path is not None:
+                ranges.setdefault(path, [])
+            continue
+
+        match = _HUNK.match(line)
+        if match and path is not None:
+            start = int(match.group(1))
+            count = 1 if match.group(2) is None else int(match.group(2))
+            if count:
+                ranges[path].append((start - 1, start - 1 + count))
+            else:
+                ranges[path].append((start, start))
+
+    return ranges
+
+
+def _regions(path: str, lines: list[str], ranges: list[tuple[int, int]], context: int) -> list[Region]:
+    """
+    Widen the changed ranges of a file by the context, merging those that
+    overlap or touch.
+
+    Args:
+        path (str): The path of the file.
+        lines (list[str]): The lines of the file.
+        ranges (list[tuple[int, int]]): The changed ranges.
+        context (int): The number of lines to include around a change.
+
+    Returns:
+        list[Region]: The regions, in the order of the file.
+    """
+    merged: list[list[int]] = []
+    for start, end in sorted(ranges):
+        start, end = max(0, start - context), min(len(lines), end + context)
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return [
+        Region(path, start, end, "".join(lines[start:end]))
+        for start, end in merged
+    ]
+
+
+def changed_regions(
+    revision: str,
+    context: int = DEFAULT_DIFF_CONTEXT,
+    extensions: Iterable[str] = (),
+    cwd: Optional[str] = None,
+) -> list[Region]:
+    """
+    Find the regions of the working tree that changed since a revision,
+    with some unchanged lines around each change. Only files below the
+    working directory are considered. The prefixes of the paths are set
+    explicitly, so diff.noprefix and diff.mnemonicPrefix do not apply.
+
+    Args:
+        revision (str): The revision to compare the working tree to.
+        context (int): The number of lines to include around a change.
+        extensions (Iterable[str]): The extensions of the files to include,
+            all files if empty.
+        cwd (Optional[str]): The directory to run git in, defaults to the
+            working directory.
+
+    Raises:
+        ValueError: If git could not produce the diff.
+
+    Returns:
+        list[Region]: The regions, by path and position.
+    """
+    process = subprocess.run(
+        [
+            "git", "-c", "core.quotePath=off", "diff", "--unified=0",
+            "--no-color", "--no-ext-diff", "--relative",
+            "--src-prefix=a/", "--dst-prefix=b/", revision, "--",
+        ],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode:
+        raise ValueError(process.stderr.strip() or f"git diff {revision} failed")
+
+    extensions = tuple(extensions)
+    regions = []
+    for path, ranges in sorted(changed_lines(process.stdout).items()):
+        if extensions and not path.endswith(extensions):
+            continue
+
+        lines = pathlib.Path(cwd or ".", path).read_text().splitlines(keepends=True)
+        regions += _regions(path, lines, ranges, context)
+
+    return regions
+
+
+def region_instruction(region: Region, instruction: str = "") -> str:
+    """
+    Build the instruction sent with the chunks of a region, which says where
+    in the file the region is.
+
+    Args:
+        region (Region): The region.
+        instruction (str): The request to send with the region, if any.
+
+    Returns:
+        str: The instruction.
+    """
+    location = f"Lines {region.start + 1} to {region.end} of {region.path}:"
+    return " ".join(filter(None, [instruction, location]))
+
+
+def _lines(text: str, newline: bool) -> list[str]:
+    text = text.rstrip("\n")
+    if not text:
+        return []
+
+    return (text + "\n" if newline else text).splitlines(keepends=True)
+
+
+def replace_regions(original: str, replacements: list[tuple[Region, str]]) -> str:
+    """
+    Replace regions of a file. A replacement ends with a newline if the
+    region it replaces did.
+
+    Args:
+        original (str): The content of the file.
+        replacements (list[tuple[Region, str]]): The regions of the file and
+            the text to replace each with.
+
+    Returns:
+        str: The content with the regions replaced.
+    """
+    lines = original.splitlines(keepends=True)
+    for region, text in sorted(replacements, key=lambda item: -item[0].start):
+        lines[region.start:region.end] = _lines(text, region.text.endswith("\n"))
+
+    return "".join(lines)
+
+
+def replacement_patch(path: str, original: str, replacements: list[tuple[Region, str]]) -> str:
+    """
+    Build a unified diff that replaces regions of a file. Like the paths
+    of changed_regions, the path is relative to the working directory, so
+    the patch applies with git apply or patch -p1 from there.
+
+    Args:
+        path (str): The path of the file, relative to the working directory.
+        original (str): The content of the file.
+        replacements (list[tuple[Region, str]]): The regions of the file and
+            the text to replace each with.
+
+    Returns:
+        str: The patch, empty if nothing changes.
+    """
+    return unified_diff(
+        original, replace_regions(original, replacements), f"a/{path}", f"b/{path}"
+    )
+
+
+def addition_patch(path: str, text: str, existing: Optional[str] = None) -> str:
+    """
+    Build a unified diff that creates a file, or replaces the content of a
+    file that already exists.
+
+    Args:
+        path (str): The path of the file to create, relative to the working
+            directory.
+        text (str): The content of the file.
+        existing (Optional[str]): The current content of the file, None if
+            it does not exist.
+
+    Returns:
+        str: The patch, empty if nothing changes.
+    """
+    new = "".join(_lines(text, True))
+    if existing is None:
+        return unified_diff("", new, "/dev/null", f"b/{path}")
+
+    return unified_diff(existing, new, f"a/{path}", f"b/{path}")
+
+
+__all__ = [
+    "addition_patch",
+    "changed_lines",
+    "changed_regions",
+    "DEFAULT_DIFF_CONTEXT",
+    "Region",
+    "region_instruction",
+    "replace_regions",
+    "replacement_patch",
+]
@@ -20,50 +20,140 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import os
 import pathlib
-import subprocess
+import sys
 from argparse import ArgumentParser, Namespace
-from typing import Optional, Union
+from contextlib import contextmanager
+from dataclasses import replace
+from typing import (TYPE_CHECKING, Awaitable, Callable, Iterable, Iterator,
+                    Mapping, Optional, TypeVar, Union)
 
+from shell_craft.chunking import DEFAULT_CHUNK_TOKENS, Chunks, split_source
 from shell_craft.cli.github import GitHubArguments
-from shell_craft.configuration import AggregateConfiguration
+from shell_craft.configuration import (AggregateConfiguration,
+                                       ConfigurationSnapshot)
 from shell_craft.factories import PromptFactory
-from shell_craft.services import OpenAIService, OpenAISettings
+from shell_craft.history import DEFAULT_HISTORY_PATH, History, HistoryEntry
+from shell_craft.patch import unified_diff
+from shell_craft.prompts import REGISTRY, PromptPacks
+from shell_craft.prompts.languages import with_diff_output
+from shell_craft.services.cache import (DEFAULT_CACHE_PATH, DEFAULT_CACHE_TTL,
+                                        ResponseCache)
+from shell_craft.services.openai.settings import (DEFAULT_POOL_SIZE,
+                                                  DEFAULT_TIMEOUT,
+                                                  OpenAISettings)
+from shell_craft.services.retry import DEFAULT_MAX_RETRIES, RateLimiter
+from shell_craft.tracing import Tracer, annotate, span
+from shell_craft.validation import (Validator, get_validator, strip_fence,
+                                    validate_all)
 
-from .commands import _COMMANDS
-from .parser import get_arguments, initialize_parser
+from .benchmark import DEFAULT_RUNS, benchmark, write_ranking
+from .commands import _COMMANDS, Command, CommandGroup
+from .daemon import forward, serve
+from .execute import DEFAULT_OUTPUT_LIMIT, ExecutionResult, ShellSession
+from .git_diff import DEFAULT_DIFF_CONTEXT
+from .parser import get_arguments, initialize_parser, read_arguments
+from .prompt import get_calling_shell
 
+if TYPE_CHECKING:
+    from concurrent.futures import Future
 
-def _get_configuration() -> AggregateConfiguration:
+    import requests
+
+    from shell_craft.services import OpenAIService, SingleFlight, StreamDelta
+
+    from .batch import BatchRequest
+    from .rewrite import Rewriter
+
+T = TypeVar("T")
+
+_PROMPT_PACKS = PromptPacks()
+_CONFIGURATION_SNAPSHOT = ConfigurationSnapshot()
+
+def _config_keys(commands: list[Union[Command, CommandGroup]]) -> list[str]:
     """
-    Returns the configuration for the shell-craft CLI.
+    Returns the configuration keys the commands read their defaults from.
+
+    Args:
+        commands (list[Union[Command, CommandGroup]]): The commands.
 
     Returns:
-        AggregateConfiguration: The configuration for the shell-craft CLI.
+        list[str]: The configuration keys.
+    """
+    return [
+        command.config
+        for item in commands
+        for command in (item.commands if isinstance(item, CommandGroup) else [item])
+        if command.config
+    ]
+
+_CONFIG_KEYS = _config_keys(_COMMANDS)
+_ENVIRON_KEYS = [key.upper() for key in _CONFIG_KEYS] + ['SHELLCRAFT_CONFIG', 'XDG_CONFIG_HOME']
+
+def _configuration_paths(
+    cwd: Optional[str] = None,
+    environ: Optional[Mapping[str, str]] = None,
+) -> list[str]:
     """
+    Returns the paths of the configuration files, in order of precedence.
+
+    Args:
+        cwd (Optional[str]): The working directory to look for a config.json
+            in, defaults to the current working directory.
+        environ (Optional[Mapping[str, str]]): The environment variables,
+            defaults to os.environ.
+
+    Returns:
+        list[str]: The paths of the configuration files.
+    """
+    cwd = cwd or os.getcwd()
+    environ = os.environ if environ is None else environ
     expand = lambda path: pathlib.Path(path).expanduser().absolute().as_posix()
     join_expand = lambda *paths: expand(os.path.join(*paths))
     
     paths = [
-        expand(os.path.join(os.getcwd(), 'config.json')),
+        expand(os.path.join(cwd, 'config.json')),
         expand('~/.shell-craft/config.json'),
     ]
     
-    if os.environ.get('SHELLCRAFT_CONFIG'):
-        paths.append(expand(os.environ.get('SHELLCRAFT_CONFIG')))
+    if environ.get('SHELLCRAFT_CONFIG'):
+        paths.append(expand(environ.get('SHELLCRAFT_CONFIG')))
 
-    if os.environ.get('XDG_CONFIG_HOME'):
+    if environ.get('XDG_CONFIG_HOME'):
         paths.append(
             join_expand(
-                os.environ.get('XDG_CONFIG_HOME'),
+                environ.get('XDG_CONFIG_HOME'),
                 'shell-craft',
                 'config.json'
             )
         )
 
-    return AggregateConfiguration.from_files(paths) | {
-        key.lower(): value
-        for key, value in os.environ.items() 
-        if key.isupper()
+    return paths
+
+def _get_configuration(
+    cwd: Optional[str] = None,
+    environ: Optional[Mapping[str, str]] = None,
+) -> AggregateConfiguration:
+    """
+    Returns the configuration for the shell-craft CLI.
+
+    Args:
+        cwd (Optional[str]): The working directory to look for a config.json
+            in, defaults to the current working directory.
+        environ (Optional[Mapping[str, str]]): The environment variables,
+            defaults to os.environ.
+
+    Returns:
+        AggregateConfiguration: The configuration for the shell-craft CLI.
+    """
+    environ = os.environ if environ is None else environ
+
+    return AggregateConfiguration.from_files(
+        _configuration_paths(cwd, environ),
+        snapshot=_CONFIGURATION_SNAPSHOT,
+    ) | {
+        key: environ[key.upper()]
+        for key in _CONFIG_KEYS
+        if key.upper() in environ
     }
 
 def get_github_url_or_error(prompt: str, repository: str) -> str:
@@ -113,13 +203,19 @@ def _get_sub_prompt_name(args: Union[Namespace, dict]) -> Optional[str]:
     
     return None
     
-def _get_prompt(prompt_name: str, sub_prompt_name: Optional[str] = None) -> str:
+def _get_prompt(
+    prompt_name: str,
+    sub_prompt_name: Optional[str] = None,
+    diff: bool = False,
+) -> str:
     """
     Returns the prompt to use for the CLI.
 
     Args:
         prompt_name (str): The name of the prompt.
         sub_prompt_name (str): The name of the sub-prompt, defaults to None.
+        diff (bool): Whether the refactoring and documentation sub-prompts
+            ask for a unified diff instead of the whole code.
 
     Returns:
         str: The prompt to use for the CLI.
@@ -135,30 +231,152 @@ def _get_prompt(prompt_name: str, sub_prompt_name: Optional[str] = None) -> str:
     if sub_prompt_name:
         sub_prompt = subprompts.get(sub_prompt_name, '')
         prompt = getattr(prompt, sub_prompt, prompt)
+        if diff and sub_prompt_name in ("refactor", "document"):
+            prompt = with_diff_output(prompt)
         
     return prompt.messages
 
-def _generate_service(args: Namespace) -> OpenAIService:
+def _generate_cache(args: Namespace) -> Optional[ResponseCache]:
+    """
+    Generates the response cache for the CLI.
+
+    Args:
+        args (Namespace): The arguments to generate the cache with.
+
+    Returns:
+        Optional[ResponseCache]: The response cache, or None if disabled.
+    """
+    if getattr(args, "no_cache", False):
+        return None
+
+    return ResponseCache(
+        path=DEFAULT_CACHE_PATH,
+        ttl=getattr(args, "cache_ttl", DEFAULT_CACHE_TTL),
+    )
+
+def _generate_settings(args: Namespace) -> OpenAISettings:
+    """
+    Generates the OpenAI settings for the CLI.
+
+    Args:
+        args (Namespace): The arguments to generate the settings with.
+
+    Returns:
+        OpenAISettings: The OpenAI settings for the CLI.
+    """
+    with span("prompt", prompt=args.prompt):
+        messages = _get_prompt(args.prompt, _get_sub_prompt_name(args))
+
+    return OpenAISettings(
+        api_key=args.api_key,
+        model=args.model,
+        count=args.count,
+        temperature=args.temperature,
+        messages=messages,
+        pool_size=getattr(args, "pool_size", DEFAULT_POOL_SIZE),
+        timeout=getattr(args, "timeout", DEFAULT_TIMEOUT),
+        max_retries=getattr(args, "max_retries", DEFAULT_MAX_RETRIES),
+        requests_per_minute=getattr(args, "requests_per_minute", None),
+        tokens_per_minute=getattr(args, "tokens_per_minute", None),
+    )
+
+def _generate_service(
+    args: Namespace,
+    session: Optional["requests.Session"] = None,
+    limiter: Optional[RateLimiter] = None,
+    group: Optional["SingleFlight"] = None,
+) -> "OpenAIService":
     """
     Generates the OpenAI service for the CLI.
 
     Args:
         args (Namespace): The arguments to generate the service with.
+        session (Optional[requests.Session]): The HTTP session to reuse,
+            defaults to None which creates a new one.
+        limiter (Optional[RateLimiter]): The rate limiter to share, defaults
+            to None which creates a new one.
+        group (Optional[SingleFlight]): The group of in-flight queries to
+            coalesce identical queries with, defaults to None which does
+            not coalesce.
 
     Returns:
         OpenAIService: The OpenAI service for the CLI.
     """
-    return OpenAIService(
-        OpenAISettings(
-            api_key=args.api_key,
-            model=args.model,
-            count=args.count,
-            temperature=args.temperature,
-            messages=_get_prompt(args.prompt, _get_sub_prompt_name(args)),
+    settings = _generate_settings(args)
+
+    with span("service"):
+        from shell_craft.services import CoalescingService, OpenAIService
+
+        service = OpenAIService(
+            settings,
+            cache=_generate_cache(args),
+            session=session,
+            limiter=limiter,
         )
-    )
-        
-def _single_request(service: OpenAIService, args: Namespace) -> None:
+        return CoalescingService(service, group) if group else service
+
+def _should_stream(args: Namespace) -> bool:
+    """
+    Returns whether responses should be streamed. Streaming defaults to on
+    when writing to a terminal, and is never used for GitHub issues or a
+    model cascade since they need the complete response.
+
+    Args:
+        args (Namespace): The arguments to use.
+
+    Returns:
+        bool: True if responses should be streamed.
+    """
+    if getattr(args, "github", None) or getattr(args, "cascade", None):
+        return False
+
+    stream = getattr(args, "stream", None)
+    if stream is None:
+        return sys.stdout.isatty()
+
+    return stream
+
+def _print_stream(deltas: Iterable["StreamDelta"], count: int = 1) -> list[str]:
+    """
+    Prints streamed responses as they arrive. Each choice is printed in its
+    own section, in order; the current choice is printed live while later
+    choices are buffered until every choice before them has finished.
+
+    Args:
+        deltas (Iterable[StreamDelta]): The streamed response.
+        count (int): The number of choices to print, defaults to 1. Deltas
+            for later choices are ignored.
+
+    Returns:
+        list[str]: The complete text of each choice.
+    """
+    results = [''] * count
+    finished = [False] * count
+    current = 0
+
+    for delta in deltas:
+        if delta.index >= count:
+            continue
+
+        results[delta.index] += delta.content
+        finished[delta.index] = finished[delta.index] or delta.finished
+        if delta.index == current:
+            print(delta.content, end='', flush=True)
+
+        while current < count and finished[current]:
+            print()
+            current += 1
+            if current < count:
+                print(results[current], end='', flush=True)
+
+    for index in range(current, count):
+        if index != current:
+            print(results[index], end='')
+        print()
+
+    return results
+
+def _single_request(service: "OpenAIService", args: Namespace) -> None:
     """
     Handles a single request.
 
@@ -166,81 +384,996 @@ def _single_request(service: OpenAIService, args: Namespace) -> None:
         service (OpenAIService): The OpenAI service to use.
         args (Namespace): The arguments to use.
     """
-    results = service.query(message=' '.join(args.request))
+    if _get_sub_prompt_name(args) and getattr(args, "stdin_source", False):
+        chunks = split_source(
+            args.request[-1], getattr(args, "chunk_tokens", DEFAULT_CHUNK_TOKENS)
+        )
+        if len(chunks.chunks) > 1 or _diff_mode(args):
+            _source_request(service, args, ' '.join(args.request[:-1]), chunks)
+            return
+
+    if getattr(args, "first_valid", False):
+        _first_valid_request(service, args)
+        return
+
+    if _should_stream(args) and not getattr(args, "validate", False):
+        with span("stream"):
+            _print_stream(service.stream(message=' '.join(args.request)), args.count)
+        return
+
+    with span("query"):
+        if getattr(args, "cascade", None):
+            results, _ = _cascade(service, args.cascade, args.prompt, ' '.join(args.request))
+        else:
+            results = service.query(message=' '.join(args.request))
+
+    if getattr(args, "validate", False):
+        results = _valid_results(results, args.prompt)
     
-    github_url = getattr(args, "github", None)
-    for _, r in enumerate(results):
-        if github_url:
-            print(get_github_url_or_error(r, github_url))
+    with span("print"):
+        github_url = getattr(args, "github", None)
+        for _, r in enumerate(results):
+            if github_url:
+                print(get_github_url_or_error(r, github_url))
+            else:
+                print(r)
+
+def _valid_results(results: list[str], prompt: str) -> list[str]:
+    """
+    Drops the responses that fail the syntax check of the prompt's language,
+    checking them concurrently.
+
+    Args:
+        results (list[str]): The responses.
+        prompt (str): The name of the prompt, which selects the check.
+
+    Raises:
+        SystemExit: If no response passes the check.
+
+    Returns:
+        list[str]: The responses that pass, all of them if the language
+            cannot be checked here.
+    """
+    validator = get_validator(prompt)
+    if validator is None:
+        return results
+
+    with span("validate", candidates=len(results)):
+        errors = validate_all(validator, results)
+
+    valid = [result for result, error in zip(results, errors) if error is None]
+    if not valid:
+        raise SystemExit(f"No response passed the syntax check: {errors[0]}")
+
+    return valid
+
+def _first_valid(
+    deltas: Iterable["StreamDelta"],
+    count: int,
+    validator: Optional[Validator],
+) -> tuple[Optional[str], Optional[str]]:
+    """
+    Reads streamed responses until one has finished and passes the syntax
+    check. Each response is checked in the background as soon as it has
+    finished, while the others keep streaming. Checks still running when a
+    response passes are not waited for.
+
+    Args:
+        deltas (Iterable[StreamDelta]): The streamed responses.
+        count (int): The number of responses streamed.
+        validator (Optional[Validator]): The syntax check, None to accept
+            the first response that finishes.
+
+    Returns:
+        tuple[Optional[str], Optional[str]]: The first valid response, or
+            None and the error of the first response that failed.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    texts = [''] * count
+    checks: dict["Future", int] = {}
+    error = None
+
+    def finished() -> Optional[str]:
+        nonlocal error
+        for check in [check for check in checks if check.done()]:
+            index = checks.pop(check)
+            if check.result() is None:
+                return texts[index]
+            error = error or check.result()
+        return None
+
+    executor = ThreadPoolExecutor(max_workers=count)
+    try:
+        for delta in deltas:
+            if delta.index >= count:
+                continue
+
+            texts[delta.index] += delta.content
+            if delta.finished:
+                if validator is None:
+                    return texts[delta.index], None
+                checks[executor.submit(validator, strip_fence(texts[delta.index]))] = delta.index
+
+            result = finished()
+            if result is not None:
+                return result, None
+
+        for check in as_completed(list(checks)):
+            if check.result() is None:
+                return texts[checks[check]], None
+            error = error or check.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return None, error
+
+def _first_valid_request(service: "OpenAIService", args: Namespace) -> None:
+    """
+    Handles a request that prints only the first response passing the
+    syntax check. When streaming, the request is abandoned as soon as one
+    response has finished and passed, instead of waiting for all of them.
+    With a cascade, the first response of the first model that passes is
+    printed.
+
+    Args:
+        service (OpenAIService): The OpenAI service to use.
+        args (Namespace): The arguments to use.
+
+    Raises:
+        SystemExit: If no response passes the check.
+    """
+    message = ' '.join(args.request)
+    validator = get_validator(args.prompt)
+
+    if _should_stream(args):
+        with span("stream"):
+            deltas = service.stream(message=message)
+            try:
+                result, error = _first_valid(deltas, args.count, validator)
+            finally:
+                deltas.close()
+    elif getattr(args, "cascade", None):
+        results, error = _cascade(service, args.cascade, args.prompt, message)
+        result = None if error else results[0]
+    else:
+        with span("query"):
+            results = service.query(message=message)
+        with span("validate", candidates=len(results)):
+            errors = validate_all(validator, results) if validator else [None] * len(results)
+        result = next(
+            (result for result, error in zip(results, errors) if error is None), None
+        )
+        error = next((error for error in errors if error), None)
+
+    if result is None:
+        raise SystemExit(f"No response passed the syntax check: {error}")
+
+    with span("print"):
+        print(result)
+
+def _cascade(
+    service: "OpenAIService",
+    models: list[str],
+    prompt: str,
+    message: str,
+) -> tuple[list[str], Optional[str]]:
+    """
+    Queries a chain of models in order until one returns code that passes
+    the local syntax check of the prompt's language. Only the responses
+    that pass are returned. If no model passes, the responses of the last
+    model are returned with a warning, and if the language cannot be
+    checked here the first model is trusted. The responses of a model are
+    checked concurrently.
+
+    Args:
+        service (OpenAIService): The OpenAI service whose connections are
+            shared by every model.
+        models (list[str]): The models to try, cheapest first.
+        prompt (str): The name of the prompt, which selects the check.
+        message (str): The message to query the models with.
+
+    Returns:
+        tuple[list[str], Optional[str]]: The responses, and the syntax error
+            of the last model if no model passed.
+    """
+    validator = get_validator(prompt)
+    results: list[str] = []
+    error = None
+    for model in models:
+        with span("cascade", model=model):
+            results = service.with_settings(
+                replace(service.settings, model=model)
+            ).query(message)
+            if validator is None:
+                return results, None
+
+            errors = validate_all(validator, results)
+            valid = [
+                result for result, problem in zip(results, errors) if problem is None
+            ]
+            annotate(valid=len(valid))
+
+        if valid:
+            return valid, None
+
+        error = errors[0]
+
+    print(f"No model returned valid code: {error}", file=sys.stderr)
+    return results, error
+
+def _diff_mode(args: Namespace) -> bool:
+    """
+    Returns whether the model is asked for unified diffs, which only applies
+    to refactoring and documenting.
+
+    Args:
+        args (Namespace): The arguments to use.
+
+    Returns:
+        bool: True if the model is asked for diffs.
+    """
+    return getattr(args, "diff", False) and _get_sub_prompt_name(args) in (
+        "refactor", "document"
+    )
+
+def _with_rewriter(
+    args: Namespace,
+    settings: OpenAISettings,
+    work: Callable[["Rewriter"], Awaitable[T]],
+    limiter: Optional[RateLimiter] = None,
+) -> T:
+    """
+    Runs work with a rewriter that queries at most --workers requests at a
+    time, asking for diffs in --diff mode.
+
+    Args:
+        args (Namespace): The arguments to use.
+        settings (OpenAISettings): The settings for whole responses.
+        work (Callable[[Rewriter], Awaitable[T]]): The work to run.
+        limiter (Optional[RateLimiter]): The rate limiter to share, defaults
+            to None which creates a new one.
+
+    Returns:
+        T: The result of the work.
+    """
+    import asyncio
+
+    from shell_craft.services import AsyncOpenAIService
+
+    from .rewrite import Rewriter
+
+    def service(settings: OpenAISettings, limiter: Optional[RateLimiter]) -> AsyncOpenAIService:
+        return AsyncOpenAIService(
+            settings,
+            cache=_generate_cache(args),
+            concurrency=getattr(args, "workers", 8),
+            limiter=limiter,
+        )
+
+    whole = service(settings, limiter)
+    diff = None
+    if _diff_mode(args):
+        diff = service(
+            replace(
+                settings,
+                messages=_get_prompt(args.prompt, _get_sub_prompt_name(args), diff=True),
+            ),
+            whole.limiter,
+        )
+    rewriter = Rewriter(whole, diff)
+
+    async def run() -> T:
+        try:
+            return await work(rewriter)
+        finally:
+            await rewriter.aclose()
+
+    try:
+        return asyncio.run(run())
+    finally:
+        annotate(fallbacks=rewriter.fallbacks)
+
+def _source_request(
+    service: "OpenAIService",
+    args: Namespace,
+    instruction: str,
+    chunks: Chunks,
+) -> None:
+    """
+    Handles a request for a source that is too large for a single query or
+    is rewritten with diffs. The chunks are queried concurrently and joined
+    in order, so the request takes about as long as its largest chunk. In
+    --diff mode a patch of the source is printed, or the patched source
+    with --apply.
+
+    Args:
+        service (OpenAIService): The OpenAI service whose settings and rate
+            limiter are used.
+        args (Namespace): The arguments to use.
+        instruction (str): The request given with the source, if any.
+        chunks (Chunks): The split source.
+    """
+    rewrite = _get_sub_prompt_name(args) != "test"
+
+    def work(rewriter: "Rewriter") -> Awaitable[str]:
+        if rewrite:
+            return rewriter.rewrite(chunks, instruction)
+        return rewriter.generate(chunks, instruction)
+
+    with span("chunks", chunks=len(chunks.chunks)):
+        result = _with_rewriter(args, service.settings, work, service.limiter)
+
+    with span("print"):
+        if _diff_mode(args) and not getattr(args, "apply", False):
+            print(unified_diff(''.join(chunks.chunks), result, "a/stdin", "b/stdin"), end='')
+        else:
+            print(result, end='' if result.endswith('\n') else '\n')
+
+def _rank_by_runtime(service: "OpenAIService", args: Namespace) -> None:
+    """
+    Generates commands, runs each of them after confirmation and prints them
+    ranked by runtime. Commands run in a scratch directory that holds a copy
+    of the --dry-input sample, if given.
+
+    Args:
+        service (OpenAIService): The OpenAI service to use.
+        args (Namespace): The arguments to use.
+    """
+    with span("query"):
+        candidates = list(dict.fromkeys(service.query(message=' '.join(args.request))))
+
+    for position, candidate in enumerate(candidates, 1):
+        print(f"{position}. {candidate}")
+
+    print()
+    runs = getattr(args, "runs", DEFAULT_RUNS)
+    if input(f"Run {len(candidates)} commands {runs} times each? (y/n) ").lower() != "y":
+        return
+
+    with span("benchmark", candidates=len(candidates), runs=runs):
+        ranking = benchmark(
+            candidates,
+            shell="powershell" if args.prompt == "powershell" else "bash",
+            runs=runs,
+            sample=getattr(args, "dry_input", None),
+            timeout=getattr(args, "exec_timeout", None),
+        )
+
+    print()
+    write_ranking(ranking, sys.stdout)
+
+def _batch(args: Namespace) -> None:
+    """
+    Handles a batch of requests read from a file or stdin, writing the
+    results to stdout as JSON lines.
+
+    Args:
+        args (Namespace): The arguments to use.
+
+    Raises:
+        SystemExit: With status 1 if any request failed.
+    """
+    from shell_craft.services import (AsyncCoalescingService,
+                                      AsyncOpenAIService)
+
+    from .batch import BatchRequest, run_batch
+
+    settings = _generate_settings(args)
+    sub_prompt_name = _get_sub_prompt_name(args)
+
+    def settings_for(request: "BatchRequest") -> OpenAISettings:
+        return replace(
+            settings,
+            model=request.model or settings.model,
+            count=request.count or settings.count,
+            temperature=(
+                settings.temperature
+                if request.temperature is None
+                else request.temperature
+            ),
+            messages=(
+                _get_prompt(request.prompt, sub_prompt_name)
+                if request.prompt
+                else settings.messages
+            ),
+        )
+
+    service = AsyncCoalescingService(
+        AsyncOpenAIService(
+            settings,
+            cache=_generate_cache(args),
+            concurrency=args.workers,
+        )
+    )
+
+    file = sys.stdin if args.batch == '-' else open(args.batch, 'r')
+    try:
+        with span("batch"):
+            failures = run_batch(
+                file,
+                service,
+                settings_for,
+                sys.stdout,
+                workers=args.workers,
+                ordered=not args.unordered,
+            )
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+    if failures:
+        raise SystemExit(1)
+
+def _tree(args: Namespace) -> None:
+    """
+    Handles processing every file of a directory tree, writing the results
+    next to the sources or to the output directory.
+
+    Args:
+        args (Namespace): The arguments to use.
+    """
+    from .tree import run_tree
+
+    sub_prompt_name = _get_sub_prompt_name(args)
+    if not sub_prompt_name:
+        raise SystemExit("--tree requires --refactor, --document or --test.")
+
+    extensions = PromptFactory.get_prompt(args.prompt).extensions
+    if not extensions:
+        raise SystemExit(
+            f"The {args.prompt} prompt has no file extensions to select files by."
+        )
+
+    output_dir = getattr(args, "output_dir", None)
+    in_place = getattr(args, "apply", False) and sub_prompt_name != "test"
+    if in_place and output_dir:
+        raise SystemExit("--apply writes over the sources and cannot be used with --output-dir.")
+
+    settings = _generate_settings(args)
+    budget = getattr(args, "chunk_tokens", DEFAULT_CHUNK_TOKENS)
+    fingerprint = ResponseCache.key({
+        "model": settings.model,
+        "temperature": settings.temperature,
+        "messages": settings.messages,
+        "chunk_tokens": budget,
+    })
+
+    with span("tree"):
+        summary = _with_rewriter(
+            args,
+            settings,
+            lambda rewriter: run_tree(
+                pathlib.Path(args.tree),
+                rewriter,
+                extensions,
+                sub_prompt_name,
+                fingerprint,
+                output_dir=pathlib.Path(output_dir) if output_dir else None,
+                in_place=in_place,
+                instruction=' '.join(args.request),
+                budget=budget,
+                workers=getattr(args, "workers", 8),
+            ),
+        )
+
+    print(
+        f"Processed {summary.processed} files, skipped {summary.unchanged} "
+        f"unchanged, {summary.failed} failed."
+    )
+    if summary.failed:
+        raise SystemExit(1)
+
+def _git_diff(args: Namespace) -> None:
+    """
+    Handles refactoring, documenting or testing only the regions changed
+    since a revision. The regions are queried concurrently and the results
+    printed as a patch: refactored and documented regions replace the
+    originals, tests are added next to the changed files. A test file that
+    already exists is replaced in the patch, but never overwritten by
+    --apply.
+
+    Args:
+        args (Namespace): The arguments to use.
+
+    Raises:
+        SystemExit: With status 1 if --apply skipped an existing test file.
+    """
+    import asyncio
+
+    from .git_diff import (addition_patch, changed_regions, region_instruction,
+                           replace_regions, replacement_patch)
+    from .tree import result_path
+
+    sub_prompt_name = _get_sub_prompt_name(args)
+    if not sub_prompt_name:
+        raise SystemExit("--git-diff requires --refactor, --document or --test.")
+
+    with span("git_diff", revision=args.git_diff):
+        try:
+            regions = changed_regions(
+                args.git_diff,
+                getattr(args, "git_diff_context", DEFAULT_DIFF_CONTEXT),
+                PromptFactory.get_prompt(args.prompt).extensions,
+            )
+        except ValueError as error:
+            raise SystemExit(str(error))
+
+    if not regions:
+        print(f"No changes since {args.git_diff}.", file=sys.stderr)
+        return
+
+    budget = getattr(args, "chunk_tokens", DEFAULT_CHUNK_TOKENS)
+    instruction = ' '.join(args.request)
+    test = sub_prompt_name == "test"
+
+    async def work(rewriter: "Rewriter") -> list[str]:
+        process = rewriter.generate if test else rewriter.rewrite
+        return await asyncio.gather(*[
+            process(split_source(region.text, budget), region_instruction(region, instruction))
+            for region in regions
+        ])
+
+    with span("chunks", regions=len(regions)):
+        results = _with_rewriter(args, _generate_settings(args), work)
+
+    texts: dict[str, list] = {}
+    for region, text in zip(regions, results):
+        texts.setdefault(region.path, []).append((region, text))
+
+    apply = getattr(args, "apply", False)
+    skipped = False
+    for path, replacements in texts.items():
+        if test:
+            target = result_path(pathlib.PurePosixPath(path), "test").as_posix()
+            text = '\n\n'.join(text.rstrip('\n') for _, text in replacements)
+            existing = pathlib.Path(target).read_text() if os.path.exists(target) else None
+            if apply and existing is not None:
+                print(f"Skipped {target}, it already exists.", file=sys.stderr)
+                skipped = True
+            elif apply:
+                pathlib.Path(target).write_text(text + '\n')
+                print(f"Wrote {target}", file=sys.stderr)
+            else:
+                print(addition_patch(target, text, existing), end='')
+            continue
+
+        with open(path) as file:
+            original = file.read()
+        if apply:
+            with open(path, 'w') as file:
+                file.write(replace_regions(original, replacements))
+            print(f"Updated {path}", file=sys.stderr)
         else:
-            print(r)
+            print(replacement_patch(path, original, replacements), end='')
+
+    if skipped:
+        raise SystemExit(1)
 
-def _interactive(service: OpenAIService, shell: str = "bash") -> None:
+def _report_execution(result: ExecutionResult) -> None:
     """
-    Handles an interactive session.
+    Reports how an executed command ended, when it did not succeed.
+
+    Args:
+        result (ExecutionResult): The result of the command.
+    """
+    if result.timed_out:
+        print(f"Command timed out after {result.duration:.1f} seconds.")
+    elif result.status:
+        print(f"Command exited with status {result.status}.")
+
+def _print_history(entries: list[HistoryEntry]) -> None:
+    """
+    Prints history entries with the ids to recall them by.
+
+    Args:
+        entries (list[HistoryEntry]): The entries to print.
+    """
+    if not entries:
+        print("No matching history.")
+
+    for entry in entries:
+        print(f"[{entry.id}] {entry.request}")
+        for line in entry.response.splitlines():
+            print(f"    {line}")
+
+def _recall(history: Optional[History], argument: str) -> Optional[HistoryEntry]:
+    """
+    Gets the history entry named by the argument of !recall, printing why
+    when there is none.
+
+    Args:
+        history (Optional[History]): The history, None if it is disabled.
+        argument (str): The id of the entry.
+
+    Returns:
+        Optional[HistoryEntry]: The entry, or None if it cannot be recalled.
+    """
+    if history is None:
+        print("History is disabled.")
+        return None
+
+    if not argument.strip().isdigit():
+        print("Usage: !recall <id>")
+        return None
+
+    entry = history.get(int(argument))
+    if entry is None:
+        print(f"No history entry {argument.strip()}.")
+
+    return entry
+
+def _interactive(
+    service: "OpenAIService",
+    shell: str = "bash",
+    stream: bool = False,
+    reload: Optional[Callable[[], Optional[OpenAISettings]]] = None,
+    timeout: Optional[float] = None,
+    output_limit: int = DEFAULT_OUTPUT_LIMIT,
+    history: Optional[History] = None,
+) -> None:
+    """
+    Handles an interactive session. Every request, response and execution
+    result is stored in the history, `!search <terms>` lists earlier
+    requests matching the terms and `!recall <id>` answers with an earlier
+    response without querying the model.
     
     ..  warning::
     
-        Interactive mode does not store the history of the session. This means
-        that the model will not be able to learn from the previous messages.
-        Which is different from how ChatGPT or other LLM models handle threads.
+        The history is not sent with new requests. This means that the model
+        will not be able to learn from the previous messages. Which is
+        different from how ChatGPT or other LLM models handle threads.
 
     :param service: The OpenAI service to use.
     :type service: OpenAIService
+    :param shell: The shell to execute commands with. Commands are run one
+        after another in the same shell, so state like the working directory
+        carries over to the next command.
+    :type shell: str
+    :param stream: Whether to print responses as they are generated.
+    :type stream: bool
+    :param reload: Called before every turn, returns new settings when the
+        configuration changed. The service is then swapped for one with the
+        new settings that keeps the connection pool, cache and rate limiter.
+    :type reload: Optional[Callable[[], Optional[OpenAISettings]]]
+    :param timeout: The number of seconds after which an executed command is
+        killed, None for no limit.
+    :type timeout: Optional[float]
+    :param output_limit: The number of bytes of command output to retain.
+    :type output_limit: int
+    :param history: The history to store the session in and search, None
+        to disable it.
+    :type history: Optional[History]
     """    
     print("Welcome to Shell Craft interactive mode.")
     print("Type 'exit' or Ctrl+C to exit the program.")
     print()
     
-    while True:
-        try:
-            message = input(">>> ")
-            
-            if message == "exit":
+    with ShellSession(shell) as session:
+        while True:
+            settings = reload() if reload else None
+            if settings and settings != service.settings:
+                service = service.with_settings(settings)
+            service.warm_up()
+            try:
+                message = input(">>> ")
+                
+                if message == "exit":
+                    break
+
+                command, _, argument = message.partition(" ")
+                if command == "!search":
+                    if history is None:
+                        print("History is disabled.")
+                    else:
+                        _print_history(history.search(argument))
+                    print()
+                    continue
+
+                if command == "!recall":
+                    entry = _recall(history, argument)
+                    if entry is None:
+                        print()
+                        continue
+                    results, entry_id = entry.response, entry.id
+                    print(results)
+                else:
+                    if stream:
+                        results = _print_stream(service.stream(message=message))[0]
+                    else:
+                        results = service.query(message=message)[0]
+                        print(results)
+                    entry_id = history.add(shell, message, results) if history else None
+                
+                print()
+                if input("Execute? (y/n) ").lower() == "y":
+                    try:
+                        result = session.run(results, timeout=timeout, limit=output_limit)
+                        _report_execution(result)
+                        if entry_id is not None:
+                            history.record_execution(entry_id, result.status, result.output)
+                    except KeyboardInterrupt:
+                        print()
+                        print("Command interrupted.")
+        
+            except KeyboardInterrupt:
+                print()
+                break
+            except EOFError:
+                print()
                 break
-            
-            results = service.query(message=message)[0]
-            print(results)
-            
-            print()
-            if input("Execute? (y/n) ").lower() == "y":
-                results = subprocess.run(
-                    f'{shell} -c "{results}"',
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    shell=True
-                )
-                print(results.stdout.decode("utf-8"))
-    
-        except KeyboardInterrupt:
-            print()
-            break
-        except EOFError:
-            print()
-            break
             
     
-def main() -> None:
+def _parse_arguments(
+    arguments: Optional[list[str]] = None,
+    configuration: Optional[AggregateConfiguration] = None,
+) -> Namespace:
     """
-    Main function that processes the command-line arguments and queries the
-    OpenAI API using shell_craft.
+    Parses the arguments of the CLI.
+
+    Args:
+        arguments (Optional[list[str]]): The arguments to parse, defaults to
+            None which reads them from the command line and stdin.
+        configuration (Optional[AggregateConfiguration]): The configuration
+            to read defaults from, defaults to None which loads it from disk.
+
+    Returns:
+        Namespace: The parsed arguments.
     """
-    args = get_arguments(
-        initialize_parser(
+    if configuration is None:
+        with span("configuration"):
+            configuration = _get_configuration()
+
+    with span("prompt_packs"):
+        _PROMPT_PACKS.install(REGISTRY)
+
+    with span("parser"):
+        parser = initialize_parser(
             ArgumentParser(
                 prog="shell-craft",
                 description="Generating shell commands and code using natural language models (OpenAI ChatGPT).",
                 add_help=False
             ),
             commands=_COMMANDS,
-            configuration=_get_configuration()
-        ),
+            configuration=configuration,
+            arguments=arguments,
+        )
+
+    with span("arguments"):
+        return get_arguments(parser, arguments)
+
+@contextmanager
+def _settings_reloader(
+    arguments: Optional[list[str]],
+) -> Iterator[Callable[[], Optional[OpenAISettings]]]:
+    """
+    Yields a function that reloads the settings of the given arguments
+    when a configuration file changed. Invalid configurations are reported
+    and the previous settings are kept. The configuration files are no
+    longer watched once the context exits.
+
+    Args:
+        arguments (Optional[list[str]]): The arguments to parse with the
+            reloaded configuration, defaults to None which uses the command
+            line.
+
+    Yields:
+        Callable[[], Optional[OpenAISettings]]: A function returning the new
+            settings, or None when nothing changed.
+    """
+    from shell_craft.watcher import FileWatcher
+
+    watcher = FileWatcher(_configuration_paths())
+    arguments = sys.argv[1:] if arguments is None else arguments
+
+    def reload() -> Optional[OpenAISettings]:
+        if not watcher.changed():
+            return None
+
+        try:
+            return _generate_settings(
+                _parse_arguments(arguments, _get_configuration())
+            )
+        except (ValueError, SystemExit) as error:
+            print(f"Ignoring invalid configuration: {error}", file=sys.stderr)
+            return None
+
+    try:
+        yield reload
+    finally:
+        watcher.close()
+
+def _write_timings(tracer: Tracer, args: Namespace, cwd: Optional[str] = None) -> None:
+    """
+    Writes the timings of a run as a table to stderr with --timings, and
+    appends them as JSON lines to the --trace file.
+
+    Args:
+        tracer (Tracer): The tracer that recorded the run.
+        args (Namespace): The arguments of the run.
+        cwd (Optional[str]): The directory a relative --trace path is
+            resolved against, defaults to the current working directory.
+    """
+    if getattr(args, "timings", False):
+        tracer.write_table(sys.stderr)
+
+    if getattr(args, "trace", None):
+        path = os.path.join(cwd or os.getcwd(), os.path.expanduser(args.trace))
+        with open(path, "a") as file:
+            tracer.write_json(file)
+
+def _run(
+    arguments: Optional[list[str]] = None,
+    configuration: Optional[AggregateConfiguration] = None,
+    session: Optional["requests.Session"] = None,
+    limiter: Optional[RateLimiter] = None,
+    tracer: Optional[Tracer] = None,
+    group: Optional["SingleFlight"] = None,
+    cwd: Optional[str] = None,
+) -> None:
+    """
+    Processes the arguments and queries the OpenAI API using shell_craft.
+
+    Args:
+        arguments (Optional[list[str]]): The arguments to process, defaults
+            to None which reads them from the command line and stdin.
+        configuration (Optional[AggregateConfiguration]): The configuration
+            to use, defaults to None which loads it from disk.
+        session (Optional[requests.Session]): The HTTP session to reuse,
+            defaults to None which creates a new one.
+        limiter (Optional[RateLimiter]): The rate limiter to share, defaults
+            to None which creates a new one.
+        tracer (Optional[Tracer]): The tracer that times the run, defaults
+            to a new one.
+        group (Optional[SingleFlight]): The group of in-flight queries
+            shared with concurrent runs, defaults to None which does not
+            coalesce queries.
+        cwd (Optional[str]): The working directory of the client when run
+            by the daemon, defaults to the current working directory.
+    """
+    tracer = tracer or Tracer()
+    with tracer.activate():
+        args = _parse_arguments(arguments, configuration)
+
+        try:
+            if getattr(args, "batch", None):
+                _batch(args)
+                return
+
+            if getattr(args, "tree", None):
+                _tree(args)
+                return
+
+            if getattr(args, "git_diff", None):
+                _git_diff(args)
+                return
+
+            service = _generate_service(args, session, limiter, group)
+
+            if args.interactive:
+                shell = "powershell" if args.prompt == "powershell" else "bash"
+                history = None
+                if not getattr(args, "no_history", False):
+                    history = History(getattr(args, "history", None) or DEFAULT_HISTORY_PATH)
+                try:
+                    with _settings_reloader(arguments) as reload:
+                        _interactive(
+                            service,
+                            shell,
+                            _should_stream(args),
+                            reload,
+                            timeout=getattr(args, "exec_timeout", None),
+                            output_limit=getattr(args, "output_limit", DEFAULT_OUTPUT_LIMIT),
+                            history=history,
+                        )
+                finally:
+                    if history is not None:
+                        history.close()
+            elif getattr(args, "rank_by_runtime", False):
+                _rank_by_runtime(service, args)
+            else:
+                _single_request(service, args)
+        finally:
+            _write_timings(tracer, args, cwd)
+
+def _daemon() -> None:
+    """
+    Runs the daemon. The HTTP session and rate limiter are created once from
+    the daemon's own configuration and shared by every request it serves,
+    while each request is parsed with the configuration of the client's
+    working directory and environment, defaulting to the client's shell.
+    Identical queries served at the same time share one call to OpenAI.
+    """
+    from shell_craft.services import SingleFlight
+    from shell_craft.services.openai import pooled_session
+
+    args = _parse_arguments([])
+    session = pooled_session(args.pool_size)
+    limiter = RateLimiter(args.requests_per_minute, args.tokens_per_minute)
+    group = SingleFlight()
+    _generate_service(args, session, limiter).warm_up()
+
+    serve(_daemon_handler(session, limiter, group))
+
+def _daemon_handler(
+    session: Optional["requests.Session"] = None,
+    limiter: Optional[RateLimiter] = None,
+    group: Optional["SingleFlight"] = None,
+) -> Callable[[list[str], str, dict[str, str], Optional[str]], None]:
+    """
+    Returns the function the daemon serves requests with. Each request is
+    parsed with the configuration of the client's working directory and
+    environment, and files are written relative to the client's directory.
+
+    Args:
+        session (Optional[requests.Session]): The HTTP session to share.
+        limiter (Optional[RateLimiter]): The rate limiter to share.
+        group (Optional[SingleFlight]): The group of in-flight queries to
+            share.
+
+    Returns:
+        Callable[[list[str], str, dict[str, str], Optional[str]], None]: The
+            handler of a request.
+    """
+    def handle(arguments: list[str], cwd: str, environ: dict[str, str],
+               shell: Optional[str]) -> None:
+        tracer = Tracer()
+        with tracer.activate(), span("configuration"):
+            configuration = _get_configuration(cwd, environ)
+            if shell:
+                configuration.setdefault('shell_craft_prompt', shell)
+
+        _run(arguments, configuration, session, limiter, tracer, group, cwd)
+
+    return handle
+
+def _completion(arguments: list[str]) -> None:
+    """
+    Prints a static completion script for a shell, generated from the
+    commands and the prompts installed from prompt packs.
+
+    Args:
+        arguments (list[str]): The arguments after `completion`.
+    """
+    from .completion import SHELLS, completion_script
+
+    parser = ArgumentParser(
+        prog="shell-craft completion",
+        description="Print a completion script for the shell. Completing with it does not start Python.",
     )
-    
-    service = _generate_service(args)
-    
-    if args.interactive:
-        shell = "powershell" if args.prompt == "powershell" else "bash"
-        _interactive(service, shell)
-    else:
-        _single_request(service, args)
+    parser.add_argument("shell", choices=SHELLS, help="The shell to complete in.")
+    args = parser.parse_args(arguments)
+
+    _PROMPT_PACKS.install(REGISTRY)
+    print(completion_script(args.shell, _COMMANDS, REGISTRY), end="")
+
+def main() -> None:
+    """
+    Main function that processes the command-line arguments and queries the
+    OpenAI API using shell_craft.
+
+    `shell-craft daemon` starts a daemon that serves later invocations over a
+    Unix socket. Every other invocation is forwarded to a running daemon when
+    possible, and processed in this process otherwise. `shell-craft completion
+    <shell>` prints a completion script for the shell.
+    """
+    if sys.argv[1:2] == ["daemon"]:
+        _daemon()
+        return
+
+    if sys.argv[1:2] == ["completion"]:
+        _completion(sys.argv[2:])
+        return
+
+    tracer = Tracer()
+    with tracer.activate():
+        with span("read_arguments"):
+            arguments = read_arguments()
+
+        with span("forward"):
+            status = forward(arguments, environ_keys=_ENVIRON_KEYS)
+
+    if status is not None:
+        sys.exit(status)
+
+    _run(arguments, tracer=tracer)
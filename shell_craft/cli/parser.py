@@ -18,29 +18,43 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-from argparse import ArgumentParser, Namespace
-from dataclasses import asdict
+from argparse import SUPPRESS, ArgumentParser, Namespace
+from dataclasses import fields
 from sys import argv, stdin
-from typing import Callable
+from typing import Callable, Optional
 
 from shell_craft.configuration import Configuration
 from shell_craft.factories import PromptFactory
+from shell_craft.prompts import Prompt, PromptRegistry
 
 from .commands import Command, CommandGroup, CommandRestriction
+from .prompt import get_calling_shell
 
+_STDIN_FLAG = "--stdin-source"
 
 class ShellCraftParser:
-    def __init__(self, parser: ArgumentParser, config: Configuration) -> None:
+    def __init__(
+        self,
+        parser: ArgumentParser,
+        config: Configuration,
+        arguments: Optional[list[str]] = None,
+    ) -> None:
         """
         Initialize the application parser with the given argparse parser. This
         is known as a proxy pattern or facade pattern.
 
         Args:
             parser (ArgumentParser): The argparse parser to use for the application.
+            config (Configuration): The configuration to read defaults from.
+            arguments (Optional[list[str]]): The arguments that will be parsed,
+                defaults to None which uses the command line.
         """        
         self._parser = parser
         self._config = config
+        self._arguments = arguments
         self._commands: list[Command | CommandGroup] = []
+        self._flags: set[str] = set()
+        self._prompt: Optional[tuple[str, Prompt]] = None
 
     @property
     def flags(self) -> list[str]:
@@ -56,6 +70,22 @@ class ShellCraftParser:
             for flag in command.flags
         ]
 
+    def _selected_prompt(self) -> tuple[str, Prompt]:
+        """
+        Get the name and prompt selected by the arguments, the configuration
+        or the calling shell. The arguments are parsed once, on the first
+        restriction check, and the result is shared by every later check.
+
+        Returns:
+            tuple[str, Prompt]: The name of the prompt and the prompt.
+        """
+        if self._prompt is None:
+            known_args, _ = self._parser.parse_known_args(self._arguments)
+            prompt_name = PromptRegistry.key(known_args.prompt or get_calling_shell())
+            self._prompt = (prompt_name, PromptFactory.get_prompt(prompt_name))
+
+        return self._prompt
+
     def add_command(self, command: Command, override: Callable = None) -> "ShellCraftParser":
         """
         Add a command to the parser.
@@ -72,15 +102,16 @@ class ShellCraftParser:
 
         flags = ' '.join(command.flags)
         kwargs = {
-            key: value
-            for key, value in asdict(command).items()
-            if value is not None
-            and key not in ['flags', 'restrictions', 'config']
+            field.name: getattr(command, field.name)
+            for field in fields(command)
+            if getattr(command, field.name) is not None
+            and field.name not in ['flags', 'restrictions', 'config']
         }
         kwargs['default'] = self._config.get(command.config) or command.default
 
         adder(flags, **kwargs)
         self._commands.append(command)
+        self._flags.update(command.flags)
 
         return self
     
@@ -116,14 +147,10 @@ class ShellCraftParser:
         if not command.restrictions:
             return True
         
-        if '--prompt' not in self.flags:
-            return False
-        
-        known_args, l = self._parser.parse_known_args()
-        if not known_args.prompt:
+        if '--prompt' not in self._flags:
             return False
         
-        prompt = PromptFactory.get_prompt(known_args.prompt)
+        prompt_name, prompt = self._selected_prompt()
         
         for restriction in command.restrictions:
             if restriction == CommandRestriction.PROMPT_TYPE:
@@ -131,9 +158,7 @@ class ShellCraftParser:
                     continue
 
             if restriction == CommandRestriction.PROMPT_NAME:
-                prompt_name = known_args.prompt.upper() + "_PROMPT"
-
-                if prompt_name in command.restrictions[restriction]:
+                if prompt_name.upper() + "_PROMPT" in command.restrictions[restriction]:
                     continue
             
             return False
@@ -141,7 +166,12 @@ class ShellCraftParser:
         return True
 
 
-def initialize_parser(parser: ArgumentParser, commands: list[Command | CommandGroup], configuration: Configuration) -> ArgumentParser:
+def initialize_parser(
+    parser: ArgumentParser,
+    commands: list[Command | CommandGroup],
+    configuration: Configuration,
+    arguments: Optional[list[str]] = None,
+) -> ArgumentParser:
     """
     Initialize the parser with the given commands and command groups. This will add
     the commands and command groups to the parser and return the parser.
@@ -150,11 +180,16 @@ def initialize_parser(parser: ArgumentParser, commands: list[Command | CommandGr
         parser (ArgumentParser): The parser to initialize.
         commands (list[Command  |  CommandGroup]): The commands and command groups to add to the parser.
         configuration (Configuration): The configuration to use for the parser.
+        arguments (Optional[list[str]]): The arguments that will be parsed,
+            defaults to None which uses the command line.
 
     Returns:
         ArgumentParser: The parser with the commands and command groups added.
     """
-    _parser = ShellCraftParser(parser, configuration)
+    parser.add_argument(
+        _STDIN_FLAG, dest='stdin_source', action='store_true', help=SUPPRESS
+    )
+    _parser = ShellCraftParser(parser, configuration, arguments)
     for command in commands:
         if not _parser.can_add(command):
             continue
@@ -166,30 +201,73 @@ def initialize_parser(parser: ArgumentParser, commands: list[Command | CommandGr
         
     return parser
 
-def get_arguments(parser: ArgumentParser) -> Namespace:
+def _batch_from_stdin(arguments: list[str]) -> bool:
     """
-    Get the arguments from the parser. If there is no input from stdin, then
-    the arguments will be parsed from the command line. If there is input from
-    stdin, then the arguments will be parsed from the command line and stdin after
-    calling a flush on stdin.
+    Determine if the arguments read a batch from stdin, in which case stdin
+    must be left for the batch instead of being appended to the request.
 
     Args:
-        parser (ArgumentParser): The parser to get arguments from.
+        arguments (list[str]): The command line arguments.
 
     Returns:
-        Namespace: The arguments from the parser.
+        bool: True if the batch is read from stdin, otherwise False.
+    """
+    return '--batch=-' in arguments or any(
+        argument == '--batch' and value == '-'
+        for argument, value in zip(arguments, arguments[1:])
+    )
+
+def read_arguments() -> list[str]:
+    """
+    Read the arguments from the command line. If there is input from stdin,
+    it is appended to the arguments as a single argument after calling a
+    flush on stdin, unless a batch is read from stdin. Keeping it whole
+    preserves its lines exactly, so large sources can be split again. The
+    arguments are then marked with a hidden flag, parsed to stdin_source,
+    so the last argument is only treated as a source when it came from
+    stdin.
+
+    Returns:
+        list[str]: The arguments to parse.
     """
     arguments: list[str] = argv[1:]
 
-    if not stdin.isatty():
+    if not stdin.isatty() and not _batch_from_stdin(arguments):
         stdin.flush()
-        arguments += stdin.readlines()
+        source = stdin.read()
+        if source:
+            arguments = [_STDIN_FLAG, *arguments, source]
+
+    return arguments
+
+def get_arguments(parser: ArgumentParser, arguments: Optional[list[str]] = None) -> Namespace:
+    """
+    Get the arguments from the parser. If no arguments are given, they are
+    read from the command line and stdin by read_arguments. If no prompt was
+    given or configured, the prompt of the calling shell is used. The prompt
+    is normalized to its registry key, so "BASH" and "bash_prompt" both
+    become "bash".
+
+    Args:
+        parser (ArgumentParser): The parser to get arguments from.
+        arguments (Optional[list[str]]): The arguments to parse, defaults to
+            None which reads them from the command line and stdin.
 
-    return parser.parse_args(arguments)
+    Returns:
+        Namespace: The arguments from the parser.
+    """
+    if arguments is None:
+        arguments = read_arguments()
+
+    args = parser.parse_args(arguments)
+    if hasattr(args, 'prompt'):
+        args.prompt = PromptRegistry.key(args.prompt or get_calling_shell())
+
+    return args
 
 __all__ = [
     "get_arguments",
-    "initialize_parser"
-    "ShellCraftParser"
+    "initialize_parser",
+    "read_arguments",
+    "ShellCraftParser",
 ]
-
@@ -18,11 +18,35 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+from functools import lru_cache
 from os import getppid
+from typing import Optional
 
-from psutil import NoSuchProcess, Process
 
+def _parent_name() -> Optional[str]:
+    """
+    Get the name of the parent process. On Linux the name is read from
+    /proc, which avoids importing psutil; elsewhere psutil is used.
+
+    Returns:
+        Optional[str]: The name of the parent process, or None if it no
+            longer exists.
+    """
+    try:
+        with open(f"/proc/{getppid()}/comm", "r") as file:
+            return file.read().strip()
+    except OSError:
+        pass
+
+    from psutil import NoSuchProcess, Process
 
+    try:
+        return Process(getppid()).name()
+    except NoSuchProcess:
+        return None
+
+
+@lru_cache(maxsize=None)
 def get_calling_shell() -> str:
     """
     Get the name of the shell that called this script. This is used to determine
@@ -35,11 +59,8 @@ def get_calling_shell() -> str:
     Returns:
         str: The name of the shell.
     """
-    try:
-        return (
-            "powershell" 
-            if Process(getppid()).name() in 
-            ["pwsh", "powershell"] else "bash"
-        )
-    except NoSuchProcess:
-        return "bash"
+    return (
+        "powershell"
+        if _parent_name() in
+        ["pwsh", "powershell"] else "bash"
+    )
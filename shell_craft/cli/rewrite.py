@@ -0,0 +1,129 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+from typing import Optional
+
+from shell_craft.chunking import Chunks
+from shell_craft.patch import PatchError, apply_patch
+from shell_craft.services import AsyncOpenAIService
+
+
+def _keep_ending(original: str, text: str) -> str:
+    """
+    End a generated text with the newlines the text it replaces ended with,
+    so chunks join back together like the original.
+
+    Args:
+        original (str): The text that is replaced.
+        text (str): The generated text.
+
+    Returns:
+        str: The generated text with the ending of the original.
+    """
+    return text.rstrip("\n") + original[len(original.rstrip("\n")):]
+
+
+class Rewriter:
+    def __init__(
+        self,
+        service: AsyncOpenAIService,
+        diff_service: Optional[AsyncOpenAIService] = None,
+    ) -> None:
+        """
+        Initialize a rewriter, which queries the chunks of a source
+        concurrently and puts the source back together. With a diff service,
+        chunks are asked for a unified diff instead of the whole chunk, so
+        generation time scales with the size of the change. Chunks whose
+        diff does not apply are queried again for the whole chunk.
+
+        Args:
+            service (AsyncOpenAIService): The service that returns whole
+                chunks.
+            diff_service (Optional[AsyncOpenAIService]): The service that
+                returns diffs, defaults to None to always return whole chunks.
+        """
+        self._service = service
+        self._diff_service = diff_service
+        self.fallbacks = 0
+
+    async def generate(self, chunks: Chunks, instruction: str = "") -> str:
+        """
+        Query every chunk and join the responses, for output that does not
+        replace the source such as tests.
+
+        Args:
+            chunks (Chunks): The split source.
+            instruction (str): The request to send with every chunk, if any.
+
+        Returns:
+            str: The responses, joined in order.
+        """
+        responses = await self._service.query_all(chunks.messages(instruction))
+        return "\n".join(response[0].rstrip("\n") for response in responses)
+
+    async def rewrite(self, chunks: Chunks, instruction: str = "") -> str:
+        """
+        Rewrite every chunk and join them back into the source. An empty
+        diff leaves its chunk unchanged.
+
+        Args:
+            chunks (Chunks): The split source.
+            instruction (str): The request to send with every chunk, if any.
+
+        Returns:
+            str: The rewritten source.
+        """
+        messages = chunks.messages(instruction)
+        results: list[Optional[str]] = [None] * len(messages)
+
+        if self._diff_service:
+            responses = await self._diff_service.query_all(messages)
+            for index, (chunk, response) in enumerate(zip(chunks.chunks, responses)):
+                if not response[0].strip():
+                    results[index] = chunk
+                    continue
+
+                try:
+                    results[index] = apply_patch(chunk, response[0])
+                except PatchError:
+                    self.fallbacks += 1
+
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            responses = await self._service.query_all(
+                [messages[index] for index in missing]
+            )
+            for index, response in zip(missing, responses):
+                results[index] = _keep_ending(chunks.chunks[index], response[0])
+
+        return "".join(results)
+
+    async def aclose(self) -> None:
+        """
+        Close the sessions of the services.
+        """
+        await self._service.aclose()
+        if self._diff_service:
+            await self._diff_service.aclose()
+
+
+__all__ = [
+    "Rewriter",
+]
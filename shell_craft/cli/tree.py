@@ -0,0 +1,395 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import asyncio
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import tempfile
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, TextIO
+
+from shell_craft.chunking import DEFAULT_CHUNK_TOKENS, split_source
+
+from .rewrite import Rewriter
+
+MANIFEST_NAME = ".shell-craft-manifest.json"
+MANIFEST_VERSION = 2
+
+_SUFFIXES = {
+    "refactor": "refactored",
+    "document": "documented",
+    "test": "test",
+}
+_TEST_NAMES = {
+    ".py": ("test_", ""),
+    ".go": ("", "_test"),
+    ".java": ("", "Test"),
+    ".cs": ("", "Tests"),
+    ".ps1": ("", ".Tests"),
+}
+
+
+@dataclass(frozen=True)
+class TreeFile:
+    source: pathlib.Path
+    relative: str
+    output: pathlib.Path
+
+
+@dataclass
+class TreeSummary:
+    processed: int = 0
+    unchanged: int = 0
+    failed: int = 0
+
+
+class Manifest:
+    def __init__(self, path: pathlib.Path, fingerprint: str, sub_prompt: str) -> None:
+        """
+        Initialize the manifest of a tree, which maps the relative path of
+        every file processed with a sub-prompt to the digest of its content.
+        Digests include the fingerprint of the settings, so changing the
+        model or prompt processes every file again. The files processed with
+        other sub-prompts are kept as they are.
+
+        Args:
+            path (pathlib.Path): The path of the manifest file.
+            fingerprint (str): The fingerprint of the settings files are
+                processed with.
+            sub_prompt (str): The sub-prompt files are processed with.
+        """
+        self._path = path
+        self._fingerprint = fingerprint
+        self._sub_prompt = sub_prompt
+        self._files: dict[str, dict[str, str]] = {}
+        self._seen: set[str] = set()
+
+        try:
+            data = json.loads(path.read_text())
+            if data.get("version") == MANIFEST_VERSION:
+                self._files = {
+                    name: dict(entries) for name, entries in data["files"].items()
+                }
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+        self._entries = self._files.setdefault(sub_prompt, {})
+
+    def digest(self, content: bytes) -> str:
+        """
+        Get the digest of a file's content under the current settings.
+
+        Args:
+            content (bytes): The content of the file.
+
+        Returns:
+            str: The hex digest.
+        """
+        return hashlib.sha256(self._fingerprint.encode() + b"\0" + content).hexdigest()
+
+    def unchanged(self, relative: str, digest: str) -> bool:
+        """
+        Determine if a file was processed with the same content and settings.
+
+        Args:
+            relative (str): The path of the file relative to the tree.
+            digest (str): The digest of the file's content.
+
+        Returns:
+            bool: True if the file does not need to be processed again.
+        """
+        self._seen.add(relative)
+        return self._entries.get(relative) == digest
+
+    def record(self, relative: str, digest: str) -> None:
+        """
+        Record that a file was processed.
+
+        Args:
+            relative (str): The path of the file relative to the tree.
+            digest (str): The digest of the file's content.
+        """
+        self._seen.add(relative)
+        self._entries[relative] = digest
+
+    def save(self) -> None:
+        """
+        Write the manifest atomically, dropping the files of the sub-prompt
+        that no longer exist.
+        """
+        self._files[self._sub_prompt] = {
+            relative: digest
+            for relative, digest in sorted(self._entries.items())
+            if relative in self._seen
+        }
+        files = {name: self._files[name] for name in sorted(self._files)}
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=self._path.parent, suffix=".tmp")
+        with os.fdopen(descriptor, "w") as file:
+            json.dump({"version": MANIFEST_VERSION, "files": files}, file, indent=2)
+        os.replace(temporary, self._path)
+
+
+def _test_name(suffix: str) -> tuple[str, str]:
+    """
+    Get the prefix and suffix test runners expect around the stem of a
+    test file, such as test_ for Python and _test for Go.
+
+    Args:
+        suffix (str): The extension of the source, including the dot.
+
+    Returns:
+        tuple[str, str]: The prefix and the suffix of the stem.
+    """
+    return _TEST_NAMES.get(suffix, ("", ".test"))
+
+
+def result_path(path: pathlib.PurePath, sub_prompt: str) -> pathlib.PurePath:
+    """
+    Get the path of the result for a source written next to it, such as
+    main.documented.py for main.py. Tests are named the way the language's
+    test runner finds them, such as test_main.py for main.py and
+    main_test.go for main.go.
+
+    Args:
+        path (pathlib.PurePath): The path of the source.
+        sub_prompt (str): The sub-prompt the source is processed with.
+
+    Returns:
+        pathlib.PurePath: The path of the result.
+    """
+    if sub_prompt == "test":
+        prefix, suffix = _test_name(path.suffix)
+        return path.with_name(f"{prefix}{path.stem}{suffix}{path.suffix}")
+
+    return path.with_name(f"{path.stem}.{_SUFFIXES[sub_prompt]}{path.suffix}")
+
+
+def _is_test(path: pathlib.PurePath) -> bool:
+    """
+    Determine if a file is named like a test of its language.
+
+    Args:
+        path (pathlib.PurePath): The path of the file.
+
+    Returns:
+        bool: True if the file is named like a test.
+    """
+    prefix, suffix = _test_name(path.suffix)
+    return path.stem.startswith(prefix) and path.stem.endswith(suffix)
+
+
+def find_files(
+    root: pathlib.Path,
+    extensions: Iterable[str],
+    sub_prompt: str,
+    output_dir: Optional[pathlib.Path] = None,
+    in_place: bool = False,
+) -> Iterator[TreeFile]:
+    """
+    Find the files of a tree with the given extensions, in a stable order.
+    Hidden directories and the output directory are skipped, and so are
+    files written by an earlier run when results are written next to the
+    sources. Tests are not generated for files that are tests themselves,
+    and tests written to the output directory are named like the tests
+    written next to the sources.
+
+    Args:
+        root (pathlib.Path): The root of the tree.
+        extensions (Iterable[str]): The extensions of the files to find.
+        sub_prompt (str): The sub-prompt files are processed with, which
+            names the results written next to the sources.
+        output_dir (Optional[pathlib.Path]): The directory results are
+            written to, mirroring the tree, or None to write them next to
+            the sources.
+        in_place (bool): Whether results replace the sources.
+
+    Yields:
+        TreeFile: The files to process and where to write their results.
+    """
+    extensions = tuple(extensions)
+    generated = tuple(f".{name}" for name in _SUFFIXES.values())
+    output = output_dir.resolve() if output_dir else None
+
+    for directory, directories, files in os.walk(root):
+        directories[:] = sorted(
+            name
+            for name in directories
+            if not name.startswith(".")
+            and pathlib.Path(directory, name).resolve() != output
+        )
+
+        for name in sorted(files):
+            source = pathlib.Path(directory, name)
+            if not name.endswith(extensions) or source.stem.endswith(generated):
+                continue
+
+            if sub_prompt == "test" and _is_test(source):
+                continue
+
+            relative = source.relative_to(root).as_posix()
+            mirrored = pathlib.PurePosixPath(relative)
+            if sub_prompt == "test":
+                mirrored = result_path(mirrored, sub_prompt)
+
+            yield TreeFile(
+                source=source,
+                relative=relative,
+                output=(
+                    source if in_place
+                    else output_dir / mirrored if output_dir
+                    else result_path(source, sub_prompt)
+                ),
+            )
+
+
+async def _process_tree(
+    files: Iterable[TreeFile],
+    rewriter: Rewriter,
+    manifest: Manifest,
+    sub_prompt: str,
+    instruction: str,
+    budget: int,
+    workers: int,
+    output: TextIO,
+) -> TreeSummary:
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    summary = TreeSummary()
+
+    async def process(file: TreeFile) -> None:
+        content = file.source.read_bytes()
+        digest = manifest.digest(content)
+        if manifest.unchanged(file.relative, digest) and file.output.exists():
+            summary.unchanged += 1
+            return
+
+        chunks = split_source(content.decode("utf-8"), budget)
+        if sub_prompt == "test":
+            text = await rewriter.generate(chunks, instruction) + "\n"
+        else:
+            text = await rewriter.rewrite(chunks, instruction)
+
+        file.output.parent.mkdir(parents=True, exist_ok=True)
+        file.output.write_text(text)
+        if file.output == file.source:
+            digest = manifest.digest(file.source.read_bytes())
+        manifest.record(file.relative, digest)
+        summary.processed += 1
+        print(f"{file.relative} -> {file.output}", file=output, flush=True)
+
+    async def work() -> None:
+        while True:
+            file = await queue.get()
+            if file is None:
+                return
+
+            try:
+                await process(file)
+            except Exception as error:
+                summary.failed += 1
+                print(
+                    f"Failed {file.relative}: {str(error) or type(error).__name__}",
+                    file=sys.stderr,
+                )
+
+    tasks = [asyncio.ensure_future(work()) for _ in range(workers)]
+    try:
+        for file in files:
+            await queue.put(file)
+
+        for _ in tasks:
+            await queue.put(None)
+
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    return summary
+
+
+async def run_tree(
+    root: pathlib.Path,
+    rewriter: Rewriter,
+    extensions: Iterable[str],
+    sub_prompt: str,
+    fingerprint: str,
+    output_dir: Optional[pathlib.Path] = None,
+    in_place: bool = False,
+    instruction: str = "",
+    budget: int = DEFAULT_CHUNK_TOKENS,
+    workers: int = 8,
+    output: TextIO = sys.stdout,
+) -> TreeSummary:
+    """
+    Process every file of a tree with a worker pool and write the results
+    next to the sources, to an output directory or over the sources. A
+    manifest in the output directory, or the root of the tree, records the
+    digest of every file processed with the sub-prompt so that files which
+    did not change are skipped on the next run with it. The manifest is written even if the run is
+    interrupted.
+
+    Args:
+        root (pathlib.Path): The root of the tree.
+        rewriter (Rewriter): The rewriter to process the files with.
+        extensions (Iterable[str]): The extensions of the files to process.
+        sub_prompt (str): The sub-prompt the files are processed with.
+        fingerprint (str): The fingerprint of the settings, see Manifest.
+        output_dir (Optional[pathlib.Path]): The directory to write results
+            to, mirroring the tree, or None to write them next to the
+            sources.
+        in_place (bool): Whether results replace the sources.
+        instruction (str): The request to send with every file, if any.
+        budget (int): The number of tokens per request, larger files are
+            split into chunks.
+        workers (int): The number of files to process concurrently.
+        output (TextIO): The stream to report processed files to.
+
+    Returns:
+        TreeSummary: The number of files processed, unchanged and failed.
+    """
+    manifest = Manifest((output_dir or root) / MANIFEST_NAME, fingerprint, sub_prompt)
+    try:
+        return await _process_tree(
+            find_files(root, extensions, sub_prompt, output_dir, in_place),
+            rewriter,
+            manifest,
+            sub_prompt,
+            instruction,
+            budget,
+            max(1, workers),
+            output,
+        )
+    finally:
+        manifest.save()
+
+
+__all__ = [
+    "find_files",
+    "Manifest",
+    "MANIFEST_NAME",
+    "result_path",
+    "run_tree",
+    "TreeFile",
+    "TreeSummary",
+]
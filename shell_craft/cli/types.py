@@ -19,7 +19,7 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 from argparse import ArgumentTypeError
-from typing import Callable
+from typing import Callable, Iterable, Optional
 
 
 def limited_float(min: float, max: float) -> Callable:
@@ -51,3 +51,32 @@ def limited_float(min: float, max: float) -> Callable:
         return f
     
     return _ret_func
+
+def comma_separated(choices: Optional[Iterable[str]] = None) -> Callable:
+    """
+    Create a function that will split a comma separated list and validate
+    every item is one of the given choices for use with argparse.
+
+    Args:
+        choices (Optional[Iterable[str]]): The allowed items, defaults to
+            None which allows any item.
+
+    Returns:
+        Callable: A function that will split and validate the list.
+    """
+    allowed = None if choices is None else list(choices)
+
+    def _ret_func(arg: str) -> list[str]:
+        items = [item.strip() for item in str(arg).split(",") if item.strip()]
+        if not items:
+            raise ArgumentTypeError(f"{arg!r} is not a comma separated list")
+
+        for item in items:
+            if allowed is not None and item not in allowed:
+                raise ArgumentTypeError(
+                    f"{item} is not one of {', '.join(allowed)}"
+                )
+
+        return items
+
+    return _ret_func
@@ -18,9 +18,15 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import hashlib
 import json
-from typing import Any, Protocol
+import os
 import pathlib
+import tempfile
+from typing import Any, Optional, Protocol
+
+DEFAULT_SNAPSHOT_PATH = "~/.shell-craft/snapshots"
+DEFAULT_SNAPSHOT_ENTRIES = 64
 
 
 class Configuration(Protocol):
@@ -51,6 +57,111 @@ class JSONConfiguration(dict):
         with open(path, "r") as file:
             return cls(file.read())
 
+class ConfigurationSnapshot:
+    def __init__(
+        self,
+        path: str = DEFAULT_SNAPSHOT_PATH,
+        max_entries: int = DEFAULT_SNAPSHOT_ENTRIES,
+    ) -> None:
+        """
+        Initialize a store of merged configurations. A snapshot is the
+        result of merging a list of files, valid while every file keeps its
+        modification time and size, so loading an unchanged configuration
+        is a single small read.
+
+        Args:
+            path (str): The directory to store the snapshots in.
+            max_entries (int): The number of snapshots to keep, the least
+                recently written are removed first.
+        """
+        self._path = pathlib.Path(path).expanduser()
+        self._max_entries = max_entries
+
+    @staticmethod
+    def signature(paths: list[str]) -> list:
+        """
+        Get the modification time and size of each file.
+
+        Args:
+            paths (list[str]): The paths to the files.
+
+        Returns:
+            list: The path, modification time in nanoseconds and size of
+                each file, with None for files that do not exist.
+        """
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                signature.append([path, stat.st_mtime_ns, stat.st_size])
+            except (OSError, TypeError, ValueError):
+                signature.append([path, None, None])
+
+        return signature
+
+    def _entry(self, paths: list[str]) -> pathlib.Path:
+        """
+        Get the file of the snapshot for a list of files.
+
+        Args:
+            paths (list[str]): The paths to the files.
+
+        Returns:
+            pathlib.Path: The path of the snapshot.
+        """
+        digest = hashlib.sha256(json.dumps(paths).encode("utf-8")).hexdigest()
+        return self._path / f"{digest[:32]}.json"
+
+    def get(self, paths: list[str], signature: list) -> Optional[dict]:
+        """
+        Get the merged configuration of the files, if they did not change
+        since it was stored.
+
+        Args:
+            paths (list[str]): The paths to the files.
+            signature (list): The current signature of the files.
+
+        Returns:
+            Optional[dict]: The merged configuration, or None.
+        """
+        try:
+            snapshot = json.loads(self._entry(paths).read_text())
+        except (OSError, ValueError):
+            return None
+
+        if snapshot.get("signature") != signature:
+            return None
+
+        return snapshot.get("values")
+
+    def set(self, paths: list[str], signature: list, values: dict) -> None:
+        """
+        Store the merged configuration of the files. Snapshots are only
+        readable by the user, as configurations may hold API keys. Failures
+        to write are ignored, the snapshot only saves reading the files.
+
+        Args:
+            paths (list[str]): The paths to the files.
+            signature (list): The signature of the files the values were
+                read from.
+            values (dict): The merged configuration.
+        """
+        try:
+            self._path.mkdir(parents=True, exist_ok=True, mode=0o700)
+            descriptor, temporary = tempfile.mkstemp(dir=self._path, suffix=".tmp")
+            with os.fdopen(descriptor, "w") as file:
+                json.dump({"signature": signature, "values": values}, file)
+            os.replace(temporary, self._entry(paths))
+
+            entries = sorted(
+                self._path.glob("*.json"),
+                key=lambda entry: entry.stat().st_mtime_ns,
+            )
+            for entry in entries[:-self._max_entries]:
+                entry.unlink(missing_ok=True)
+        except (OSError, TypeError, ValueError):
+            return
+
 class AggregateConfiguration(dict):
     def __init__(self, configurations: list) -> None:
         """
@@ -66,20 +177,39 @@ class AggregateConfiguration(dict):
         })
 
     @classmethod
-    def from_files(cls, paths: list[str]) -> "AggregateConfiguration":
+    def from_files(
+        cls,
+        paths: list[str],
+        snapshot: Optional[ConfigurationSnapshot] = None,
+    ) -> "AggregateConfiguration":
         """
         Initialize the aggregate configuration from the given files.
 
-        If a file does not exist, it will be ignored.
+        If a file does not exist, it will be ignored. With a snapshot, the
+        files are only read when one of them changed since the snapshot of
+        their merged configuration was stored.
 
         Args:
             paths (list[str]): The paths to the JSON files.
+            snapshot (Optional[ConfigurationSnapshot]): The snapshots to
+                load the merged configuration from, defaults to None.
 
         Returns:
             AggregateConfiguration: The aggregate configuration.
         """
-        return cls([
+        if snapshot:
+            signature = snapshot.signature(paths)
+            values = snapshot.get(paths, signature)
+            if values is not None:
+                return cls([values])
+
+        configuration = cls([
             JSONConfiguration.from_file(path)
             for path in paths
             if path and pathlib.Path(path).exists()
         ])
+
+        if snapshot:
+            snapshot.set(paths, signature, configuration)
+
+        return configuration
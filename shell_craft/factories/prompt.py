@@ -18,7 +18,7 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-from shell_craft.prompts import Prompt
+from shell_craft.prompts import REGISTRY, Prompt
 
 
 class PromptFactory:
@@ -37,19 +37,10 @@ class PromptFactory:
         Returns:
             Prompt: A new prompt object.
         """        
-        import shell_craft.prompts as prompts
-
         if not prompt:
             return None
 
-        available_prompts = [
-            prompt.removesuffix('_PROMPT').casefold()
-            for prompt in dir(prompts)
-            if prompt.endswith("_PROMPT")
-        ]
-
-        if prompt.casefold() in available_prompts:
-            return getattr(prompts, f"{prompt.upper()}_PROMPT")
-
-
-        raise ValueError(f"Unknown prompt type: {prompt}")
+        try:
+            return REGISTRY.get(prompt)
+        except KeyError:
+            raise ValueError(f"Unknown prompt type: {prompt}") from None
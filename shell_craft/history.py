@@ -0,0 +1,244 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import pathlib
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import sqlite3
+
+DEFAULT_HISTORY_PATH = "~/.shell-craft/history.db"
+DEFAULT_SEARCH_LIMIT = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    prompt TEXT NOT NULL,
+    request TEXT NOT NULL,
+    response TEXT NOT NULL,
+    status INTEGER,
+    output TEXT
+);
+"""
+
+_INDEX = """
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_index USING fts5(
+    request, response, content='entries', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_index (rowid, request, response)
+    VALUES (new.id, new.request, new.response);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_index (entries_index, rowid, request, response)
+    VALUES ('delete', old.id, old.request, old.response);
+END;
+"""
+
+_COLUMNS = ("id", "created", "prompt", "request", "response", "status", "output")
+_SELECT = "SELECT " + ", ".join("entries." + column for column in _COLUMNS) + " FROM entries"
+
+
+@dataclass(frozen=True)
+class HistoryEntry:
+    """
+    A request made in interactive mode with its response and, once the
+    response was executed, the exit status and retained output.
+    """
+    id: int
+    created: float
+    prompt: str
+    request: str
+    response: str
+    status: Optional[int] = None
+    output: Optional[str] = None
+
+
+def _match(terms: str) -> str:
+    """
+    Get an FTS5 query matching entries that contain every term. Terms are
+    quoted so punctuation in them is not read as query syntax.
+
+    Args:
+        terms (str): The terms separated by whitespace.
+
+    Returns:
+        str: The query.
+    """
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms.split())
+
+
+class History:
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH) -> None:
+        """
+        Initialize the history of interactive sessions, stored in a SQLite
+        database with a full text index of the requests and responses.
+        Recalling an entry is a primary key lookup and searching uses the
+        index, so both stay fast however many entries are stored. When
+        SQLite is built without FTS5, searching scans the entries instead.
+
+        The database is only opened when it is first used.
+
+        Args:
+            path (str): The database file, ":memory:" keeps the history
+                for the lifetime of this object only.
+        """
+        self._path = path if path == ":memory:" else pathlib.Path(path).expanduser()
+        self._connection: Optional["sqlite3.Connection"] = None
+        self._indexed = False
+
+    @property
+    def connection(self) -> "sqlite3.Connection":
+        """
+        Get the connection to the database, creating the database on first
+        use.
+
+        Returns:
+            sqlite3.Connection: The connection.
+        """
+        if self._connection is None:
+            import sqlite3
+
+            if isinstance(self._path, pathlib.Path):
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+
+            connection = sqlite3.connect(self._path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            try:
+                connection.executescript(_INDEX)
+                self._indexed = True
+            except sqlite3.OperationalError:
+                self._indexed = False
+
+            self._connection = connection
+
+        return self._connection
+
+    def add(self, prompt: str, request: str, response: str) -> int:
+        """
+        Store a request and its response.
+
+        Args:
+            prompt (str): The name of the prompt the request was made with.
+            request (str): The request.
+            response (str): The response.
+
+        Returns:
+            int: The id of the entry, used to recall it.
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO entries (created, prompt, request, response) VALUES (?, ?, ?, ?)",
+                (time.time(), prompt, request, response),
+            )
+        return cursor.lastrowid
+
+    def record_execution(self, entry_id: int, status: Optional[int], output: str) -> None:
+        """
+        Store the result of executing the response of an entry, replacing
+        the result of an earlier execution.
+
+        Args:
+            entry_id (int): The id of the entry.
+            status (Optional[int]): The exit status, None if the command was
+                killed.
+            output (str): The retained output of the command.
+        """
+        with self.connection:
+            self.connection.execute(
+                "UPDATE entries SET status = ?, output = ? WHERE id = ?",
+                (status, output, entry_id),
+            )
+
+    def get(self, entry_id: int) -> Optional[HistoryEntry]:
+        """
+        Get an entry by its id.
+
+        Args:
+            entry_id (int): The id of the entry.
+
+        Returns:
+            Optional[HistoryEntry]: The entry, or None if there is none with
+                the id.
+        """
+        row = self.connection.execute(
+            _SELECT + " WHERE entries.id = ?", (entry_id,)
+        ).fetchone()
+        return HistoryEntry(*row) if row else None
+
+    def search(self, terms: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[HistoryEntry]:
+        """
+        Find the entries whose request or response contains every term,
+        best matches first.
+
+        Args:
+            terms (str): The terms separated by whitespace.
+            limit (int): The maximum number of entries to return.
+
+        Returns:
+            list[HistoryEntry]: The matching entries.
+        """
+        if not terms.split():
+            return []
+
+        connection = self.connection
+        if self._indexed:
+            rows = connection.execute(
+                _SELECT + " JOIN entries_index ON entries_index.rowid = entries.id"
+                " WHERE entries_index MATCH ? ORDER BY entries_index.rank LIMIT ?",
+                (_match(terms), limit),
+            )
+        else:
+            conditions = " AND ".join(
+                "(request LIKE ? ESCAPE '\\' OR response LIKE ? ESCAPE '\\')"
+                for _ in terms.split()
+            )
+            patterns = [
+                "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                for term in terms.split()
+                for _ in range(2)
+            ]
+            rows = connection.execute(
+                f"{_SELECT} WHERE {conditions} ORDER BY entries.id DESC LIMIT ?",
+                (*patterns, limit),
+            )
+
+        return [HistoryEntry(*row) for row in rows]
+
+    def close(self) -> None:
+        """
+        Close the connection to the database.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+__all__ = [
+    "DEFAULT_HISTORY_PATH",
+    "DEFAULT_SEARCH_LIMIT",
+    "History",
+    "HistoryEntry",
+]
@@ -0,0 +1,241 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import difflib
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+_NO_NEWLINE = "\\ No newline at end of file"
+
+
+class PatchError(ValueError):
+    """
+    Raised when a patch is malformed or does not apply.
+    """
+
+
+@dataclass
+class Hunk:
+    """
+    A hunk of a unified diff. Start is the one based line of the original
+    the hunk claims to start at, lines keep their " ", "-" or "+" prefix.
+    The newline flags are False when the hunk ends the original or the
+    changed text without a newline.
+    """
+    start: int
+    lines: list[str] = field(default_factory=list)
+    old_newline: bool = True
+    new_newline: bool = True
+
+    @property
+    def old(self) -> list[str]:
+        return [line[1:] for line in self.lines if line[0] in " -"]
+
+    @property
+    def new(self) -> list[str]:
+        return [line[1:] for line in self.lines if line[0] in " +"]
+
+
+def parse_hunks(text: str) -> list[Hunk]:
+    """
+    Parse the hunks of a unified diff written by a model. File headers,
+    code fences and text before the first hunk are ignored, and a blank
+    line inside a hunk is read as a blank context line. Blank context at
+    the end of a hunk is dropped, since it is more likely to separate hunks
+    and unchanged lines at the end do not change what a hunk does.
+
+    Args:
+        text (str): The diff.
+
+    Raises:
+        PatchError: If the diff has no hunks or a hunk has an invalid line.
+
+    Returns:
+        list[Hunk]: The hunks, in order.
+    """
+    hunks: list[Hunk] = []
+    lines = text.splitlines()
+    for number, line in enumerate(lines):
+        match = _HUNK_HEADER.match(line)
+        if match:
+            hunks.append(Hunk(int(match.group(1))))
+        elif line.startswith(_NO_NEWLINE):
+            if hunks and hunks[-1].lines:
+                prefix = hunks[-1].lines[-1][0]
+                hunks[-1].old_newline &= prefix == "+"
+                hunks[-1].new_newline &= prefix == "-"
+        elif (
+            line.startswith("```")
+            or line.startswith("+++ ")
+            or line.startswith("--- ")
+            and number + 1 < len(lines)
+            and lines[number + 1].startswith("+++ ")
+        ):
+            continue
+        elif not hunks:
+            continue
+        elif not line:
+            hunks[-1].lines.append(" ")
+        elif line[0] in " -+":
+            hunks[-1].lines.append(line)
+        elif line.startswith("diff "):
+            continue
+        else:
+            raise PatchError(f"Invalid line in hunk: {line!r}")
+
+    for hunk in hunks:
+        while hunk.lines and hunk.lines[-1] == " ":
+            hunk.lines.pop()
+
+    hunks = [hunk for hunk in hunks if hunk.lines]
+    if not hunks:
+        raise PatchError("The patch has no hunks.")
+
+    return hunks
+
+
+def _find(lines: list[str], old: list[str], expected: int, start: int) -> Optional[int]:
+    """
+    Find where the old lines of a hunk are in the original, at or after
+    start and as close to the expected position as possible. Lines are
+    compared without trailing whitespace.
+
+    Returns:
+        Optional[int]: The zero based position, None if not found.
+    """
+    wanted = [line.rstrip() for line in old]
+    candidates = [
+        position
+        for position in range(start, len(lines) - len(old) + 1)
+        if lines[position].rstrip() == wanted[0]
+        and [line.rstrip() for line in lines[position:position + len(old)]] == wanted
+    ]
+    if not candidates:
+        return None
+
+    return min(candidates, key=lambda position: abs(position - expected))
+
+
+def apply_hunks(original: str, hunks: Iterable[Hunk]) -> str:
+    """
+    Apply hunks to a text. Models count lines poorly, so each hunk is
+    placed where its original lines match nearest to the line it claims,
+    after the hunk before it. Unchanged lines are kept as they are in the
+    text.
+
+    Args:
+        original (str): The text to patch.
+        hunks (Iterable[Hunk]): The hunks to apply.
+
+    Raises:
+        PatchError: If the original lines of a hunk are not in the text.
+
+    Returns:
+        str: The patched text.
+    """
+    lines = [line.rstrip("\n") for line in original.splitlines(keepends=True)]
+    newline = original.endswith("\n") or not original
+    result: list[str] = []
+    position = 0
+    shift = 0
+    for hunk in hunks:
+        expected = max(0, hunk.start - 1 + shift)
+        if hunk.old:
+            found = _find(lines, hunk.old, expected, position)
+            if found is None:
+                raise PatchError(f"Hunk at line {hunk.start} does not apply.")
+        else:
+            found = min(max(expected, position), len(lines))
+
+        result += lines[position:found]
+        position = found
+        for line in hunk.lines:
+            if line[0] == "+":
+                result.append(line[1:])
+                continue
+
+            if line[0] == " ":
+                result.append(lines[position])
+            position += 1
+
+        shift += len(hunk.new) - len(hunk.old)
+        if position == len(lines) and not (hunk.old_newline and hunk.new_newline):
+            newline = hunk.new_newline
+
+    result += lines[position:]
+    text = "\n".join(result)
+    if result and newline:
+        text += "\n"
+
+    return text
+
+
+def apply_patch(original: str, patch: str) -> str:
+    """
+    Apply a unified diff written by a model to a text.
+
+    Args:
+        original (str): The text to patch.
+        patch (str): The diff.
+
+    Raises:
+        PatchError: If the diff is malformed or does not apply.
+
+    Returns:
+        str: The patched text.
+    """
+    return apply_hunks(original, parse_hunks(patch))
+
+
+def unified_diff(old: str, new: str, from_path: str, to_path: str) -> str:
+    """
+    Build a unified diff between two texts, marking a last line without a
+    newline the way git does so the diff applies with git apply.
+
+    Args:
+        old (str): The original text, empty for a new file.
+        new (str): The changed text.
+        from_path (str): The path of the original, /dev/null for a new file.
+        to_path (str): The path of the changed text.
+
+    Returns:
+        str: The diff, empty if the texts are equal.
+    """
+    return "".join(
+        line if line.endswith("\n") else line + "\n" + _NO_NEWLINE + "\n"
+        for line in difflib.unified_diff(
+            old.splitlines(keepends=True),
+            new.splitlines(keepends=True),
+            from_path,
+            to_path,
+        )
+    )
+
+
+__all__ = [
+    "apply_hunks",
+    "apply_patch",
+    "Hunk",
+    "parse_hunks",
+    "PatchError",
+    "unified_diff",
+]
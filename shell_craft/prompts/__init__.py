@@ -18,12 +18,31 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-from .languages import (BASH_PROMPT, C_PROMPT, C_SHARP_PROMPT, GO_PROMPT,
-                        JAVA_PROMPT, JAVASCRIPT_PROMPT, POWERSHELL_PROMPT,
-                        PYTHON_PROMPT)
+from functools import partial
+
+from . import languages
+from .packs import PromptPacks
 from .prompt import Prompt
+from .registry import PromptRegistry
 from .templates import BUG_REPORT_PROMPT, FEATURE_REQUEST_PROMPT
 
+REGISTRY = PromptRegistry()
+for _name in languages.__all__:
+    REGISTRY.register(_name, partial(languages.get_prompt, _name))
+REGISTRY.register("BUG_REPORT_PROMPT", BUG_REPORT_PROMPT)
+REGISTRY.register("FEATURE_REQUEST_PROMPT", FEATURE_REQUEST_PROMPT)
+
+
+def __getattr__(name: str) -> Prompt:
+    if name in languages.__all__:
+        return languages.get_prompt(name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(languages.__all__))
+
+
 __all__ = [
     "BASH_PROMPT",
     "BUG_REPORT_PROMPT",
@@ -35,5 +54,8 @@ __all__ = [
     "FEATURE_REQUEST_PROMPT",
     "POWERSHELL_PROMPT",
     "PYTHON_PROMPT",
-    "Prompt"
+    "Prompt",
+    "PromptPacks",
+    "PromptRegistry",
+    "REGISTRY",
 ]
@@ -18,7 +18,7 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import Optional
 
 from .prompt import Prompt
@@ -29,10 +29,12 @@ class LanguagePrompt(Prompt):
     refactoring: Optional[Prompt] = None
     documentation: Optional[Prompt] = None
     testing: Optional[Prompt] = None
+    extensions: tuple[str, ...] = ()
 
 
-def _generate_prompt(language: str) -> LanguagePrompt:
+def _generate_prompt(language: str, extensions: tuple[str, ...] = ()) -> LanguagePrompt:
     return LanguagePrompt(
+        extensions=extensions,
         content=" ".join(f"""
             You are {language}.
             You reply with valid {language}, nothing else.
@@ -67,28 +69,82 @@ def _generate_prompt(language: str) -> LanguagePrompt:
         )
     )
 
+def with_diff_output(prompt: Prompt) -> Prompt:
+    """
+    Returns a copy of a prompt that asks for a unified diff of the changes
+    instead of the whole code, so the response is as long as the change.
+
+    Args:
+        prompt (Prompt): The refactoring or documentation prompt.
+
+    Returns:
+        Prompt: The prompt asking for a diff.
+    """
+    return replace(prompt, content=" ".join([prompt.content] + """
+        You return only a unified diff of your changes to the code you receive.
+        Each hunk has an @@ header and three lines of unchanged context.
+        You return an empty reply if nothing changes.
+    """.split()))
+
+_LANGUAGES = {
+    "BASH_PROMPT": "Bash",
+    "C_PROMPT": "C",
+    "C_SHARP_PROMPT": "C#",
+    "GO_PROMPT": "GoLang",
+    "POWERSHELL_PROMPT": "PowerShell",
+    "PYTHON_PROMPT": "Python",
+    "JAVA_PROMPT": "Java",
+    "JAVASCRIPT_PROMPT": "JavaScript",
+}
+
+_EXTENSIONS = {
+    "BASH_PROMPT": (".sh", ".bash"),
+    "C_PROMPT": (".c", ".h"),
+    "C_SHARP_PROMPT": (".cs",),
+    "GO_PROMPT": (".go",),
+    "POWERSHELL_PROMPT": (".ps1", ".psm1"),
+    "PYTHON_PROMPT": (".py",),
+    "JAVA_PROMPT": (".java",),
+    "JAVASCRIPT_PROMPT": (".js", ".mjs", ".cjs"),
+}
+
+def get_prompt(name: str) -> LanguagePrompt:
+    """
+    Returns the language prompt with the given attribute name, generating it
+    on first use. Only the prompts that are used are ever generated.
+
+    Args:
+        name (str): The attribute name of the prompt, e.g. BASH_PROMPT.
+
+    Raises:
+        KeyError: If there is no language prompt with the name.
+
+    Returns:
+        LanguagePrompt: The language prompt.
+    """
+    if name not in globals():
+        globals()[name] = _generate_prompt(_LANGUAGES[name], _EXTENSIONS[name])
+
+    return globals()[name]
+
 def get_prompts() -> list[LanguagePrompt]:
     """
-    Returns all of the language prompts. This is used to generate the
-    language prompt choices. This is also used to define the exports.
+    Returns all of the language prompts, generating any that were not used
+    yet.
 
     Returns:
         list[LanguagePrompt]: All of the language prompts.
     """    
-    return [
-        prompt for prompt
-        in globals().values()
-        if isinstance(prompt, LanguagePrompt)
-    ]
-
-BASH_PROMPT = _generate_prompt("Bash")
-C_PROMPT = _generate_prompt("C")
-C_SHARP_PROMPT = _generate_prompt("C#")
-GO_PROMPT = _generate_prompt("GoLang")
-POWERSHELL_PROMPT = _generate_prompt("PowerShell")
-PYTHON_PROMPT = _generate_prompt("Python")
-JAVA_PROMPT = _generate_prompt("Java")
-JAVASCRIPT_PROMPT = _generate_prompt("JavaScript")
-
-
-__all__ = get_prompts()
+    return [get_prompt(name) for name in _LANGUAGES]
+
+def __getattr__(name: str) -> LanguagePrompt:
+    if name in _LANGUAGES:
+        return get_prompt(name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LANGUAGES))
+
+
+__all__ = list(_LANGUAGES)
@@ -0,0 +1,437 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import importlib
+import json
+import os
+import pathlib
+import sys
+import tempfile
+from functools import partial
+from typing import Any, Callable, Optional
+
+from .languages import LanguagePrompt, _generate_prompt
+from .prompt import Prompt
+from .registry import PromptRegistry
+
+DEFAULT_PACKS_PATH = "~/.shell-craft/prompts"
+DEFAULT_INDEX_PATH = "~/.shell-craft/prompts.index.json"
+ENTRY_POINT_GROUP = "shell_craft.prompts"
+INDEX_VERSION = 2
+
+_SUB_PROMPTS = ["refactoring", "documentation", "testing"]
+
+
+def _validate_prompt(data: Any, where: str) -> dict:
+    """
+    Validate a prompt definition, with content and optional examples.
+
+    Args:
+        data (Any): The decoded definition.
+        where (str): Where the definition was read from, for errors.
+
+    Raises:
+        ValueError: If the definition is not a valid prompt.
+
+    Returns:
+        dict: The prompt definition, with only the known keys.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("content"), str):
+        raise ValueError(f"{where}: a prompt needs a content string")
+
+    examples = data.get("examples", [])
+    if not isinstance(examples, list) or not all(
+        isinstance(example, dict)
+        and example.get("role") in ("user", "assistant", "system")
+        and isinstance(example.get("content"), str)
+        for example in examples
+    ):
+        raise ValueError(
+            f"{where}: examples must be a list of messages with a role and content"
+        )
+
+    return {"content": data["content"], "examples": examples}
+
+
+def validate_spec(data: Any, where: str) -> dict:
+    """
+    Validate the definition of a prompt in a pack. A definition is either a
+    language, which generates the same prompts as the built in languages,
+    or a prompt with optional refactoring, documentation and testing
+    prompts, which makes it a language prompt. Either may list the file
+    extensions of the language, which --tree uses to select files.
+
+    Args:
+        data (Any): The decoded definition.
+        where (str): Where the definition was read from, for errors.
+
+    Raises:
+        ValueError: If the definition is not valid.
+
+    Returns:
+        dict: The validated definition.
+    """
+    if isinstance(data, dict) and "language" in data:
+        if not isinstance(data["language"], str) or not data["language"]:
+            raise ValueError(f"{where}: language must be a non-empty string")
+        spec = {"language": data["language"]}
+    else:
+        spec = _validate_prompt(data, where)
+        for name in _SUB_PROMPTS:
+            if data.get(name) is not None:
+                spec[name] = _validate_prompt(data[name], f"{where}.{name}")
+
+    extensions = data.get("extensions", [])
+    if not isinstance(extensions, list) or not all(
+        isinstance(extension, str) and extension.startswith(".")
+        for extension in extensions
+    ):
+        raise ValueError(
+            f"{where}: extensions must be a list of file extensions such as .tf"
+        )
+    if extensions:
+        spec["extensions"] = extensions
+
+    return spec
+
+
+def prompt_from_spec(spec: dict) -> Prompt:
+    """
+    Create a prompt from a definition validated by validate_spec.
+
+    Args:
+        spec (dict): The validated definition.
+
+    Returns:
+        Prompt: The prompt, a LanguagePrompt for languages and definitions
+            with sub-prompts.
+    """
+    extensions = tuple(spec.get("extensions", ()))
+    if "language" in spec:
+        return _generate_prompt(spec["language"], extensions)
+
+    if not any(name in spec for name in _SUB_PROMPTS):
+        return Prompt(content=spec["content"], examples=spec["examples"])
+
+    return LanguagePrompt(
+        content=spec["content"],
+        examples=spec["examples"],
+        extensions=extensions,
+        **{
+            name: Prompt(**spec[name])
+            for name in _SUB_PROMPTS
+            if name in spec
+        },
+    )
+
+
+def _entry_points(group: str) -> dict[str, str]:
+    """
+    Get the entry points of a group across the installed distributions.
+
+    Args:
+        group (str): The name of the group.
+
+    Returns:
+        dict[str, str]: The object reference of each entry point by name.
+    """
+    from importlib.metadata import entry_points
+
+    try:
+        found = entry_points(group=group)
+    except TypeError:
+        found = entry_points().get(group, [])
+
+    return {entry_point.name: entry_point.value for entry_point in found}
+
+
+def _path_mtimes() -> dict[str, int]:
+    """
+    Get the modification times of the import path. Installing or removing
+    a distribution changes the time of the directory it is installed in.
+
+    Returns:
+        dict[str, int]: The modification time in nanoseconds of each
+            existing directory on sys.path.
+    """
+    mtimes = {}
+    for path in sys.path:
+        try:
+            mtimes[path or "."] = os.stat(path or ".").st_mtime_ns
+        except OSError:
+            continue
+
+    return mtimes
+
+
+def _load_reference(reference: str) -> Prompt:
+    """
+    Load the prompt an entry point refers to, which is either a prompt or
+    a callable returning one.
+
+    Args:
+        reference (str): The object reference, as module:attribute.
+
+    Raises:
+        ValueError: If the reference does not refer to a prompt.
+
+    Returns:
+        Prompt: The prompt.
+    """
+    module, _, attributes = reference.partition(":")
+    prompt = importlib.import_module(module.strip())
+    for attribute in attributes.split("[")[0].strip().split("."):
+        if attribute:
+            prompt = getattr(prompt, attribute)
+
+    if callable(prompt) and not isinstance(prompt, Prompt):
+        prompt = prompt()
+
+    if not isinstance(prompt, Prompt):
+        raise ValueError(f"{reference} is not a prompt")
+
+    return prompt
+
+
+class PromptPacks:
+    def __init__(
+        self,
+        path: str = DEFAULT_PACKS_PATH,
+        index_path: str = DEFAULT_INDEX_PATH,
+        group: Optional[str] = ENTRY_POINT_GROUP,
+    ) -> None:
+        """
+        Initialize the prompt packs found in a directory and in the entry
+        points of installed distributions.
+
+        A pack is a JSON file mapping prompt names to definitions, see
+        validate_spec. The validated definitions are compiled into an index
+        that is reused as long as the files keep their modification times,
+        so unchanged packs are not parsed again on every start. Entry points
+        refer to a prompt or a callable returning one. They are indexed as
+        well, until a directory on the import path changes, and are only
+        loaded when their prompt is used.
+
+        Args:
+            path (str): The directory of the pack files.
+            index_path (str): The file to store the compiled index in.
+            group (Optional[str]): The entry point group to load prompts
+                from, None to ignore entry points.
+        """
+        self._path = pathlib.Path(path).expanduser()
+        self._index_path = pathlib.Path(index_path).expanduser()
+        self._group = group
+        self._installed: set[str] = set()
+
+    def _read_index(self) -> dict:
+        """
+        Read the compiled index, or an empty index if there is none or it
+        was written by another version.
+
+        Returns:
+            dict: The index, with the compiled files by name and the entry
+                points.
+        """
+        try:
+            index = json.loads(self._index_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+        if index.get("version") != INDEX_VERSION or index.get("path") != str(self._path):
+            return {}
+
+        return index
+
+    def _write_index(self, index: dict) -> None:
+        """
+        Write the compiled index atomically. Failures are ignored, the index
+        only saves parsing the packs again.
+
+        Args:
+            index (dict): The compiled files and entry points.
+        """
+        try:
+            self._index_path.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(
+                dir=self._index_path.parent, suffix=".tmp"
+            )
+            with os.fdopen(descriptor, "w") as file:
+                json.dump(
+                    {"version": INDEX_VERSION, "path": str(self._path), **index},
+                    file,
+                )
+            os.replace(temporary, self._index_path)
+        except OSError:
+            return
+
+    @staticmethod
+    def _compile(path: pathlib.Path, mtime: int) -> dict:
+        """
+        Parse and validate a pack file. Errors are recorded instead of
+        raised, so a broken pack is reported once and does not keep other
+        packs from loading.
+
+        Args:
+            path (pathlib.Path): The pack file.
+            mtime (int): The modification time of the file in nanoseconds.
+
+        Returns:
+            dict: The compiled file, with its modification time and either
+                the prompt definitions or the error.
+        """
+        try:
+            data = json.loads(path.read_text())
+            if not isinstance(data, dict):
+                raise ValueError("a pack must map names to prompts")
+
+            prompts = {
+                name: validate_spec(spec, name)
+                for name, spec in data.items()
+            }
+        except (OSError, ValueError) as error:
+            print(f"Ignoring prompt pack {path}: {error}", file=sys.stderr)
+            return {"mtime": mtime, "prompts": {}, "error": str(error)}
+
+        return {"mtime": mtime, "prompts": prompts}
+
+    def _compile_files(self, index: dict) -> dict:
+        """
+        Compile the pack files, reusing the compiled files of the index
+        that did not change.
+
+        Args:
+            index (dict): The compiled files of the previous index.
+
+        Returns:
+            dict: The compiled files by name.
+        """
+        try:
+            entries = sorted(
+                (entry.name, entry.stat().st_mtime_ns)
+                for entry in os.scandir(self._path)
+                if entry.name.endswith(".json") and entry.is_file()
+            )
+        except OSError:
+            entries = []
+
+        return {
+            name: (
+                index[name]
+                if index.get(name, {}).get("mtime") == mtime
+                else self._compile(self._path / name, mtime)
+            )
+            for name, mtime in entries
+        }
+
+    def _compile_entry_points(self, index: dict) -> dict:
+        """
+        Find the entry points of the group, reusing those of the index while
+        the import path did not change.
+
+        Args:
+            index (dict): The entry points of the previous index.
+
+        Returns:
+            dict: The entry points, with the group and import path they
+                were found for.
+        """
+        if not self._group:
+            return {}
+
+        paths = _path_mtimes()
+        if index.get("group") == self._group and index.get("paths") == paths:
+            return index
+
+        return {
+            "group": self._group,
+            "paths": paths,
+            "references": _entry_points(self._group),
+        }
+
+    def sources(self) -> dict[str, Callable[[], Prompt]]:
+        """
+        Get a factory for every prompt of the pack files and entry points,
+        parsing only the pack files that changed since the index was
+        compiled. Prompts of pack files take precedence over entry points,
+        and when pack files define the same name, the file that sorts last
+        wins.
+
+        Returns:
+            dict[str, Callable[[], Prompt]]: The prompt factories by name.
+        """
+        index = self._read_index()
+        compiled = {
+            "files": self._compile_files(index.get("files", {})),
+            "entry_points": self._compile_entry_points(
+                index.get("entry_points", {})
+            ),
+        }
+
+        if any(compiled[key] != index.get(key) for key in compiled):
+            self._write_index(compiled)
+
+        sources: dict[str, Callable[[], Prompt]] = {
+            name: partial(_load_reference, reference)
+            for name, reference in compiled["entry_points"]
+            .get("references", {})
+            .items()
+        }
+        for compiled_file in compiled["files"].values():
+            for name, spec in compiled_file["prompts"].items():
+                sources[name] = partial(prompt_from_spec, spec)
+
+        return sources
+
+    def install(self, registry: PromptRegistry) -> list[str]:
+        """
+        Register the prompts of the packs, replacing those installed before
+        and removing those whose pack is gone. Prompts that were registered
+        by other means, such as the built in prompts, are never replaced.
+
+        Args:
+            registry (PromptRegistry): The registry to install the prompts in.
+
+        Returns:
+            list[str]: The names of the installed prompts.
+        """
+        sources = {
+            name: source
+            for name, source in self.sources().items()
+            if name not in registry or registry.key(name) in self._installed
+        }
+
+        for name in self._installed - {registry.key(name) for name in sources}:
+            registry.unregister(name)
+
+        for name, source in sources.items():
+            registry.register(name, source)
+
+        self._installed = {registry.key(name) for name in sources}
+        return sorted(self._installed)
+
+
+__all__ = [
+    "DEFAULT_INDEX_PATH",
+    "DEFAULT_PACKS_PATH",
+    "ENTRY_POINT_GROUP",
+    "prompt_from_spec",
+    "PromptPacks",
+    "validate_spec",
+]
@@ -0,0 +1,121 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+from typing import Callable, Iterator, Union
+
+from .prompt import Prompt
+
+PromptSource = Union[Prompt, Callable[[], Prompt]]
+
+
+class PromptRegistry:
+    def __init__(self) -> None:
+        """
+        Initialize an empty registry of prompts. Prompts are indexed by
+        name, and prompts registered as factories are only created the
+        first time they are requested.
+        """
+        self._sources: dict[str, PromptSource] = {}
+        self._prompts: dict[str, Prompt] = {}
+
+    @staticmethod
+    def key(name: str) -> str:
+        """
+        Get the key of a prompt name. Names are case insensitive and the
+        _PROMPT suffix of the module attributes is optional, so "bash",
+        "BASH" and "BASH_PROMPT" all name the same prompt.
+
+        Args:
+            name (str): The name of the prompt.
+
+        Returns:
+            str: The key of the prompt.
+        """
+        return name.casefold().removesuffix("_prompt")
+
+    def register(self, name: str, prompt: PromptSource) -> None:
+        """
+        Register a prompt, or a factory creating it, under the given name.
+        Registering a name again replaces the previous prompt.
+
+        Args:
+            name (str): The name of the prompt.
+            prompt (PromptSource): The prompt, or a callable returning it.
+        """
+        key = self.key(name)
+        self._sources[key] = prompt
+        self._prompts.pop(key, None)
+
+    def unregister(self, name: str) -> None:
+        """
+        Remove the prompt registered under the given name, if any.
+
+        Args:
+            name (str): The name of the prompt.
+        """
+        key = self.key(name)
+        self._sources.pop(key, None)
+        self._prompts.pop(key, None)
+
+    def get(self, name: str) -> Prompt:
+        """
+        Get the prompt registered under the given name, creating it on
+        first use if it was registered as a factory.
+
+        Args:
+            name (str): The name of the prompt.
+
+        Raises:
+            KeyError: If no prompt is registered under the name.
+
+        Returns:
+            Prompt: The prompt.
+        """
+        key = self.key(name)
+        if key not in self._prompts:
+            source = self._sources[key]
+            self._prompts[key] = source if isinstance(source, Prompt) else source()
+
+        return self._prompts[key]
+
+    @property
+    def names(self) -> list[str]:
+        """
+        Get the names of the registered prompts.
+
+        Returns:
+            list[str]: The names, sorted.
+        """
+        return sorted(self._sources)
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and self.key(name) in self._sources
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+
+__all__ = [
+    "PromptRegistry",
+    "PromptSource",
+]
@@ -18,9 +18,52 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-from .openai import OpenAIService, OpenAISettings
+from importlib import import_module
+from typing import Any
+
+# Services are resolved on first access, so that importing the package (for
+# example for its settings or cache) does not import the openai client and
+# its HTTP stack.
+_EXPORTS = {
+    "AsyncCoalescingService": ".coalesce",
+    "AsyncOpenAIService": ".openai",
+    "AsyncService": ".service",
+    "AsyncSingleFlight": ".coalesce",
+    "CacheStats": ".cache",
+    "CoalescingService": ".coalesce",
+    "FlightStats": ".coalesce",
+    "OpenAIService": ".openai",
+    "OpenAISettings": ".openai",
+    "ResponseCache": ".cache",
+    "Service": ".service",
+    "SingleFlight": ".coalesce",
+    "StreamDelta": ".openai",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return getattr(import_module(_EXPORTS[name], __name__), name)
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + __all__)
+
 
 __all__ = [
+    "AsyncCoalescingService",
+    "AsyncOpenAIService",
+    "AsyncService",
+    "AsyncSingleFlight",
+    "CacheStats",
+    "CoalescingService",
+    "FlightStats",
     "OpenAIService",
     "OpenAISettings",
+    "ResponseCache",
+    "Service",
+    "SingleFlight",
+    "StreamDelta",
 ]
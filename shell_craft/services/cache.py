@@ -0,0 +1,203 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+DEFAULT_CACHE_PATH = "~/.shell-craft/cache"
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60
+DEFAULT_CACHE_ENTRIES = 1024
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """
+        Get the ratio of hits to lookups.
+
+        Returns:
+            float: The hit ratio, or 0.0 if there were no lookups.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl: float = DEFAULT_CACHE_TTL,
+        max_entries: int = DEFAULT_CACHE_ENTRIES,
+        max_bytes: int = DEFAULT_CACHE_BYTES,
+    ) -> None:
+        """
+        Initialize an on-disk response cache. Each entry is stored as a
+        JSON file named after the SHA-256 digest of the request it answers,
+        so lookups are a single file read. Entries older than the ttl are
+        treated as misses, and the least recently used entries are evicted
+        once the cache grows beyond max_entries or max_bytes.
+
+        The directory is only created when the first entry is written.
+
+        Args:
+            path (str): The directory to store entries in.
+            ttl (float): The number of seconds an entry stays valid.
+            max_entries (int): The maximum number of entries to keep.
+            max_bytes (int): The maximum total size of the entries in bytes.
+        """
+        self._path = pathlib.Path(path).expanduser()
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._stats = CacheStats()
+
+    @property
+    def stats(self) -> CacheStats:
+        """
+        Get the hit, miss and eviction counters of this cache.
+
+        Returns:
+            CacheStats: The statistics for this cache instance.
+        """
+        return self._stats
+
+    @staticmethod
+    def key(request: dict[str, Any]) -> str:
+        """
+        Generate the content-addressed key for a request.
+
+        Args:
+            request (dict[str, Any]): The JSON serializable request.
+
+        Returns:
+            str: The hex digest identifying the request.
+        """
+        return hashlib.sha256(
+            json.dumps(request, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def _entry(self, key: str) -> pathlib.Path:
+        return self._path / f"{key}.json"
+
+    def get(self, key: str) -> Optional[list[str]]:
+        """
+        Get the cached response for the key. Expired or unreadable
+        entries are removed and count as a miss.
+
+        Args:
+            key (str): The key generated by ResponseCache.key.
+
+        Returns:
+            Optional[list[str]]: The cached response, or None on a miss.
+        """
+        path = self._entry(key)
+        try:
+            with open(path, "r") as file:
+                entry = json.load(file)
+
+            if self._ttl <= 0 or time.time() - entry["created"] > self._ttl:
+                path.unlink(missing_ok=True)
+                raise LookupError(key)
+
+            os.utime(path)
+        except (OSError, ValueError, LookupError, TypeError):
+            self._stats.misses += 1
+            return None
+
+        self._stats.hits += 1
+        return entry["value"]
+
+    def set(self, key: str, value: list[str]) -> None:
+        """
+        Store a response in the cache, evicting old entries if the cache
+        has grown beyond its limits. Failures to write are ignored, the
+        cache is an optimization and never a reason to fail a request.
+
+        Args:
+            key (str): The key generated by ResponseCache.key.
+            value (list[str]): The response to store.
+        """
+        if self._ttl <= 0:
+            return
+
+        try:
+            self._path.mkdir(parents=True, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=self._path, suffix=".tmp")
+            with os.fdopen(descriptor, "w") as file:
+                json.dump({"created": time.time(), "value": value}, file)
+            os.replace(temporary, self._entry(key))
+        except OSError:
+            return
+
+        self._evict()
+
+    def clear(self) -> None:
+        """
+        Remove every entry from the cache.
+        """
+        for path in self._path.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        """
+        Remove expired entries, then the least recently used entries until
+        the cache fits within its entry and size limits.
+        """
+        entries = []
+        now = time.time()
+        with os.scandir(self._path) as scan:
+            for entry in scan:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for index, (modified, size, path) in enumerate(entries):
+            if (
+                now - modified <= self._ttl
+                and len(entries) - index <= self._max_entries
+                and total <= self._max_bytes
+            ):
+                break
+
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+
+            total -= size
+            self._stats.evictions += 1
@@ -0,0 +1,303 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import asyncio
+import dataclasses
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from .service import AsyncService, Service
+
+
+@dataclass
+class FlightStats:
+    calls: int = 0
+    saved: int = 0
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        """
+        Initialize a group of in-flight calls. While a call for a key is
+        running, further calls for the same key wait for and share its
+        result instead of running again.
+        """
+        self._lock = threading.Lock()
+        self._flights: dict[Hashable, Future] = {}
+        self._stats = FlightStats()
+
+    @property
+    def stats(self) -> FlightStats:
+        """
+        Get the number of calls made and the number of calls saved.
+
+        Returns:
+            FlightStats: The statistics for this group.
+        """
+        return self._stats
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        """
+        Call the function, unless a call for the same key is in flight, in
+        which case its result is returned instead. Exceptions are shared
+        the same way as results.
+
+        Args:
+            key (Hashable): The key identifying identical calls.
+            function (Callable[[], Any]): The function to call.
+
+        Returns:
+            Any: The result of the function.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+                self._stats.calls += 1
+            else:
+                self._stats.saved += 1
+
+        if not leader:
+            return flight.result()
+
+        try:
+            flight.set_result(function())
+        except BaseException as error:
+            flight.set_exception(error)
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+        return flight.result()
+
+
+class AsyncSingleFlight:
+    def __init__(self) -> None:
+        """
+        Initialize a group of in-flight coroutines. While a coroutine for a
+        key is running, further calls for the same key await it instead of
+        running again. Cancelling one waiter does not cancel the shared
+        call for the others.
+        """
+        self._flights: dict[Hashable, asyncio.Future] = {}
+        self._stats = FlightStats()
+
+    @property
+    def stats(self) -> FlightStats:
+        """
+        Get the number of calls made and the number of calls saved.
+
+        Returns:
+            FlightStats: The statistics for this group.
+        """
+        return self._stats
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await the coroutine function, unless a call for the same key is in
+        flight, in which case its result is awaited instead.
+
+        Args:
+            key (Hashable): The key identifying identical calls.
+            function (Callable[[], Awaitable[Any]]): The coroutine function
+                to call.
+
+        Returns:
+            Any: The result of the coroutine.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = asyncio.ensure_future(function())
+            flight.add_done_callback(lambda _: self._flights.pop(key, None))
+            self._stats.calls += 1
+        else:
+            self._stats.saved += 1
+
+        return await asyncio.shield(flight)
+
+
+def _key(service: Any, message: str) -> str:
+    """
+    Generate the key identifying a query, from the settings of the service
+    when it exposes them and the message.
+
+    Args:
+        service (Any): The service being queried.
+        message (str): The message of the query.
+
+    Returns:
+        str: The hex digest identifying the query.
+    """
+    settings = getattr(service, "settings", None)
+    if dataclasses.is_dataclass(settings):
+        settings = dataclasses.asdict(settings)
+
+    return hashlib.sha256(
+        json.dumps([settings, message], sort_keys=True, default=repr).encode("utf-8")
+    ).hexdigest()
+
+
+class CoalescingService:
+    def __init__(self, service: Service, group: Optional[SingleFlight] = None) -> None:
+        """
+        Wrap a service so identical queries in flight at the same time, from
+        any thread, share a single upstream call. Every caller receives its
+        own copy of the results. Other attributes, such as stream, are those
+        of the wrapped service, so the wrapper can be used in its place.
+
+        Args:
+            service (Service): The service to wrap.
+            group (Optional[SingleFlight]): The group of in-flight calls to
+                share, defaults to a new group.
+        """
+        self._service = service
+        self._group = group or SingleFlight()
+
+    @property
+    def settings(self) -> Any:
+        """
+        Get the settings of the wrapped service.
+
+        Returns:
+            Any: The settings, or None if the service has none.
+        """
+        return getattr(self._service, "settings", None)
+
+    @property
+    def stats(self) -> FlightStats:
+        """
+        Get the number of upstream calls made and saved by coalescing.
+
+        Returns:
+            FlightStats: The statistics of the shared group.
+        """
+        return self._group.stats
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        return getattr(self._service, name)
+
+    def with_settings(self, settings: Any) -> "CoalescingService":
+        """
+        Wrap the wrapped service with different settings, sharing the group
+        of in-flight calls.
+
+        Args:
+            settings (Any): The settings for the new service.
+
+        Returns:
+            CoalescingService: The new service.
+        """
+        return CoalescingService(self._service.with_settings(settings), self._group)
+
+    def query(self, message: str) -> list[str]:
+        """
+        Query the wrapped service, sharing the call with identical queries
+        already in flight.
+
+        Args:
+            message (str): The message to query the service with.
+
+        Returns:
+            list[str]: The results of the query.
+        """
+        return list(self._group.do(
+            _key(self._service, message),
+            lambda: self._service.query(message),
+        ))
+
+
+class AsyncCoalescingService:
+    def __init__(self, service: AsyncService, group: Optional[AsyncSingleFlight] = None) -> None:
+        """
+        Wrap an asynchronous service so identical queries in flight at the
+        same time share a single upstream call. Every caller receives its
+        own copy of the results.
+
+        Args:
+            service (AsyncService): The service to wrap.
+            group (Optional[AsyncSingleFlight]): The group of in-flight
+                calls to share, defaults to a new group.
+        """
+        self._service = service
+        self._group = group or AsyncSingleFlight()
+
+    @property
+    def settings(self) -> Any:
+        """
+        Get the settings of the wrapped service.
+
+        Returns:
+            Any: The settings, or None if the service has none.
+        """
+        return getattr(self._service, "settings", None)
+
+    @property
+    def stats(self) -> FlightStats:
+        """
+        Get the number of upstream calls made and saved by coalescing.
+
+        Returns:
+            FlightStats: The statistics of the shared group.
+        """
+        return self._group.stats
+
+    def with_settings(self, settings: Any) -> "AsyncCoalescingService":
+        """
+        Wrap the wrapped service with different settings, sharing the group
+        of in-flight calls.
+
+        Args:
+            settings (Any): The settings for the new service.
+
+        Returns:
+            AsyncCoalescingService: The new service.
+        """
+        return AsyncCoalescingService(self._service.with_settings(settings), self._group)
+
+    async def aclose(self) -> None:
+        """
+        Close the wrapped service, if it holds resources.
+        """
+        if hasattr(self._service, "aclose"):
+            await self._service.aclose()
+
+    async def query(self, message: str) -> list[str]:
+        """
+        Query the wrapped service, sharing the call with identical queries
+        already in flight.
+
+        Args:
+            message (str): The message to query the service with.
+
+        Returns:
+            list[str]: The results of the query.
+        """
+        return list(await self._group.do(
+            _key(self._service, message),
+            lambda: self._service.query(message),
+        ))
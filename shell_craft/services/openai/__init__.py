@@ -18,9 +18,36 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-from .service import OpenAIService, OpenAISettings
+from importlib import import_module
+from typing import Any
+
+from .settings import OpenAISettings
+
+# The services import the openai client and its HTTP stack, so they are
+# resolved on first access instead of when the settings are imported.
+_EXPORTS = {
+    'AsyncOpenAIService': '.async_service',
+    'OpenAIService': '.service',
+    'StreamDelta': '.service',
+    'pooled_session': '.service',
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return getattr(import_module(_EXPORTS[name], __name__), name)
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + __all__)
+
 
 __all__ = [
+    'AsyncOpenAIService',
     'OpenAIService',
     'OpenAISettings',
+    'StreamDelta',
+    'pooled_session',
 ]
@@ -0,0 +1,188 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import asyncio
+import itertools
+import weakref
+from dataclasses import dataclass
+from typing import Optional
+
+import aiohttp
+import openai
+
+from ...tracing import span
+from ..cache import ResponseCache
+from ..retry import RateLimiter
+from .base import BaseOpenAIService
+from .settings import OpenAISettings
+
+DEFAULT_CONCURRENCY = 8
+
+
+@dataclass
+class _LoopState:
+    """
+    The resources of a service that are bound to an event loop.
+    """
+    semaphore: asyncio.Semaphore
+    session: Optional[aiohttp.ClientSession] = None
+
+
+class AsyncOpenAIService(BaseOpenAIService):
+    def __init__(
+        self,
+        settings: OpenAISettings,
+        cache: Optional[ResponseCache] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        """
+        Initialize a new asynchronous OpenAI service. At most concurrency
+        queries are sent to the API at once per event loop, the rest wait
+        for a free slot. Queries share a pooled HTTP session per event
+        loop, which should be closed with aclose when done.
+
+        Args:
+            settings (OpenAISettings): The settings to use for the service.
+            cache (Optional[ResponseCache]): The cache to answer repeated
+                queries from, defaults to None which disables caching.
+            concurrency (int): The maximum number of queries in flight.
+            limiter (Optional[RateLimiter]): The rate limiter to share,
+                defaults to one built from the settings.
+        """
+        super().__init__(settings, cache, limiter)
+        self._concurrency = concurrency
+        self._loops: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def with_settings(self, settings: OpenAISettings) -> "AsyncOpenAIService":
+        """
+        Create a service with different settings that shares the cache,
+        the concurrency limit, the connection pool and the rate limiter of
+        this service.
+
+        Args:
+            settings (OpenAISettings): The settings for the new service.
+
+        Returns:
+            AsyncOpenAIService: The new service.
+        """
+        service = AsyncOpenAIService(
+            settings, self._cache, self._concurrency, self._limiter
+        )
+        service._loops = self._loops
+        return service
+
+    def _state(self) -> _LoopState:
+        """
+        Get the semaphore and session of the running event loop. Both are
+        bound to a loop, so one of each is kept per loop.
+
+        Returns:
+            _LoopState: The state for the running loop.
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self._loops:
+            self._loops[loop] = _LoopState(asyncio.Semaphore(self._concurrency))
+
+        return self._loops[loop]
+
+    def _session(self) -> aiohttp.ClientSession:
+        """
+        Get the pooled HTTP session of the running event loop, creating it
+        on first use.
+
+        Returns:
+            aiohttp.ClientSession: The pooled session.
+        """
+        state = self._state()
+        if state.session is None or state.session.closed:
+            state.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=max(self._settings.pool_size, self._concurrency)
+                )
+            )
+
+        return state.session
+
+    async def aclose(self) -> None:
+        """
+        Close the HTTP session of the running event loop.
+        """
+        state = self._state()
+        if state.session is not None:
+            await state.session.close()
+            state.session = None
+
+    async def query(self, message: str) -> list[str]:
+        """
+        Query the model with a message, waiting for the rate limiter and
+        retrying failures that may succeed when sent again. Cancelling the
+        calling task aborts the request and frees its concurrency slot.
+
+        Args:
+            message (str): The message to query the model with.
+
+        Returns:
+            list[str]: The response from the model as a list of strings.
+        """
+        with span("openai.query", model=self._settings.model):
+            request = self._request(message)
+            key, cached = self._cached(request)
+            if cached is not None:
+                return cached
+
+            tokens = self._estimate_tokens(request)
+            for attempt in itertools.count():
+                await asyncio.sleep(self._limiter.reserve(tokens))
+                try:
+                    async with self._state().semaphore:
+                        openai.aiosession.set(self._session())
+                        with span("openai.request", attempt=attempt):
+                            response = await openai.ChatCompletion.acreate(
+                                api_key=self._settings.api_key,
+                                request_timeout=self._timeout(),
+                                **request
+                            )
+                    break
+                except openai.error.OpenAIError as error:
+                    await asyncio.sleep(self._backoff(error, attempt))
+
+            self._account(tokens, response)
+            return self._store(key, self._parse(response))
+
+    async def query_all(self, messages: list[str]) -> list[list[str]]:
+        """
+        Query the model with many messages concurrently. If any query fails
+        or the caller is cancelled, the remaining queries are cancelled.
+
+        Args:
+            messages (list[str]): The messages to query the model with.
+
+        Returns:
+            list[list[str]]: The responses, in the order of the messages.
+        """
+        tasks = [asyncio.ensure_future(self.query(message)) for message in messages]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
@@ -0,0 +1,278 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+from typing import Optional
+
+import openai
+
+from ...tracing import annotate
+from ..cache import ResponseCache
+from ..retry import RateLimiter, RetryPolicy, parse_duration
+from .settings import OpenAISettings
+
+_RETRY_AFTER_HEADERS = [
+    "retry-after",
+    "x-ratelimit-reset-requests",
+    "x-ratelimit-reset-tokens",
+]
+
+
+def _retry_after(error: openai.error.OpenAIError) -> Optional[float]:
+    """
+    Get the delay the server asked for before retrying, from the
+    Retry-After header or, failing that, the rate limit reset headers.
+
+    Args:
+        error (openai.error.OpenAIError): The error returned by the API.
+
+    Returns:
+        Optional[float]: The delay in seconds, or None if not given.
+    """
+    headers = error.headers or {}
+    if headers.get("retry-after-ms"):
+        milliseconds = parse_duration(headers.get("retry-after-ms"))
+        if milliseconds is not None:
+            return milliseconds / 1000
+
+    for header in _RETRY_AFTER_HEADERS:
+        delay = parse_duration(headers.get(header))
+        if delay is not None:
+            return delay
+
+    return None
+
+
+def _is_retryable(error: openai.error.OpenAIError) -> bool:
+    """
+    Determine if a request that failed with the error may succeed when
+    sent again: rate limits (but not an exhausted quota), timeouts,
+    connection errors and server errors.
+
+    Args:
+        error (openai.error.OpenAIError): The error returned by the API.
+
+    Returns:
+        bool: True if the request should be retried.
+    """
+    if isinstance(error, openai.error.RateLimitError):
+        return error.code != "insufficient_quota"
+
+    if isinstance(error, (
+        openai.error.APIConnectionError,
+        openai.error.ServiceUnavailableError,
+        openai.error.Timeout,
+        openai.error.TryAgain,
+    )):
+        return True
+
+    if isinstance(error, openai.error.APIError):
+        return (error.http_status or 0) >= 500
+
+    return False
+
+
+class BaseOpenAIService:
+    def __init__(
+        self,
+        settings: OpenAISettings,
+        cache: Optional[ResponseCache] = None,
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        """
+        Initialize the state shared by the synchronous and asynchronous
+        OpenAI services. Everything except the transport lives here, so both
+        services build requests, use the cache, throttle, retry and read
+        responses the same way.
+
+        Args:
+            settings (OpenAISettings): The settings to use for the service.
+            cache (Optional[ResponseCache]): The cache to answer repeated
+                queries from, defaults to None which disables caching.
+            limiter (Optional[RateLimiter]): The rate limiter to share,
+                defaults to one built from the settings.
+        """
+        self._settings = settings
+        self._cache = cache
+        self._limiter = limiter or RateLimiter(
+            requests_per_minute=settings.requests_per_minute,
+            tokens_per_minute=settings.tokens_per_minute,
+        )
+        self._retry = RetryPolicy(max_retries=settings.max_retries)
+
+    @property
+    def settings(self) -> OpenAISettings:
+        """
+        Get the settings used for queries.
+
+        Returns:
+            OpenAISettings: The settings of this service.
+        """
+        return self._settings
+
+    @property
+    def limiter(self) -> RateLimiter:
+        """
+        Get the rate limiter queries wait for, to share it with other
+        services.
+
+        Returns:
+            RateLimiter: The rate limiter of this service.
+        """
+        return self._limiter
+
+    def _request(self, message: str) -> dict:
+        """
+        Build the request body for a message, without credentials.
+
+        Args:
+            message (str): The message to query the model with.
+
+        Returns:
+            dict: The request body, also used as the cache key.
+        """
+        return {
+            "model": self._settings.model,
+            "messages": self._settings.messages + [
+                {
+                    "role": "user",
+                    "content": message
+                }
+            ],
+            "n": self._settings.count,
+            "temperature": self._settings.temperature,
+        }
+
+    def _timeout(self) -> tuple[float, float]:
+        """
+        Get the connect and read timeouts for a request.
+
+        Returns:
+            tuple[float, float]: The connect and read timeouts in seconds.
+        """
+        return (self._settings.connect_timeout, self._settings.timeout)
+
+    def _cached(self, request: dict) -> tuple[Optional[str], Optional[list[str]]]:
+        """
+        Look up the request in the cache.
+
+        Args:
+            request (dict): The request body built by _request.
+
+        Returns:
+            tuple[Optional[str], Optional[list[str]]]: The cache key, or None
+                if caching is disabled, and the cached results on a hit.
+        """
+        if not self._cache:
+            return None, None
+
+        key = ResponseCache.key(request)
+        cached = self._cache.get(key)
+        annotate(cached=cached is not None)
+        return key, cached
+
+    def _store(self, key: Optional[str], results: list[str]) -> list[str]:
+        """
+        Store the results in the cache when caching is enabled.
+
+        Args:
+            key (Optional[str]): The cache key returned by _cached.
+            results (list[str]): The results to store.
+
+        Returns:
+            list[str]: The results, unchanged.
+        """
+        if key:
+            self._cache.set(key, results)
+
+        return results
+
+    @staticmethod
+    def _estimate_tokens(request: dict) -> int:
+        """
+        Estimate the number of prompt tokens of a request, at roughly four
+        characters per token.
+
+        Args:
+            request (dict): The request body built by _request.
+
+        Returns:
+            int: The estimated number of tokens.
+        """
+        return 1 + sum(
+            len(message["content"]) for message in request["messages"]
+        ) // 4
+
+    def _backoff(self, error: openai.error.OpenAIError, attempt: int) -> float:
+        """
+        Decide how long to wait before retrying a failed attempt. When the
+        server asked for a delay, every request through the rate limiter is
+        held back as well.
+
+        Args:
+            error (openai.error.OpenAIError): The error of the attempt.
+            attempt (int): The zero based number of the failed attempt.
+
+        Raises:
+            openai.error.OpenAIError: The error, if it is not retryable or
+                the retries are exhausted.
+
+        Returns:
+            float: The number of seconds to wait before the next attempt.
+        """
+        if attempt >= self._retry.max_retries or not _is_retryable(error):
+            raise error
+
+        annotate(retries=attempt + 1)
+        retry_after = _retry_after(error)
+        delay = self._retry.delay(attempt, retry_after)
+        if retry_after is not None:
+            self._limiter.pause(delay)
+
+        return delay
+
+    def _account(self, estimated: int, response: dict) -> None:
+        """
+        Charge the rate limiter for the tokens a response actually used, and
+        record them on the current span.
+
+        Args:
+            estimated (int): The number of tokens reserved for the request.
+            response (dict): The chat completion returned by the API.
+        """
+        usage = response.get("usage") or {}
+        annotate(
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+        )
+        if usage.get("total_tokens"):
+            self._limiter.adjust(estimated, usage["total_tokens"])
+
+    @staticmethod
+    def _parse(response: dict) -> list[str]:
+        """
+        Read the content of every choice from a chat completion.
+
+        Args:
+            response (dict): The chat completion returned by the API.
+
+        Returns:
+            list[str]: The content of each choice.
+        """
+        return [choice['message']['content'] for choice in response['choices']]
@@ -18,25 +18,164 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
 import openai
+import requests
+from openai import api_requestor
 
+from ...tracing import annotate, span
+from ..cache import ResponseCache
+from ..retry import RateLimiter
+from .base import BaseOpenAIService
 from .settings import OpenAISettings
 
 
-class OpenAIService:
-    def __init__(self, settings: OpenAISettings) -> None:
+@dataclass(frozen=True)
+class StreamDelta:
+    """
+    A piece of a streamed response. Deltas for different choices are
+    interleaved, the index identifies which choice the content belongs to
+    and finished is set on the last delta of that choice.
+    """
+    index: int
+    content: str
+    finished: bool = False
+
+
+def pooled_session(pool_size: int) -> requests.Session:
+    """
+    Create an HTTP session that keeps up to pool_size connections to the
+    API alive between requests.
+
+    Args:
+        pool_size (int): The number of connections to keep alive.
+
+    Returns:
+        requests.Session: The pooled session.
+    """
+    session = requests.Session()
+    proxies = api_requestor._requests_proxies_arg(openai.proxy)
+    if proxies:
+        session.proxies = proxies
+
+    session.mount(
+        "https://",
+        requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=api_requestor.MAX_CONNECTION_RETRIES,
+        ),
+    )
+    return session
+
+
+class OpenAIService(BaseOpenAIService):
+    def __init__(
+        self,
+        settings: OpenAISettings,
+        cache: Optional[ResponseCache] = None,
+        session: Optional[requests.Session] = None,
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
         """
         Initialize a new OpenAI service with the given settings. This
         service is responsible for querying the OpenAI API.
 
+        The service owns a pooled HTTP session, so connections and their
+        TLS handshakes are reused across queries.
+
+        Args:
+            settings (OpenAISettings): The settings to use for the service.
+            cache (Optional[ResponseCache]): The cache to answer repeated
+                queries from, defaults to None which disables caching.
+            session (Optional[requests.Session]): The HTTP session to use,
+                defaults to a new session sized by settings.pool_size.
+            limiter (Optional[RateLimiter]): The rate limiter to share,
+                defaults to one built from the settings.
+        """
+        super().__init__(settings, cache, limiter)
+        self._session = session or pooled_session(settings.pool_size)
+
+    def with_settings(self, settings: OpenAISettings) -> "OpenAIService":
+        """
+        Create a service with different settings that shares the cache,
+        the connection pool and the rate limiter of this service.
+
+        Args:
+            settings (OpenAISettings): The settings for the new service.
+
+        Returns:
+            OpenAIService: The new service.
+        """
+        return OpenAIService(settings, self._cache, self._session, self._limiter)
+
+    def _bind_session(self) -> None:
+        """
+        Make the openai library send this thread's requests through the
+        pooled session. The library keeps one session per thread and
+        offers no other way to supply it.
+        """
+        api_requestor._thread_context.session = self._session
+
+    def warm_up(self) -> threading.Thread:
+        """
+        Open a connection to the API in the background, so the TCP and TLS
+        handshakes are done before the next query needs the connection.
+        Failures are ignored, the query will simply connect itself.
+
+        Returns:
+            threading.Thread: The thread opening the connection.
+        """
+        def _connect() -> None:
+            try:
+                self._session.head(
+                    openai.api_base,
+                    timeout=self._settings.connect_timeout,
+                ).close()
+            except requests.RequestException:
+                pass
+
+        thread = threading.Thread(target=_connect, daemon=True)
+        thread.start()
+        return thread
+
+    def _create(self, request: dict, stream: bool = False) -> tuple[int, Any]:
+        """
+        Send a request, waiting for the rate limiter and retrying failures
+        that may succeed when sent again.
+
         Args:
-            config (Configuration): The configuration to use for the service.
+            request (dict): The request body built by _request.
+            stream (bool): Whether to stream the response.
+
+        Returns:
+            tuple[int, Any]: The number of tokens reserved for the request
+                and the response of the API.
         """
-        self._settings = settings
+        tokens = self._estimate_tokens(request)
+        for attempt in itertools.count():
+            time.sleep(self._limiter.reserve(tokens))
+            self._bind_session()
+            try:
+                with span("openai.request", attempt=attempt):
+                    return tokens, openai.ChatCompletion.create(
+                        api_key=self._settings.api_key,
+                        request_timeout=self._timeout(),
+                        stream=stream,
+                        **request
+                    )
+            except openai.error.OpenAIError as error:
+                time.sleep(self._backoff(error, attempt))
 
     def query(self, message: str) -> list[str]:
         """
-        Query the model with a message.
+        Query the model with a message, waiting for the rate limiter and
+        retrying failures that may succeed when sent again.
 
         Args:
             message (str): The message to query the model with.
@@ -44,17 +183,50 @@ class OpenAIService:
         Returns:
             list[str]: The response from the model as a string or a list of strings.
         """
-        choices = openai.ChatCompletion.create(
-            api_key=self._settings.api_key,
-            model=self._settings.model,
-            messages=self._settings.messages + [
-                {
-                    "role": "user",
-                    "content": message
-                }
-            ],
-            n=self._settings.count,
-            temperature=self._settings.temperature,
-        )['choices']
-
-        return [choice['message']['content'] for choice in choices]
+        with span("openai.query", model=self._settings.model):
+            request = self._request(message)
+            key, cached = self._cached(request)
+            if cached is not None:
+                return cached
+
+            tokens, response = self._create(request)
+            self._account(tokens, response)
+            return self._store(key, self._parse(response))
+
+    def stream(self, message: str) -> Iterator[StreamDelta]:
+        """
+        Query the model with a message, yielding the response as it is
+        generated. Cached responses are yielded as a single finished delta
+        per choice. The response is only cached once it was fully consumed.
+
+        Args:
+            message (str): The message to query the model with.
+
+        Yields:
+            StreamDelta: The pieces of the response as they arrive.
+        """
+        with span("openai.stream", model=self._settings.model):
+            request = self._request(message)
+            key, cached = self._cached(request)
+            if cached is not None:
+                for index, content in enumerate(cached):
+                    yield StreamDelta(index, content, finished=True)
+                return
+
+            tokens, response = self._create(request, stream=True)
+            results = [''] * self._settings.count
+            for chunk in response:
+                for choice in chunk['choices']:
+                    content = choice['delta'].get('content') or ''
+                    results[choice['index']] += content
+                    if content or choice.get('finish_reason'):
+                        yield StreamDelta(
+                            choice['index'],
+                            content,
+                            finished=bool(choice.get('finish_reason')),
+                        )
+
+            completion = sum(len(result) for result in results) // 4
+            annotate(prompt_tokens=tokens, completion_tokens=completion, estimated=True)
+            self._limiter.adjust(tokens, tokens + completion)
+            self._store(key, results)
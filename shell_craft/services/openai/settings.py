@@ -19,6 +19,14 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 from dataclasses import dataclass
+from typing import Optional
+
+from ..retry import DEFAULT_MAX_RETRIES
+
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 600.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
 
 
 @dataclass
@@ -28,3 +36,9 @@ class OpenAISettings:
     count: int
     temperature: float
     messages: list[str]
+    pool_size: int = DEFAULT_POOL_SIZE
+    timeout: float = DEFAULT_TIMEOUT
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT
+    max_retries: int = DEFAULT_MAX_RETRIES
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
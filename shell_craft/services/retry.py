@@ -0,0 +1,178 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+DEFAULT_MAX_RETRIES = 3
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a duration as sent in rate limit headers. Plain numbers are
+    seconds, as in Retry-After, otherwise the value is a sequence of
+    amounts with units such as "20ms", "1.5s" or "6m0s".
+
+    Args:
+        value (Optional[str]): The header value to parse.
+
+    Returns:
+        Optional[float]: The duration in seconds, or None if the value
+            could not be parsed.
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    parts = _DURATION.findall(value)
+    if not parts or "".join(amount + unit for amount, unit in parts) != value:
+        return None
+
+    return sum(float(amount) * _UNITS[unit] for amount, unit in parts)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter. The delay before retry n is a
+    random duration between zero and base_delay * 2 ** n, capped at
+    max_delay. A delay requested by the server always takes precedence.
+    """
+    max_retries: int = DEFAULT_MAX_RETRIES
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Get the number of seconds to wait before the next attempt.
+
+        Args:
+            attempt (int): The zero based number of the failed attempt.
+            retry_after (Optional[float]): The delay requested by the
+                server, if any.
+
+        Returns:
+            float: The number of seconds to wait.
+        """
+        if retry_after is not None:
+            return retry_after
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Initialize a client side rate limiter made of two token buckets,
+        one for requests and one for tokens, each refilling continuously up
+        to a minute's worth of capacity. A limit of None disables that
+        bucket.
+
+        Callers reserve capacity up front and wait the returned delay, so
+        concurrent callers are spaced out in the order they arrived instead
+        of all retrying at once.
+
+        Args:
+            requests_per_minute (Optional[float]): The requests allowed per
+                minute.
+            tokens_per_minute (Optional[float]): The tokens allowed per
+                minute.
+            clock (Callable[[], float]): The monotonic clock to use.
+        """
+        self._rates = [requests_per_minute, tokens_per_minute]
+        self._levels = [rate or 0.0 for rate in self._rates]
+        self._clock = clock
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        for index, rate in enumerate(self._rates):
+            if rate:
+                self._levels[index] = min(rate, self._levels[index] + elapsed * rate / 60)
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Reserve capacity for a request of the given number of tokens.
+
+        Args:
+            tokens (int): The estimated number of tokens of the request.
+
+        Returns:
+            float: The number of seconds to wait before sending it.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+
+            delay = max(0.0, self._paused_until - now)
+            for index, amount in enumerate([1, tokens]):
+                rate = self._rates[index]
+                if not rate:
+                    continue
+
+                amount = min(amount, rate)
+                if self._levels[index] < amount:
+                    delay = max(delay, (amount - self._levels[index]) * 60 / rate)
+                self._levels[index] -= amount
+
+            return delay
+
+    def adjust(self, estimated: int, actual: int) -> None:
+        """
+        Correct a reservation once the real number of tokens is known.
+
+        Args:
+            estimated (int): The number of tokens that was reserved.
+            actual (int): The number of tokens that was used.
+        """
+        with self._lock:
+            if self._rates[1]:
+                self._levels[1] += estimated - actual
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold back every request for the given number of seconds, for
+        example because the server asked to retry later.
+
+        Args:
+            seconds (float): The number of seconds to pause for.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
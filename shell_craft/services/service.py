@@ -34,3 +34,18 @@ class Service(Protocol):
             list[str]: The results of the query.
         """        
         ...
+
+
+class AsyncService(Protocol):
+    async def query(self, message: str) -> list[str]:
+        """
+        Querys the foreign service with the given message without blocking
+        the event loop and returns the results.
+
+        Args:
+            message (str): The message to query the foreign service with.
+
+        Returns:
+            list[str]: The results of the query.
+        """        
+        ...
@@ -0,0 +1,228 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import itertools
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import IO, Any, Iterator, Optional
+
+
+@dataclass
+class Span:
+    """
+    A timed phase of a run. Start and end are seconds since the tracer
+    started, parent is the id of the span this one was opened in.
+    """
+    id: int
+    name: str
+    start: float
+    end: Optional[float] = None
+    parent: Optional[int] = None
+    depth: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        """
+        Get the duration of the span, zero while it is still open.
+
+        Returns:
+            float: The duration in seconds.
+        """
+        return (self.end if self.end is not None else self.start) - self.start
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Get the span as a JSON serializable dictionary.
+
+        Returns:
+            dict[str, Any]: The span, with durations in milliseconds.
+        """
+        return {
+            "id": self.id,
+            "parent": self.parent,
+            "name": self.name,
+            "start_ms": round(self.start * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            **self.attributes,
+        }
+
+
+_tracer: ContextVar[Optional["Tracer"]] = ContextVar("tracer", default=None)
+_current: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+class Tracer:
+    def __init__(self, clock=time.perf_counter) -> None:
+        """
+        Initialize a tracer that records the spans opened while it is
+        active. Spans opened while no tracer is active are not recorded, so
+        instrumented code costs next to nothing when nobody is tracing.
+
+        Args:
+            clock (Callable[[], float]): The clock to time spans with,
+                defaults to time.perf_counter.
+        """
+        self._clock = clock
+        self._origin = clock()
+        self._ids = itertools.count()
+        self.id = os.urandom(8).hex()
+        self.spans: list[Span] = []
+
+    def now(self) -> float:
+        """
+        Get the time since the tracer started.
+
+        Returns:
+            float: The number of seconds since the tracer started.
+        """
+        return self._clock() - self._origin
+
+    def open(self, name: str, parent: Optional[Span] = None,
+             attributes: Optional[dict[str, Any]] = None) -> Span:
+        """
+        Start recording a span.
+
+        Args:
+            name (str): The name of the phase.
+            parent (Optional[Span]): The span this one is opened in.
+            attributes (Optional[dict[str, Any]]): Attributes to record.
+
+        Returns:
+            Span: The open span, its end is set when the phase is done.
+        """
+        span = Span(
+            id=next(self._ids),
+            name=name,
+            start=self.now(),
+            parent=parent.id if parent else None,
+            depth=parent.depth + 1 if parent else 0,
+            attributes=attributes or {},
+        )
+        self.spans.append(span)
+        return span
+
+    @contextmanager
+    def activate(self) -> Iterator["Tracer"]:
+        """
+        Record the spans opened in the current context with this tracer.
+        asyncio tasks and functions run with contextvars.copy_context().run
+        inherit it, but threads do not.
+
+        Yields:
+            Tracer: This tracer.
+        """
+        token = _tracer.set(self)
+        try:
+            yield self
+        finally:
+            _tracer.reset(token)
+
+    def write_table(self, file: IO[str]) -> None:
+        """
+        Write the spans as a table, indented by nesting, with their duration
+        and share of the total run time.
+
+        Args:
+            file (IO[str]): The file to write the table to.
+        """
+        total = max((span.end or 0 for span in self.spans), default=0)
+        width = max(
+            (2 * span.depth + len(span.name) for span in self.spans),
+            default=5,
+        )
+
+        print(f"{'phase':<{width}}  {'ms':>9}  {'%':>5}", file=file)
+        for span in self.spans:
+            name = '  ' * span.depth + span.name
+            share = 100 * span.duration / total if total else 0
+            attributes = ' '.join(
+                f"{key}={value}" for key, value in span.attributes.items()
+            )
+            print(
+                f"{name:<{width}}  {span.duration * 1000:>9.1f}  "
+                f"{share:>5.1f}  {attributes}".rstrip(),
+                file=file,
+            )
+
+    def write_json(self, file: IO[str]) -> None:
+        """
+        Write the spans as JSON lines, one object per span tagged with the
+        id of the tracer. The lines are written at once, so traces of runs
+        appending to the same file do not interleave.
+
+        Args:
+            file (IO[str]): The file to write the spans to.
+        """
+        file.write(''.join(
+            json.dumps({"trace": self.id, **span.as_dict()}) + "\n"
+            for span in self.spans
+        ))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a phase with the active tracer. Spans opened inside the phase are
+    recorded as its children.
+
+    Args:
+        name (str): The name of the phase.
+        **attributes (Any): Attributes to record with the span.
+
+    Yields:
+        Span: The span, attributes may be added to it until it ends.
+    """
+    tracer = _tracer.get()
+    if tracer is None:
+        yield Span(id=-1, name=name, start=0, attributes=attributes)
+        return
+
+    current = tracer.open(name, _current.get(), attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        current.end = tracer.now()
+        _current.reset(token)
+
+
+def annotate(**attributes: Any) -> None:
+    """
+    Add attributes to the innermost open span, if any.
+
+    Args:
+        **attributes (Any): The attributes to record.
+    """
+    current = _current.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+__all__ = [
+    "annotate",
+    "span",
+    "Span",
+    "Tracer",
+]
@@ -0,0 +1,207 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from typing import Callable, Optional
+
+DEFAULT_VALIDATION_TIMEOUT = 10.0
+
+_FENCE = re.compile(r"^\s*```[\w+-]*\s*\n(.*?)\n?\s*```\s*$", re.DOTALL)
+_POWERSHELL_PARSE = (
+    "$errors = $null; "
+    "[System.Management.Automation.Language.Parser]::ParseInput("
+    "[Console]::In.ReadToEnd(), [ref]$null, [ref]$errors) | Out-Null; "
+    "$errors | ForEach-Object { $_.ToString() }; "
+    "if ($errors) { exit 1 }"
+)
+
+Validator = Callable[[str], Optional[str]]
+
+
+def strip_fence(code: str) -> str:
+    """
+    Remove a markdown code fence around a response, if there is one.
+
+    Args:
+        code (str): The response.
+
+    Returns:
+        str: The code inside the fence, or the response as it is.
+    """
+    match = _FENCE.match(code)
+    return match.group(1) if match else code
+
+
+def _run(arguments: list[str], code: str, timeout: float) -> Optional[str]:
+    """
+    Run a syntax checker on code given on stdin. A checker that does not
+    finish in time is an error, the code is only valid once it passed.
+
+    Returns:
+        Optional[str]: The error of the checker, None if the code is valid.
+    """
+    try:
+        process = subprocess.run(
+            arguments,
+            input=code,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return f"validation timed out after {timeout:g} seconds"
+
+    if process.returncode == 0:
+        return None
+
+    return (process.stderr or process.stdout).strip() or f"exit status {process.returncode}"
+
+
+def _run_file(arguments: list[str], code: str, suffix: str, timeout: float) -> Optional[str]:
+    """
+    Run a syntax checker on code written to a temporary file, whose path is
+    appended to the arguments.
+
+    Returns:
+        Optional[str]: The error of the checker, None if the code is valid.
+    """
+    descriptor, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(descriptor, "w") as file:
+            file.write(code)
+        return _run(arguments + [path], "", timeout)
+    finally:
+        os.unlink(path)
+
+
+def _python(code: str) -> Optional[str]:
+    try:
+        compile(code, "<response>", "exec")
+    except (SyntaxError, ValueError) as error:
+        return f"{type(error).__name__}: {error}"
+
+    return None
+
+
+def _command(*arguments: str) -> Optional[Validator]:
+    """
+    Create a validator that runs a syntax checker reading from stdin, if the
+    checker is installed.
+    """
+    if not shutil.which(arguments[0]):
+        return None
+
+    return lambda code: _run(list(arguments), code, DEFAULT_VALIDATION_TIMEOUT)
+
+
+def _file_command(suffix: str, *arguments: str) -> Optional[Validator]:
+    """
+    Create a validator that runs a syntax checker on a file, if the checker
+    is installed.
+    """
+    if not shutil.which(arguments[0]):
+        return None
+
+    return lambda code: _run_file(list(arguments), code, suffix, DEFAULT_VALIDATION_TIMEOUT)
+
+
+_VALIDATORS: dict[str, Callable[[], Optional[Validator]]] = {
+    "bash": lambda: _command("bash", "-n"),
+    "c": lambda: _command("cc", "-fsyntax-only", "-x", "c", "-"),
+    "go": lambda: _command("gofmt", "-e"),
+    "javascript": lambda: _file_command(".js", "node", "--check"),
+    "powershell": lambda: (
+        _command("pwsh", "-NoProfile", "-NonInteractive", "-Command", _POWERSHELL_PARSE)
+        or _command("powershell", "-NoProfile", "-NonInteractive", "-Command", _POWERSHELL_PARSE)
+    ),
+    "python": lambda: _python,
+}
+
+
+def get_validator(prompt: str) -> Optional[Validator]:
+    """
+    Get the syntax validator for the code a prompt generates. Checkers that
+    are not installed are skipped.
+
+    Args:
+        prompt (str): The name of the prompt, such as bash or python.
+
+    Returns:
+        Optional[Validator]: A function that returns the syntax error of
+            code, or None if the code is valid. None if the code of the
+            prompt cannot be validated here.
+    """
+    factory = _VALIDATORS.get(prompt.casefold().removesuffix("_prompt"))
+    return factory() if factory else None
+
+
+def validate(prompt: str, code: str) -> Optional[str]:
+    """
+    Check the syntax of code generated with a prompt, ignoring a code fence
+    around it.
+
+    Args:
+        prompt (str): The name of the prompt, such as bash or python.
+        code (str): The generated code.
+
+    Returns:
+        Optional[str]: The syntax error, None if the code is valid or cannot
+            be validated.
+    """
+    validator = get_validator(prompt)
+    return validator(strip_fence(code)) if validator else None
+
+
+def validate_all(validator: Validator, candidates: list[str]) -> list[Optional[str]]:
+    """
+    Check the syntax of many candidates concurrently. The checks are mostly
+    separate processes, so a thread per candidate runs them in parallel.
+
+    Args:
+        validator (Validator): The validator of the prompt's language.
+        candidates (list[str]): The generated code, fences are ignored.
+
+    Returns:
+        list[Optional[str]]: The syntax error of each candidate, None for
+            the candidates that are valid.
+    """
+    if len(candidates) < 2:
+        return [validator(strip_fence(candidate)) for candidate in candidates]
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+        return list(executor.map(
+            lambda candidate: validator(strip_fence(candidate)), candidates
+        ))
+
+
+__all__ = [
+    "DEFAULT_VALIDATION_TIMEOUT",
+    "get_validator",
+    "strip_fence",
+    "validate",
+    "validate_all",
+    "Validator",
+]
@@ -0,0 +1,185 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+from collections import defaultdict
+from typing import Optional
+
+from shell_craft.configuration import ConfigurationSnapshot
+
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_MASK = (
+    _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM
+    | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+)
+_EVENT = struct.Struct("iIII")
+
+
+def _inotify() -> Optional[ctypes.CDLL]:
+    """
+    Get the C library if it provides inotify.
+
+    Returns:
+        Optional[ctypes.CDLL]: The C library, or None on systems without
+            inotify.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None
+
+    if not hasattr(libc, "inotify_init1"):
+        return None
+
+    return libc
+
+
+class FileWatcher:
+    def __init__(self, paths: list[str], use_inotify: bool = True) -> None:
+        """
+        Initialize a watcher for changes to the given files, which do not
+        need to exist. The directories of the files are watched with inotify
+        where available, so files replaced by editors are noticed as well.
+        Files in directories that cannot be watched are polled for changes
+        to their modification time and size.
+
+        Args:
+            paths (list[str]): The paths to the files to watch.
+            use_inotify (bool): Whether to use inotify when available,
+                defaults to True.
+        """
+        self._descriptor: Optional[int] = None
+        self._directories: dict[int, str] = {}
+        self._names: dict[int, set[str]] = defaultdict(set)
+        self._polled: list[str] = []
+
+        libc = _inotify() if use_inotify else None
+        if libc:
+            self._descriptor = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if self._descriptor < 0:
+                self._descriptor = None
+
+        for path in paths:
+            directory, name = os.path.split(os.path.abspath(path))
+            watch = -1
+            if self._descriptor is not None:
+                watch = libc.inotify_add_watch(
+                    self._descriptor, os.fsencode(directory), _IN_MASK
+                )
+
+            if watch < 0:
+                self._polled.append(path)
+            else:
+                self._directories[watch] = directory
+                self._names[watch].add(name)
+
+        self._signature = ConfigurationSnapshot.signature(self._polled)
+
+    @property
+    def polling(self) -> bool:
+        """
+        Get whether any of the files is polled instead of watched.
+
+        Returns:
+            bool: True if any file is polled.
+        """
+        return bool(self._polled)
+
+    def _read_events(self) -> bool:
+        """
+        Read the pending inotify events without blocking. Files whose
+        directory stopped being watched, because it was removed, are polled
+        from then on.
+
+        Returns:
+            bool: True if any event concerned a watched file.
+        """
+        if self._descriptor is None:
+            return False
+
+        changed = False
+        while True:
+            try:
+                data = os.read(self._descriptor, 64 * 1024)
+            except BlockingIOError:
+                return changed
+
+            offset = 0
+            while offset < len(data):
+                watch, mask, _, length = _EVENT.unpack_from(data, offset)
+                start = offset + _EVENT.size
+                name = os.fsdecode(data[start:start + length].rstrip(b"\0"))
+                offset = start + length
+
+                if mask & _IN_Q_OVERFLOW:
+                    changed = True
+                elif mask & _IN_IGNORED:
+                    changed = True
+                    directory = self._directories.pop(watch, "")
+                    self._polled.extend(
+                        os.path.join(directory, watched)
+                        for watched in self._names.pop(watch, set())
+                    )
+                elif name in self._names.get(watch, ()):
+                    changed = True
+
+    def changed(self) -> bool:
+        """
+        Determine if any of the files changed since the last call, without
+        blocking.
+
+        Returns:
+            bool: True if any of the files was written, created, replaced
+                or removed.
+        """
+        changed = self._read_events()
+        if self._polled:
+            signature = ConfigurationSnapshot.signature(self._polled)
+            changed = changed or signature != self._signature
+            self._signature = signature
+
+        return changed
+
+    def close(self) -> None:
+        """
+        Stop watching the files.
+        """
+        if self._descriptor is not None:
+            os.close(self._descriptor)
+            self._descriptor = None
+
+
+__all__ = [
+    "FileWatcher",
+]
@@ -0,0 +1,123 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import asyncio
+import io
+import json
+import unittest.mock
+from dataclasses import replace
+
+import pytest
+
+from shell_craft.cli.batch import BatchRequest, run_batch
+from shell_craft.cli.parser import _batch_from_stdin
+from shell_craft.services import AsyncOpenAIService, OpenAISettings
+
+
+@pytest.fixture
+def service() -> AsyncOpenAIService:
+    return AsyncOpenAIService(
+        OpenAISettings(
+            api_key="test",
+            model="test",
+            count=1,
+            temperature=1.0,
+            messages=[],
+        )
+    )
+
+async def echo(**kwargs) -> dict:
+    content = kwargs["messages"][-1]["content"]
+    await asyncio.sleep(0.05 if content == "slow" else 0)
+    if content == "fail":
+        raise RuntimeError("failed")
+
+    return {"choices": [{"message": {"content": f"{kwargs['model']}:{content}"}}]}
+
+def run(service: AsyncOpenAIService, lines: list[str], ordered: bool = True) -> list[dict]:
+    output = io.StringIO()
+    with unittest.mock.patch("openai.ChatCompletion.acreate", echo):
+        run_batch(
+            lines,
+            service,
+            lambda request: replace(
+                service.settings,
+                model=request.model or service.settings.model
+            ),
+            output,
+            workers=4,
+            ordered=ordered,
+        )
+
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("list files\n", BatchRequest(index=0, request="list files")),
+        (
+            '{"request": "list files", "model": "gpt-4", "id": "a"}',
+            BatchRequest(index=0, request="list files", model="gpt-4", id="a"),
+        ),
+    ]
+)
+def test_batch_request_from_line(line: str, expected: BatchRequest):
+    assert BatchRequest.from_line(0, line) == expected
+
+def test_batch_request_requires_request():
+    with pytest.raises(ValueError):
+        BatchRequest.from_line(0, '{"model": "gpt-4"}')
+
+def test_run_batch_writes_results_in_input_order(service: AsyncOpenAIService):
+    # Act
+    records = run(service, ["slow\n", "\n", "fast\n", '{"request": "x", "model": "gpt-4"}\n'])
+
+    # Assert
+    assert [record["index"] for record in records] == [0, 1, 2]
+    assert [record["results"] for record in records] == [
+        ["test:slow"], ["test:fast"], ["gpt-4:x"]
+    ]
+
+def test_run_batch_unordered_writes_results_as_completed(service: AsyncOpenAIService):
+    # Act
+    records = run(service, ["slow", "fast"], ordered=False)
+
+    # Assert
+    assert [record["request"] for record in records] == ["fast", "slow"]
+
+def test_run_batch_records_errors(service: AsyncOpenAIService):
+    # Act
+    records = run(service, ["fail", "{invalid"])
+
+    # Assert
+    assert [record["index"] for record in records] == [0, 1]
+    assert all("error" in record for record in records)
+
+@pytest.mark.parametrize(
+    "arguments, expected",
+    [
+        (["--batch", "-"], True),
+        (["--batch=-"], True),
+        (["--batch", "requests.jsonl"], False),
+        (["list", "-"], False),
+    ]
+)
+def test_batch_from_stdin(arguments: list[str], expected: bool):
+    assert _batch_from_stdin(arguments) == expected
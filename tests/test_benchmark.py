@@ -0,0 +1,117 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import io
+import time
+
+import pytest
+
+from shell_craft.cli.benchmark import (Candidate, Measurement, benchmark,
+                                       consensus, measure, rank,
+                                       write_ranking)
+
+
+def _measurement(wall: float, status: int = 0, digest: str = "a") -> Measurement:
+    return Measurement(wall=wall, status=status, rss=None, digest=digest, size=0)
+
+def test_measure_runs_in_scratch_directory_with_sample(tmp_path):
+    # Arrange
+    sample = tmp_path / "sample.txt"
+    sample.write_text("b\na\n")
+
+    # Act
+    piped = measure("sort", sample=str(sample))
+    named = measure("sort sample.txt", sample=str(sample))
+    empty = measure("ls | wc -l")
+
+    # Assert
+    assert piped.status == 0
+    assert piped.digest == named.digest
+    assert piped.size == 4
+    assert empty.size == 2
+
+def test_measure_reports_timeout_as_missing_status():
+    # Act
+    result = measure("sleep 30", timeout=0.2)
+
+    # Assert
+    assert result.status is None
+    assert result.wall < 5
+
+@pytest.mark.parametrize("command", ["sleep 30 | cat", "(sleep 30; echo done)"])
+def test_measure_timeout_kills_every_process_of_the_command(command):
+    # Arrange
+    start = time.monotonic()
+
+    # Act
+    result = measure(command, timeout=0.2)
+
+    # Assert
+    assert time.monotonic() - start < 10
+    assert result.status is None
+
+def test_rank_orders_by_median_and_puts_failures_last():
+    # Arrange
+    slow = Candidate("slow", [_measurement(0.3), _measurement(0.1), _measurement(0.4)])
+    fast = Candidate("fast", [_measurement(0.2), _measurement(0.2), _measurement(0.9)])
+    failed = Candidate("failed", [_measurement(0.01, status=1)])
+
+    # Act
+    ranking = rank([failed, slow, fast])
+
+    # Assert
+    assert [candidate.command for candidate in ranking] == ["fast", "slow", "failed"]
+    assert fast.median == 0.2
+
+def test_consensus_ignores_failed_and_unstable_candidates():
+    # Arrange
+    candidates = [
+        Candidate("a", [_measurement(0.1, digest="x")]),
+        Candidate("b", [_measurement(0.1, digest="y")]),
+        Candidate("c", [_measurement(0.1, digest="y")]),
+        Candidate("d", [_measurement(0.1, status=1, digest="z")] * 3),
+        Candidate("e", [_measurement(0.1, digest="x"), _measurement(0.1, digest="w")]),
+    ]
+
+    # Act
+    reference = consensus(candidates)
+
+    # Assert
+    assert reference == "y"
+    assert candidates[4].digest is None
+
+def test_benchmark_ranks_candidates_and_marks_disagreement():
+    # Arrange
+    output = io.StringIO()
+
+    # Act
+    ranking = benchmark(
+        ["sleep 0.05; echo 3", "echo 3", "echo 3", "echo 4", "exit 2"], runs=2
+    )
+    write_ranking(ranking, output)
+
+    # Assert
+    assert [candidate.command for candidate in ranking][-1] == "exit 2"
+    assert ranking[0].command in ("echo 3", "echo 4")
+    assert len(ranking) == 4
+    assert all(len(candidate.runs) == 2 for candidate in ranking)
+    lines = output.getvalue().splitlines()
+    assert any("differs" in line and "echo 4" in line for line in lines)
+    assert any("agrees" in line and "sleep 0.05; echo 3" in line for line in lines)
@@ -0,0 +1,92 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import textwrap
+
+from shell_craft.chunking import estimate_tokens, split_source
+
+PYTHON_SOURCE = textwrap.dedent('''
+    """A module."""
+    import os
+
+    LIMIT = 3
+
+
+    @decorator
+    def first():
+        return "{}"
+
+
+    # A comment about the class.
+    class Second:
+        def method(self):
+            return os.sep
+''').lstrip() + "".join(
+    f"\n\ndef function_{index}():\n    return {index}\n" for index in range(40)
+)
+
+
+def test_split_source_keeps_small_source_whole():
+    # Act
+    chunks = split_source("print('hello')\n", budget=100)
+
+    # Assert
+    assert chunks.chunks == ["print('hello')\n"]
+    assert chunks.context == ""
+
+def test_split_source_splits_python_between_definitions():
+    # Act
+    chunks = split_source(PYTHON_SOURCE, budget=60)
+
+    # Assert
+    assert "".join(chunks.chunks) == PYTHON_SOURCE
+    assert len(chunks.chunks) > 1
+    assert chunks.context == '"""A module."""\nimport os\n\nLIMIT = 3\n\n\n'
+    for chunk in chunks.chunks[1:]:
+        assert chunk.lstrip().startswith(("def ", "@", "#", "class "))
+    assert any("@decorator\ndef first" in chunk for chunk in chunks.chunks)
+    assert all(estimate_tokens(chunk) <= 60 for chunk in chunks.chunks)
+
+def test_split_source_splits_other_languages_between_blocks():
+    # Arrange
+    source = "import x from 'y';\n" + "".join(
+        f"\nfunction f{index}() {{\n  return {index};\n}}\n" for index in range(50)
+    )
+
+    # Act
+    chunks = split_source(source, budget=40)
+
+    # Assert
+    assert "".join(chunks.chunks) == source
+    assert chunks.context == "import x from 'y';\n\n"
+    for chunk in chunks.chunks[1:]:
+        assert chunk.startswith("function ")
+        assert chunk.rstrip().endswith("}")
+
+def test_split_source_splits_oversized_definitions_on_lines():
+    # Arrange
+    source = "def large():\n" + "    x = 1\n" * 200
+
+    # Act
+    chunks = split_source(source, budget=50)
+
+    # Assert
+    assert "".join(chunks.chunks) == source
+    assert all(estimate_tokens(chunk) <= 50 for chunk in chunks.chunks)
@@ -1,15 +1,31 @@
+import json
 import pathlib
+import subprocess
+import threading
+import time
 import unittest.mock
-from argparse import Namespace
+from argparse import ArgumentParser, Namespace
+from dataclasses import replace
 from typing import Optional
 
 import pytest
 
-from shell_craft.cli.main import (AggregateConfiguration, _generate_service,
+from shell_craft.cli.commands import _COMMANDS
+from shell_craft.cli.execute import DEFAULT_OUTPUT_LIMIT, ExecutionResult
+from shell_craft.cli.main import (AggregateConfiguration, _batch,
+                                  _daemon_handler, _first_valid,
+                                  _generate_service,
+                                  _git_diff,
                                   _get_configuration, _get_prompt,
                                   _get_sub_prompt_name, _interactive,
+                                  _print_stream, _rank_by_runtime, _run,
                                   _single_request)
+from shell_craft.cli.parser import (get_arguments, initialize_parser,
+                                    read_arguments)
+from shell_craft.history import History
 from shell_craft.prompts.languages import BASH_PROMPT
+from shell_craft.services import (AsyncOpenAIService, OpenAIService,
+                                  SingleFlight, StreamDelta)
 
 
 @pytest.fixture
@@ -23,6 +39,7 @@ def namespace() -> Namespace:
     - count
     - temperature
     - prompt
+    - stream
 
     :return: Namespace with the above arguments.
     :rtype: Namespace
@@ -34,6 +51,7 @@ def namespace() -> Namespace:
         temperature=1,
         prompt="bash",
         request="test",
+        stream=False,
     )
 
 @pytest.mark.parametrize(
@@ -87,6 +105,22 @@ def test_configuration_expands_xdg_home_env_var():
             _get_configuration()
             assert expand('~/.config/shell-craft/config.json') in mock.call_args.args[0]
 
+def test_configuration_reads_only_referenced_env_vars():
+    """
+    Tests that only environment variables that commands read their defaults
+    from are added to the configuration.
+    """
+    with unittest.mock.patch.object(
+        AggregateConfiguration,
+        'from_files',
+        return_value={'test': 'test'}
+    ):
+        configuration = _get_configuration(
+            environ={'OPENAI_API_KEY': 'key', 'PATH': '/bin'}
+        )
+
+    assert configuration == {'test': 'test', 'openai_api_key': 'key'}
+
 @pytest.mark.parametrize(
     "args, expected",
     [
@@ -164,6 +198,94 @@ def test_single_request_prints_response(namespace: Namespace):
             # Assert
             print_mock.assert_called_once_with('test')
 
+@pytest.mark.parametrize('responses, expected_models, expected', [
+    ({'gpt-3.5-turbo': ['def (', 'print(1)']}, ['gpt-3.5-turbo'], ['print(1)']),
+    ({'gpt-3.5-turbo': ['def ('], 'gpt-4': ['print(2)']}, ['gpt-3.5-turbo', 'gpt-4'], ['print(2)']),
+    ({'gpt-3.5-turbo': ['def ('], 'gpt-4': ['class']}, ['gpt-3.5-turbo', 'gpt-4'], ['class']),
+])
+def test_cascade_escalates_invalid_code(
+    namespace: Namespace, responses, expected_models, expected, capsys
+):
+    """
+    Tests that only responses that fail the syntax check are sent to the
+    next model of the cascade.
+    """
+    # Arrange
+    namespace.prompt = 'python'
+    namespace.cascade = ['gpt-3.5-turbo', 'gpt-4']
+    service = _generate_service(namespace)
+    models = []
+
+    def query(self, message):
+        models.append(self.settings.model)
+        return responses[self.settings.model]
+
+    with unittest.mock.patch.object(OpenAIService, 'query', query):
+        # Act
+        _single_request(service, namespace)
+
+    # Assert
+    assert models == expected_models
+    assert capsys.readouterr().out.splitlines() == expected
+
+@pytest.mark.parametrize('failures, status', [(0, None), (2, 1)])
+def test_batch_exits_with_failure_status(namespace: Namespace, tmp_path, failures, status):
+    """
+    Tests that a batch exits with a non-zero status when a request failed.
+    """
+    # Arrange
+    batch = tmp_path / 'batch.txt'
+    batch.write_text('list files\nfail\n')
+    namespace.batch = batch.as_posix()
+    namespace.workers = 2
+    namespace.unordered = False
+    with unittest.mock.patch(
+        'shell_craft.cli.batch.run_batch', return_value=failures
+    ) as run_batch_mock:
+        # Act
+        try:
+            _batch(namespace)
+            exit_status = None
+        except SystemExit as error:
+            exit_status = error.code
+
+    # Assert
+    run_batch_mock.assert_called_once()
+    assert exit_status == status
+
+def test_generated_services_share_in_flight_queries(namespace: Namespace):
+    """
+    Tests that services generated with the same group, as the daemon does for
+    concurrent runs, share identical queries in flight.
+    """
+    # Arrange
+    group = SingleFlight()
+    services = [_generate_service(namespace, group=group) for _ in range(4)]
+    calls = []
+
+    def query(self, message):
+        calls.append(message)
+        time.sleep(0.05)
+        return ['ls']
+
+    results = []
+    with unittest.mock.patch.object(OpenAIService, 'query', query):
+        threads = [
+            threading.Thread(target=lambda service=service: results.append(service.query('list files')))
+            for service in services
+        ]
+
+        # Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # Assert
+    assert calls == ['list files']
+    assert results == [['ls']] * 4
+    assert group.stats.saved == 3
+
 def test_interactive_mode_prints_results(namespace: Namespace):
     """
     Tests that the interactive mode prints the results.
@@ -188,3 +310,605 @@ def test_interactive_mode_prints_results(namespace: Namespace):
                         unittest.mock.call(),
                     ]
                 )
+
+@pytest.mark.parametrize('responses, expected', [
+    ({'gpt-3.5-turbo': ['def (', 'print(1)', 'print(2)']}, 'print(1)\n'),
+    ({'gpt-3.5-turbo': ['def ('], 'gpt-4': ['print(3)', 'print(4)']}, 'print(3)\n'),
+    ({'gpt-3.5-turbo': ['def ('], 'gpt-4': ['class']}, None),
+])
+def test_first_valid_with_cascade(namespace: Namespace, responses, expected, capsys):
+    """
+    Tests that only the first valid response of the cascade is printed.
+    """
+    # Arrange
+    namespace.prompt = 'python'
+    namespace.cascade = ['gpt-3.5-turbo', 'gpt-4']
+    namespace.first_valid = True
+    service = _generate_service(namespace)
+
+    def query(self, message):
+        return responses[self.settings.model]
+
+    with unittest.mock.patch.object(OpenAIService, 'query', query):
+        # Act
+        try:
+            _single_request(service, namespace)
+            status = None
+        except SystemExit as error:
+            status = error.code
+
+    # Assert
+    if expected is None:
+        assert 'No response passed' in status
+    else:
+        assert capsys.readouterr().out == expected
+
+def test_interactive_mode_searches_and_recalls_history(namespace: Namespace, capsys):
+    """
+    Tests that requests are stored in the history, and that recalled answers
+    are executed without querying the model.
+    """
+    # Arrange
+    service = _generate_service(namespace)
+    history = History(':memory:')
+    with unittest.mock.patch.object(service, 'query', return_value=['ls -la']) as service_mock:
+        with unittest.mock.patch('builtins.input') as input_mock:
+            input_mock.side_effect = [
+                'list files', 'n', '!search files', '!recall 1', 'y', '!recall 9', 'exit'
+            ]
+            with unittest.mock.patch(
+                'shell_craft.cli.main.ShellSession'
+            ) as session_mock:
+                session = session_mock.return_value.__enter__.return_value
+                session.run.return_value = ExecutionResult(status=0, output='total 0')
+
+                # Act
+                _interactive(service, history=history)
+
+    # Assert
+    service_mock.assert_called_once_with(message='list files')
+    session.run.assert_called_once_with('ls -la', timeout=None, limit=DEFAULT_OUTPUT_LIMIT)
+    assert '[1] list files\n    ls -la\n' in capsys.readouterr().out
+    assert history.get(1).output == 'total 0'
+    assert history.get(2) is None
+
+def test_interactive_mode_swaps_settings_between_turns(namespace: Namespace):
+    """
+    Tests that reloaded settings are used from the next turn on, sharing the
+    connection pool of the previous service.
+    """
+    # Arrange
+    service = _generate_service(namespace)
+    settings = replace(service.settings, model='gpt-4')
+    models = []
+
+    def query(self, message):
+        models.append(self.settings.model)
+        return ['ls']
+
+    with unittest.mock.patch.object(OpenAIService, 'query', query):
+        with unittest.mock.patch('builtins.input') as input_mock:
+            input_mock.side_effect = ['ls', 'n', 'ls', 'n', 'exit']
+            with unittest.mock.patch('builtins.print'):
+                # Act
+                _interactive(
+                    service,
+                    reload=iter([None, settings, None]).__next__,
+                )
+
+    # Assert
+    assert models == ['test', 'gpt-4']
+
+def test_interactive_run_stops_watching_configuration(tmp_path):
+    """
+    Tests that the configuration files are no longer watched once an
+    interactive session ends.
+    """
+    # Arrange
+    configuration = AggregateConfiguration([{
+        'openai_api_key': 'test',
+        'shell_craft_history': str(tmp_path / 'history.db'),
+    }])
+    with unittest.mock.patch('shell_craft.watcher.FileWatcher') as watcher:
+        with unittest.mock.patch('builtins.input', side_effect=['exit']):
+            with unittest.mock.patch('builtins.print'):
+                # Act
+                _run(['--prompt', 'bash', '--interactive'], configuration)
+
+    # Assert
+    watcher.return_value.close.assert_called_once_with()
+
+def test_interactive_mode_executes_in_shell_session(namespace: Namespace):
+    """
+    Tests that confirmed commands are run in one shell session and a failing
+    status is reported.
+    """
+    # Arrange
+    service = _generate_service(namespace)
+    with unittest.mock.patch.object(service, 'query', return_value=['false']):
+        with unittest.mock.patch('builtins.input') as input_mock:
+            input_mock.side_effect = ['fail', 'y', 'again', 'y', 'exit']
+            with unittest.mock.patch(
+                'shell_craft.cli.main.ShellSession'
+            ) as session_mock:
+                session = session_mock.return_value.__enter__.return_value
+                session.run.return_value = ExecutionResult(status=1, output='')
+                with unittest.mock.patch('builtins.print') as print_mock:
+                    # Act
+                    _interactive(service, 'bash', timeout=5)
+
+    # Assert
+    session_mock.assert_called_once_with('bash')
+    session.run.assert_called_with('false', timeout=5, limit=DEFAULT_OUTPUT_LIMIT)
+    assert session.run.call_count == 2
+    print_mock.assert_any_call("Command exited with status 1.")
+
+def test_rank_by_runtime_runs_candidates_after_confirmation(namespace: Namespace):
+    """
+    Tests that ranking only runs the distinct candidates once confirmed.
+    """
+    # Arrange
+    service = _generate_service(namespace)
+    namespace.runs = 3
+    with unittest.mock.patch.object(service, 'query', return_value=['ls', 'ls', 'ls -1']):
+        with unittest.mock.patch('builtins.input', side_effect=['n', 'y']):
+            with unittest.mock.patch(
+                'shell_craft.cli.main.benchmark', return_value=[]
+            ) as benchmark_mock:
+                with unittest.mock.patch('builtins.print'):
+                    # Act
+                    _rank_by_runtime(service, namespace)
+                    benchmark_mock.assert_not_called()
+                    _rank_by_runtime(service, namespace)
+
+    # Assert
+    benchmark_mock.assert_called_once_with(
+        ['ls', 'ls -1'], shell='bash', runs=3, sample=None, timeout=None
+    )
+
+def test_single_request_splits_large_sources(namespace: Namespace):
+    """
+    Tests that a large source is queried in chunks concurrently and the
+    responses are printed joined in order, keeping the blank lines between
+    the chunks.
+    """
+    # Arrange
+    namespace.document = True
+    namespace.chunk_tokens = 20
+    namespace.stdin_source = True
+    namespace.request = [
+        'document',
+        'import os\n' + ''.join(f'\ndef f{index}():\n    return {index}\n' for index in range(3)),
+    ]
+    service = _generate_service(namespace)
+    messages = []
+
+    async def query(self, message):
+        messages.append(message)
+        return [f'documented {len(messages)}\n']
+
+    with unittest.mock.patch.object(AsyncOpenAIService, 'query', query):
+        with unittest.mock.patch('builtins.print') as print_mock:
+            # Act
+            _single_request(service, namespace)
+
+    # Assert
+    assert len(messages) == 2
+    assert all(message.startswith('document\n\n') for message in messages)
+    assert 'The start of the file' not in messages[0]
+    assert messages[1].endswith('import os\n\nPart 2 of 2 of the file:\ndef f2():\n    return 2\n')
+    print_mock.assert_called_once_with('documented 1\n\ndocumented 2\n', end='')
+
+def test_single_request_sends_inline_request_whole(namespace: Namespace):
+    """
+    Tests that a request with a sub-prompt but nothing read from stdin is
+    sent as one message instead of treating its last word as the source.
+    """
+    # Arrange
+    namespace.refactor = True
+    namespace.diff = True
+    namespace.request = ['refactor', 'this', 'function']
+    service = _generate_service(namespace)
+
+    with unittest.mock.patch.object(service, 'query', return_value=['done']) as query:
+        with unittest.mock.patch('builtins.print'):
+            # Act
+            _single_request(service, namespace)
+
+    # Assert
+    query.assert_called_once_with(message='refactor this function')
+
+@pytest.mark.parametrize('apply, expected', [
+    (False, '--- a/stdin\n+++ b/stdin\n@@ -1,2 +1,2 @@\n-x=1\n+x = 1\n y = 2\n'),
+    (True, 'x = 1\ny = 2\n'),
+])
+def test_diff_mode_applies_the_returned_diff(namespace: Namespace, apply, expected, capsys):
+    """
+    Tests that --diff asks for a diff, applies it to the source and prints
+    the resulting patch, or the changed source with --apply.
+    """
+    # Arrange
+    namespace.refactor = True
+    namespace.diff = True
+    namespace.apply = apply
+    namespace.stdin_source = True
+    namespace.request = ['x=1\ny = 2\n']
+    service = _generate_service(namespace)
+    prompts = []
+
+    async def query(self, message):
+        prompts.append(self.settings.messages[0]['content'])
+        return ['```diff\n@@ -1 +1 @@\n-x=1\n+x = 1\n```']
+
+    with unittest.mock.patch.object(AsyncOpenAIService, 'query', query):
+        # Act
+        _single_request(service, namespace)
+
+    # Assert
+    assert len(prompts) == 1 and 'unified diff' in prompts[0]
+    assert capsys.readouterr().out == expected
+
+def test_git_diff_queries_changed_regions_and_prints_patch(
+    namespace: Namespace, tmp_path, monkeypatch, capsys
+):
+    """
+    Tests that only the changed regions are queried and the responses are
+    printed as a patch replacing them.
+    """
+    # Arrange
+    git = ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com']
+    (tmp_path / 'main.py').write_text(''.join(f'x = {n}\n' for n in range(30)))
+    subprocess.run(git + ['init', '-q'], cwd=tmp_path, check=True)
+    subprocess.run(git + ['add', '.'], cwd=tmp_path, check=True)
+    subprocess.run(git + ['commit', '-q', '-m', 'initial'], cwd=tmp_path, check=True)
+    (tmp_path / 'main.py').write_text(
+        ''.join(f'x = {n}\n' for n in range(30)).replace('x = 15', 'x = 150')
+    )
+    monkeypatch.chdir(tmp_path)
+    namespace.prompt = 'python'
+    namespace.refactor = True
+    namespace.request = []
+    namespace.git_diff = 'HEAD'
+    namespace.git_diff_context = 1
+    messages = []
+
+    async def query(self, message):
+        messages.append(message)
+        return ['x = 14\ny = 150\nx = 16\n']
+
+    with unittest.mock.patch.object(AsyncOpenAIService, 'query', query):
+        # Act
+        _git_diff(namespace)
+
+    # Assert
+    assert messages == ['Lines 15 to 17 of main.py:\n\nx = 14\nx = 150\nx = 16\n']
+    patch = capsys.readouterr().out
+    assert patch.startswith('--- a/main.py\n+++ b/main.py\n')
+    assert '-x = 150\n+y = 150\n' in patch
+
+@pytest.mark.parametrize('apply', [False, True])
+def test_git_diff_does_not_overwrite_existing_tests(
+    namespace: Namespace, tmp_path, monkeypatch, capsys, apply
+):
+    """
+    Tests that generated tests replace an existing test file only in the
+    printed patch, and that --apply leaves it alone.
+    """
+    # Arrange
+    git = ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com']
+    (tmp_path / 'main.py').write_text('x = 1\n')
+    (tmp_path / 'test_main.py').write_text('def test_old():\n    pass\n')
+    subprocess.run(git + ['init', '-q'], cwd=tmp_path, check=True)
+    subprocess.run(git + ['add', '.'], cwd=tmp_path, check=True)
+    subprocess.run(git + ['commit', '-q', '-m', 'initial'], cwd=tmp_path, check=True)
+    (tmp_path / 'main.py').write_text('x = 2\n')
+    monkeypatch.chdir(tmp_path)
+    namespace.prompt = 'python'
+    namespace.test = True
+    namespace.request = []
+    namespace.git_diff = 'HEAD'
+    namespace.apply = apply
+
+    async def query(self, message):
+        return ['def test_new():\n    pass\n']
+
+    with unittest.mock.patch.object(AsyncOpenAIService, 'query', query):
+        # Act
+        try:
+            _git_diff(namespace)
+            status = None
+        except SystemExit as error:
+            status = error.code
+
+    # Assert
+    captured = capsys.readouterr()
+    assert (tmp_path / 'test_main.py').read_text() == 'def test_old():\n    pass\n'
+    if apply:
+        assert status == 1
+        assert 'Skipped test_main.py' in captured.err
+    else:
+        assert status is None
+        assert captured.out.startswith('--- a/test_main.py\n+++ b/test_main.py\n')
+        assert '-def test_old():\n' in captured.out
+
+def test_single_request_streams_response(namespace: Namespace):
+    """
+    Tests that the single request prints the response as it is streamed.
+    """
+    # Arrange
+    namespace.stream = True
+    service = _generate_service(namespace)
+    with unittest.mock.patch.object(service, 'stream') as service_mock:
+        service_mock.return_value = [
+            StreamDelta(0, 'l'),
+            StreamDelta(0, 's', finished=True),
+        ]
+        with unittest.mock.patch('builtins.print') as print_mock:
+            # Act
+            _single_request(service, namespace)
+
+            # Assert
+            print_mock.assert_has_calls([
+                unittest.mock.call('l', end='', flush=True),
+                unittest.mock.call('s', end='', flush=True),
+                unittest.mock.call(),
+            ])
+
+def test_validate_drops_invalid_responses(namespace: Namespace, capsys):
+    """
+    Tests that responses failing the syntax check are not printed.
+    """
+    # Arrange
+    namespace.prompt = 'python'
+    namespace.count = 3
+    namespace.validate = True
+    service = _generate_service(namespace)
+    with unittest.mock.patch.object(service, 'query') as service_mock:
+        service_mock.return_value = ['def (', 'print(1)', 'print(2)']
+
+        # Act
+        _single_request(service, namespace)
+
+    # Assert
+    assert capsys.readouterr().out.splitlines() == ['print(1)', 'print(2)']
+
+def test_validate_exits_without_valid_responses(namespace: Namespace):
+    """
+    Tests that the request fails when no response passes the syntax check.
+    """
+    # Arrange
+    namespace.prompt = 'python'
+    namespace.validate = True
+    service = _generate_service(namespace)
+    with unittest.mock.patch.object(service, 'query') as service_mock:
+        service_mock.return_value = ['def (']
+
+        # Act / Assert
+        with pytest.raises(SystemExit, match='No response passed'):
+            _single_request(service, namespace)
+
+def test_first_valid_returns_before_the_stream_ends(namespace: Namespace, capsys):
+    """
+    Tests that streaming stops at the first finished response that passes
+    the syntax check.
+    """
+    # Arrange
+    namespace.prompt = 'python'
+    namespace.count = 3
+    namespace.stream = True
+    namespace.first_valid = True
+    service = _generate_service(namespace)
+    read = []
+
+    def stream(message):
+        deltas = [
+            StreamDelta(0, 'def ('),
+            StreamDelta(1, 'print(1)'),
+            StreamDelta(0, '', finished=True),
+            StreamDelta(1, '', finished=True),
+            *[StreamDelta(2, ' ') for _ in range(100)],
+            StreamDelta(2, 'print(2)', finished=True),
+        ]
+        for delta in deltas:
+            read.append(delta)
+            time.sleep(0.01)
+            yield delta
+
+    with unittest.mock.patch.object(service, 'stream', stream):
+        # Act
+        _single_request(service, namespace)
+
+    # Assert
+    assert capsys.readouterr().out == 'print(1)\n'
+    assert len(read) < 100
+
+def test_first_valid_does_not_wait_for_losing_checks():
+    """
+    Tests that the first valid response is returned while the check of
+    another response is still running.
+    """
+    # Arrange
+    release = threading.Event()
+    deltas = [
+        StreamDelta(0, 'slow', finished=True),
+        StreamDelta(1, 'fast', finished=True),
+    ]
+
+    def validator(text: str) -> Optional[str]:
+        if text == 'slow':
+            release.wait(5)
+            return 'invalid'
+        return None
+
+    # Act
+    start = time.monotonic()
+    result = _first_valid(deltas, 2, validator)
+    elapsed = time.monotonic() - start
+    release.set()
+
+    # Assert
+    assert result == ('fast', None)
+    assert elapsed < 2
+
+def test_first_valid_without_streaming(namespace: Namespace, capsys):
+    """
+    Tests that only the first valid response is printed without streaming.
+    """
+    # Arrange
+    namespace.prompt = 'python'
+    namespace.count = 3
+    namespace.first_valid = True
+    service = _generate_service(namespace)
+    with unittest.mock.patch.object(service, 'query') as service_mock:
+        service_mock.return_value = ['def (', 'print(1)', 'print(2)']
+
+        # Act
+        _single_request(service, namespace)
+
+    # Assert
+    assert capsys.readouterr().out == 'print(1)\n'
+
+def test_print_stream_renders_choices_in_order(capsys):
+    """
+    Tests that interleaved choices are printed in their own sections.
+    """
+    # Arrange
+    deltas = [
+        StreamDelta(1, 'pwd'),
+        StreamDelta(0, 'ls'),
+        StreamDelta(1, '', finished=True),
+        StreamDelta(0, ' -la', finished=True),
+    ]
+
+    # Act
+    results = _print_stream(deltas, count=2)
+
+    # Assert
+    assert results == ['ls -la', 'pwd']
+    assert capsys.readouterr().out == 'ls -la\npwd\n'
+
+def test_print_stream_flushes_unfinished_choices(capsys):
+    """
+    Tests that choices without a finish reason are still printed.
+    """
+    # Act
+    _print_stream([StreamDelta(1, 'pwd'), StreamDelta(0, 'ls')], count=2)
+
+    # Assert
+    assert capsys.readouterr().out == 'ls\npwd\n'
+
+def test_run_writes_timings_and_trace(tmp_path, capsys):
+    """
+    Tests that --timings prints a table of the phases to stderr and --trace
+    appends them to a file as JSON lines.
+    """
+    # Arrange
+    trace = tmp_path / 'trace.jsonl'
+    configuration = AggregateConfiguration([{'openai_api_key': 'test'}])
+    with unittest.mock.patch(
+        'openai.ChatCompletion.create',
+        return_value={"choices": [{"message": {"content": "ls"}}]},
+    ):
+        # Act
+        _run(
+            ['--prompt', 'bash', '--no-cache', '--no-stream', '--timings',
+             '--trace', str(trace), 'list', 'files'],
+            configuration,
+        )
+
+    # Assert
+    captured = capsys.readouterr()
+    names = [json.loads(line)['name'] for line in trace.read_text().splitlines()]
+    assert captured.out == 'ls\n'
+    assert names == ['prompt_packs', 'parser', 'arguments', 'prompt', 'service', 'query',
+                     'openai.query', 'openai.request', 'print']
+    assert '  openai.query' in captured.err
+
+def test_daemon_handler_writes_trace_relative_to_the_client(tmp_path, monkeypatch):
+    """
+    Tests that a relative --trace path of a request served by the daemon is
+    written in the client's working directory.
+    """
+    # Arrange
+    client, daemon = tmp_path / 'client', tmp_path / 'daemon'
+    client.mkdir()
+    daemon.mkdir()
+    monkeypatch.chdir(daemon)
+    handle = _daemon_handler()
+    with unittest.mock.patch(
+        'openai.ChatCompletion.create',
+        return_value={"choices": [{"message": {"content": "ls"}}]},
+    ):
+        # Act
+        handle(
+            ['--prompt', 'bash', '--no-cache', '--no-stream', '--trace', 'trace.jsonl',
+             'list', 'files'],
+            str(client),
+            {'OPENAI_API_KEY': 'test'},
+            None,
+        )
+
+    # Assert
+    assert (client / 'trace.jsonl').read_text()
+    assert not (daemon / 'trace.jsonl').exists()
+
+def test_initialize_parser_parses_arguments_once():
+    """
+    Tests that the restriction checks share a single parse of the arguments.
+    """
+    # Arrange
+    parser = ArgumentParser(add_help=False)
+    configuration = AggregateConfiguration([])
+
+    with unittest.mock.patch.object(
+        parser, 'parse_known_args', wraps=parser.parse_known_args
+    ) as parse_mock:
+        # Act
+        initialize_parser(
+            parser, _COMMANDS, configuration, ['--prompt', 'python', '--test']
+        )
+
+    # Assert
+    parse_mock.assert_called_once()
+    assert parser.parse_args(['--prompt', 'python', '--test']).test
+
+@pytest.mark.parametrize('prompt', ['bash', 'BASH', 'bash_prompt', 'BASH_PROMPT'])
+def test_get_arguments_normalizes_the_prompt(prompt: str):
+    """
+    Tests that every spelling of a prompt is parsed to its registry key,
+    with the restricted commands of the prompt available.
+    """
+    # Arrange
+    arguments = ['--prompt', prompt, '--interactive']
+    parser = initialize_parser(
+        ArgumentParser(add_help=False), _COMMANDS, AggregateConfiguration([]), arguments
+    )
+
+    # Act
+    args = get_arguments(parser, arguments)
+
+    # Assert
+    assert args.prompt == 'bash'
+    assert args.interactive
+
+@pytest.mark.parametrize('source, stdin_source', [('x = 1\n', True), ('', False)])
+def test_read_arguments_marks_the_source_from_stdin(source: str, stdin_source: bool):
+    """
+    Tests that only a request whose source was read from stdin is parsed as
+    having one.
+    """
+    # Arrange
+    stdin = unittest.mock.Mock(isatty=lambda: False, read=lambda: source)
+    with unittest.mock.patch('shell_craft.cli.parser.argv', ['shell-craft', '--prompt', 'python', '--document']):
+        with unittest.mock.patch('shell_craft.cli.parser.stdin', stdin):
+            arguments = read_arguments()
+    parser = initialize_parser(
+        ArgumentParser(add_help=False), _COMMANDS, AggregateConfiguration([]), arguments
+    )
+
+    # Act
+    args = get_arguments(parser, arguments)
+
+    # Assert
+    assert args.stdin_source == stdin_source
+    assert args.request == ([source] if source else [])
@@ -19,7 +19,7 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import pytest
-from shell_craft.cli.types import limited_float
+from shell_craft.cli.types import comma_separated, limited_float
 from argparse import ArgumentTypeError
 
 
@@ -72,4 +72,18 @@ def test_limited_float_max(value: float, min_value: float, max_value: float, exp
 )
 def test_limited_float_range_exception(value: float, min_value: float, max_value: float, exception: Exception):
     with pytest.raises(exception):
-        limited_float(min_value, max_value)(value)
\ No newline at end of file
+        limited_float(min_value, max_value)(value)
+@pytest.mark.parametrize(
+    'value, expected',
+    [
+        ('a', ['a']),
+        ('a, b,', ['a', 'b']),
+    ]
+)
+def test_comma_separated(value: str, expected: list):
+    assert comma_separated(['a', 'b'])(value) == expected
+
+@pytest.mark.parametrize('value', ['', ' , ', 'a,c'])
+def test_comma_separated_exception(value: str):
+    with pytest.raises(ArgumentTypeError):
+        comma_separated(['a', 'b'])(value)
@@ -0,0 +1,182 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+
+import pytest
+
+from shell_craft.services import (AsyncCoalescingService, AsyncSingleFlight,
+                                  CoalescingService, SingleFlight)
+
+
+@dataclass
+class Settings:
+    model: str
+
+
+class SlowService:
+    def __init__(self, settings: Settings = Settings("test")) -> None:
+        self.settings = settings
+        self.calls = 0
+
+    def with_settings(self, settings: Settings) -> "SlowService":
+        service = SlowService(settings)
+        service.calls = self.calls
+        return service
+
+    def query(self, message: str) -> list[str]:
+        self.calls += 1
+        time.sleep(0.05)
+        return [f"{self.settings.model}:{message}"]
+
+
+class AsyncSlowService(SlowService):
+    async def query(self, message: str) -> list[str]:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return [f"{self.settings.model}:{message}"]
+
+def test_single_flight_shares_concurrent_calls():
+    # Arrange
+    group = SingleFlight()
+    service = SlowService()
+    results = []
+
+    def query() -> None:
+        results.append(group.do("key", lambda: service.query("ls")))
+
+    threads = [threading.Thread(target=query) for _ in range(5)]
+
+    # Act
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Assert
+    assert results == [["test:ls"]] * 5
+    assert service.calls == 1
+    assert group.stats.calls == 1
+    assert group.stats.saved == 4
+
+def test_single_flight_shares_exceptions():
+    # Arrange
+    group = SingleFlight()
+
+    def fail() -> None:
+        raise RuntimeError("failed")
+
+    # Act / Assert
+    with pytest.raises(RuntimeError):
+        group.do("key", fail)
+
+def test_single_flight_calls_again_after_completion():
+    # Arrange
+    group = SingleFlight()
+
+    # Act
+    group.do("key", lambda: 1)
+    group.do("key", lambda: 2)
+
+    # Assert
+    assert group.stats.calls == 2
+
+def test_coalescing_service_keys_on_settings():
+    # Arrange
+    service = CoalescingService(SlowService())
+    other = service.with_settings(Settings("other"))
+    results = []
+    threads = [
+        threading.Thread(target=lambda s=s: results.append(s.query("ls")))
+        for s in [service, other, service]
+    ]
+
+    # Act
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Assert
+    assert sorted(results) == [["other:ls"], ["test:ls"], ["test:ls"]]
+    assert service.stats.calls == 2
+    assert service.stats.saved == 1
+
+def test_coalescing_service_returns_copies():
+    # Arrange
+    service = CoalescingService(SlowService())
+
+    # Act
+    first = service.query("ls")
+    first.append("mutated")
+
+    # Assert
+    assert service.query("ls") == ["test:ls"]
+
+def test_coalescing_service_exposes_the_wrapped_service():
+    # Arrange
+    service = SlowService()
+    service.stream = lambda message: iter([message])
+
+    # Act
+    coalescing = CoalescingService(service)
+
+    # Assert
+    assert list(coalescing.stream("ls")) == ["ls"]
+    assert coalescing.calls == 0
+    with pytest.raises(AttributeError):
+        coalescing.missing
+
+def test_async_coalescing_service_shares_concurrent_calls():
+    # Arrange
+    inner = AsyncSlowService()
+    service = AsyncCoalescingService(inner)
+
+    async def query_many() -> list:
+        return await asyncio.gather(*[service.query("ls") for _ in range(5)])
+
+    # Act
+    results = asyncio.run(query_many())
+
+    # Assert
+    assert results == [["test:ls"]] * 5
+    assert inner.calls == 1
+    assert service.stats.saved == 4
+
+def test_async_single_flight_survives_cancelled_waiter():
+    # Arrange
+    group = AsyncSingleFlight()
+    service = AsyncSlowService()
+
+    async def scenario() -> list:
+        first = asyncio.ensure_future(group.do("key", lambda: service.query("ls")))
+        second = asyncio.ensure_future(group.do("key", lambda: service.query("ls")))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    # Act
+    result = asyncio.run(scenario())
+
+    # Assert
+    assert result == ["test:ls"]
@@ -0,0 +1,109 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import shutil
+import subprocess
+import sys
+import unittest.mock
+
+import pytest
+
+from shell_craft.cli.commands import _COMMANDS
+from shell_craft.cli.completion import SHELLS, completion_script, get_options
+from shell_craft.cli.main import main
+from shell_craft.prompts import REGISTRY
+
+
+def _prompts() -> dict[str, str]:
+    return {name: type(REGISTRY.get(name)).__name__ for name in REGISTRY.names}
+
+def test_get_options_resolves_restrictions():
+    # Act
+    options = {option.flags[-1]: option for option in get_options(_COMMANDS, _prompts())}
+
+    # Assert
+    assert options['--model'].choices[0] == 'gpt-4'
+    assert options['--prompt'].choices == tuple(REGISTRY.names)
+    assert options['--temperature'].flags == ('-t', '--temperature')
+    assert options['--temperature'].takes_value
+    assert not options['--timings'].takes_value
+    assert options['--no-stream'].flags == ('--stream', '--no-stream')
+    assert options['--timings'].prompts is None
+    assert options['--interactive'].prompts == ('bash', 'powershell')
+    assert options['--github'].prompts == ('bug_report', 'feature_request')
+    assert 'python' in options['--refactor'].prompts
+    assert 'bug_report' not in options['--refactor'].prompts
+
+@pytest.mark.parametrize('shell', SHELLS)
+def test_completion_script_lists_flags_and_prompts(shell):
+    # Act
+    script = completion_script(shell, _COMMANDS, REGISTRY)
+
+    # Assert
+    assert 'shell-craft' in script
+    assert 'gpt-3.5-turbo' in script
+    assert 'c_sharp' in script
+    assert 'interactive' in script
+
+def test_completion_script_rejects_unknown_shells():
+    with pytest.raises(ValueError):
+        completion_script('tcsh', _COMMANDS, REGISTRY)
+
+@pytest.mark.parametrize('words, expected', [
+    (['shell-craft', 'comp'], ['completion']),
+    (['shell-craft', 'completion', 'f'], ['fish']),
+    (['shell-craft', '--prompt', 'p'], ['powershell', 'python']),
+    (['shell-craft', '--model', 'gpt-4-32k-06'], ['gpt-4-32k-0613']),
+    (['shell-craft', '--inter'], ['--interactive']),
+    (['shell-craft', '--prompt', 'python', '--inter'], []),
+    (['shell-craft', '--prompt', 'PYTHON_PROMPT', '--first'], ['--first-valid']),
+    (['shell-craft', '--prompt', 'bug_report', '--gi'], ['--github']),
+    (['shell-craft', '--gith'], []),
+    (['shell-craft', '--count', ''], []),
+])
+def test_bash_completion_script(words, expected, tmp_path):
+    if not shutil.which('bash'):
+        pytest.skip('bash is not installed')
+
+    # Arrange
+    script = tmp_path / 'shell-craft.bash'
+    script.write_text(completion_script('bash', _COMMANDS, REGISTRY))
+    command = (
+        f'source {script}; COMP_WORDS=("$@"); COMP_CWORD=$(($# - 1)); '
+        '_shell_craft; printf "%s\\n" "${COMPREPLY[@]}"'
+    )
+
+    # Act
+    result = subprocess.run(
+        ['bash', '-c', command, 'bash', *words],
+        capture_output=True, text=True, check=True,
+    )
+
+    # Assert
+    assert result.stdout.split() == expected
+
+def test_main_prints_completion_script(capsys):
+    # Arrange
+    with unittest.mock.patch.object(sys, 'argv', ['shell-craft', 'completion', 'zsh']):
+        # Act
+        main()
+
+    # Assert
+    assert capsys.readouterr().out.startswith('#compdef shell-craft\n')
@@ -18,10 +18,12 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import os
 from unittest.mock import mock_open, patch
 
 import pytest
 from shell_craft.configuration import (AggregateConfiguration, Configuration,
+                                       ConfigurationSnapshot,
                                        JSONConfiguration)
 
 
@@ -75,3 +77,58 @@ def test_aggregate_from_files() -> None:
     }""")):
         with patch("pathlib.Path.exists", return_value=True):
             assert AggregateConfiguration.from_files(["file.json"]).get("key") == "json"
+
+def test_aggregate_from_files_uses_snapshot(tmp_path) -> None:
+    # Arrange
+    path = tmp_path / "config.json"
+    path.write_text('{"key": "json"}')
+    snapshot = ConfigurationSnapshot(tmp_path / "snapshots")
+    AggregateConfiguration.from_files([str(path)], snapshot=snapshot)
+
+    # Act
+    with patch.object(JSONConfiguration, "from_file") as from_file:
+        configuration = AggregateConfiguration.from_files([str(path)], snapshot=snapshot)
+
+    # Assert
+    from_file.assert_not_called()
+    assert configuration == {"key": "json"}
+
+def test_aggregate_from_files_rereads_changed_files(tmp_path) -> None:
+    # Arrange
+    path = tmp_path / "config.json"
+    path.write_text('{"key": "json"}')
+    snapshot = ConfigurationSnapshot(tmp_path / "snapshots")
+    AggregateConfiguration.from_files([str(path)], snapshot=snapshot)
+    path.write_text('{"key": "changed"}')
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1))
+
+    # Act
+    configuration = AggregateConfiguration.from_files([str(path)], snapshot=snapshot)
+
+    # Assert
+    assert configuration == {"key": "changed"}
+
+def test_aggregate_from_files_rereads_created_files(tmp_path) -> None:
+    # Arrange
+    path = tmp_path / "config.json"
+    snapshot = ConfigurationSnapshot(tmp_path / "snapshots")
+    AggregateConfiguration.from_files([str(path)], snapshot=snapshot)
+    path.write_text('{"key": "json"}')
+
+    # Act
+    configuration = AggregateConfiguration.from_files([str(path)], snapshot=snapshot)
+
+    # Assert
+    assert configuration == {"key": "json"}
+
+def test_snapshot_keeps_limited_entries(tmp_path) -> None:
+    # Arrange
+    snapshot = ConfigurationSnapshot(tmp_path, max_entries=2)
+
+    # Act
+    for index in range(4):
+        paths = [str(tmp_path / f"{index}.json")]
+        snapshot.set(paths, snapshot.signature(paths), {})
+
+    # Assert
+    assert len(list(tmp_path.glob("*.json"))) == 2
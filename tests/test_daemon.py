@@ -0,0 +1,118 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import json
+import sys
+import threading
+import unittest.mock
+
+import pytest
+
+from shell_craft.cli.daemon import DaemonServer, _local_only, forward
+
+
+def handler(arguments: list[str], cwd: str, environ: dict[str, str], shell: str) -> None:
+    if arguments == ["fail"]:
+        raise RuntimeError("failed")
+    if arguments == ["exit"]:
+        sys.exit(3)
+    if arguments[:1] == ["environ"]:
+        print(json.dumps([environ, shell]))
+        return
+
+    print(" ".join(arguments), end="")
+    print(f" tty={sys.stdout.isatty()}")
+    print("warning", file=sys.stderr)
+
+@pytest.fixture
+def daemon(tmp_path):
+    path = (tmp_path / "daemon.sock").as_posix()
+    server = DaemonServer(path, handler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    with unittest.mock.patch.object(sys, "stdout", server.stdout), \
+            unittest.mock.patch.object(sys, "stderr", server.stderr):
+        thread.start()
+        yield path
+        server.shutdown()
+        server.server_close()
+
+def test_forward_prints_daemon_output(daemon: str, capsys):
+    # Act
+    status = forward(["list", "files"], daemon)
+
+    # Assert
+    captured = capsys.readouterr()
+    assert status == 0
+    assert captured.out == "list files tty=False\n"
+    assert captured.err == "warning\n"
+
+def test_forward_returns_exit_status(daemon: str):
+    assert forward(["exit"], daemon) == 3
+
+def test_forward_reports_errors(daemon: str, capsys):
+    # Act
+    status = forward(["fail"], daemon)
+
+    # Assert
+    assert status == 1
+    assert "RuntimeError: failed" in capsys.readouterr().err
+
+def test_forward_without_daemon_returns_none(tmp_path):
+    assert forward(["list", "files"], (tmp_path / "missing.sock").as_posix()) is None
+
+def test_forward_keeps_local_only_arguments_local(daemon: str):
+    assert forward(["--interactive"], daemon) is None
+
+@pytest.mark.parametrize(
+    "arguments, shell",
+    [
+        (["environ"], "bash"),
+        (["environ", "--prompt", "python"], None),
+        (["environ", "--prompt=python"], None),
+        (["environ", "--prompt", "--count", "2"], "bash"),
+    ]
+)
+def test_forward_sends_only_what_the_daemon_reads(daemon: str, capsys, monkeypatch, arguments, shell):
+    # Arrange
+    monkeypatch.setenv("OPENAI_MODEL", "gpt-4")
+    monkeypatch.setenv("UNRELATED_SECRET", "secret")
+    monkeypatch.delenv("OPENAI_COUNT", raising=False)
+
+    # Act
+    with unittest.mock.patch(
+        "shell_craft.cli.daemon.get_calling_shell", return_value="bash"
+    ) as shell_mock:
+        forward(arguments, daemon, environ_keys=["OPENAI_MODEL", "OPENAI_COUNT"])
+
+    # Assert
+    assert json.loads(capsys.readouterr().out) == [{"OPENAI_MODEL": "gpt-4"}, shell]
+    assert shell_mock.called == (shell is not None)
+
+@pytest.mark.parametrize(
+    "arguments, expected",
+    [
+        (["--interactive"], True),
+        (["--batch", "requests.jsonl"], True),
+        (["--batch=requests.jsonl"], True),
+        (["list", "files"], False),
+    ]
+)
+def test_local_only(arguments: list[str], expected: bool):
+    assert _local_only(arguments) == expected
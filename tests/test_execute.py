@@ -0,0 +1,113 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import io
+
+import pytest
+
+from shell_craft.cli.execute import ShellSession, shell_arguments
+
+
+@pytest.mark.parametrize("shell, expected", [
+    ("bash", ["bash", "-c", "ls"]),
+    ("powershell", ["powershell", "-NoProfile", "-Command", "ls"]),
+])
+def test_shell_arguments(shell, expected):
+    assert shell_arguments(shell, "ls") == expected
+
+@pytest.fixture(params=[False, True], ids=["pipe", "pty"])
+def session(request):
+    if request.param:
+        pytest.importorskip("pty")
+
+    output = io.StringIO()
+    with ShellSession("bash", output, use_pty=request.param) as session:
+        yield session, output
+
+def test_session_keeps_state_between_commands(session):
+    # Arrange
+    shell, output = session
+
+    # Act
+    shell.run("cd / && export SHELLCRAFT_TEST=kept")
+    result = shell.run("pwd; echo $SHELLCRAFT_TEST")
+
+    # Assert
+    assert result.status == 0
+    assert result.output.split() == ["/", "kept"]
+
+def test_session_frames_output_without_trailing_newline(session):
+    # Arrange
+    shell, output = session
+
+    # Act
+    first = shell.run("printf partial; false")
+    second = shell.run("echo next")
+
+    # Assert
+    assert (first.output, first.status) == ("partial", 1)
+    assert second.output.strip() == "next"
+
+def test_session_restarts_after_exit_and_timeout(session):
+    # Arrange
+    shell, output = session
+
+    # Act
+    exited = shell.run("exit 4")
+    timed_out = shell.run("echo started; sleep 30", timeout=0.2)
+    result = shell.run("echo alive")
+
+    # Assert
+    assert exited.status == 4
+    assert timed_out.timed_out and timed_out.output.strip() == "started"
+    assert result.output.strip() == "alive"
+
+def test_session_commands_do_not_read_following_input(session):
+    # Arrange
+    shell, output = session
+
+    # Act
+    result = shell.run("cat; echo done")
+
+    # Assert
+    assert result.output.strip() == "done"
+
+def test_session_retains_only_the_end_of_the_output():
+    # Arrange
+    output = io.StringIO()
+
+    # Act
+    with ShellSession("bash", output, use_pty=False) as shell:
+        result = shell.run("seq 1 100000", limit=7)
+
+    # Assert
+    assert output.getvalue().endswith("99999\n100000\n")
+    assert result.output == "100000\n"
+    assert result.truncated
+
+def test_session_passes_command_unquoted(session):
+    # Arrange
+    shell, output = session
+
+    # Act
+    result = shell.run("""echo "a 'b'" '"c"'""")
+
+    # Assert
+    assert result.output.strip() == 'a \'b\' "c"'
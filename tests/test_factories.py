@@ -18,10 +18,13 @@
 # LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import unittest.mock
+
 import pytest
 
 import shell_craft.prompts as prompts
 from shell_craft.factories import PromptFactory
+from shell_craft.prompts import PromptRegistry
 
 PROMPTS = [
     prompt
@@ -39,3 +42,39 @@ def test_prompt_factory(prompt: str):
         prompt (str): The prompt to test.
     """    
     assert PromptFactory.get_prompt(prompt.removesuffix("_PROMPT")) == getattr(prompts, prompt)
+
+def test_prompt_factory_raises_for_unknown_prompt():
+    with pytest.raises(ValueError):
+        PromptFactory.get_prompt("unknown")
+
+def test_registry_creates_prompts_on_first_use():
+    # Arrange
+    registry = PromptRegistry()
+    factory = unittest.mock.Mock(return_value=prompts.Prompt(content="test"))
+    registry.register("TEST_PROMPT", factory)
+
+    # Act
+    first = registry.get("test")
+    second = registry.get("TEST")
+
+    # Assert
+    assert first is second
+    factory.assert_called_once()
+    assert "test" in registry
+    assert registry.names == ["test"]
+
+def test_language_prompts_are_generated_on_demand(monkeypatch):
+    # Arrange
+    import shell_craft.prompts.languages as languages
+    monkeypatch.delitem(vars(languages), "GO_PROMPT", raising=False)
+
+    with unittest.mock.patch.object(
+        languages, "_generate_prompt", wraps=languages._generate_prompt
+    ) as generate:
+        # Act
+        first = languages.GO_PROMPT
+        second = languages.GO_PROMPT
+
+    # Assert
+    assert first is second
+    generate.assert_called_once_with("GoLang", (".go",))
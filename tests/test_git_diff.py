@@ -0,0 +1,138 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import subprocess
+
+import pytest
+
+from shell_craft.cli.git_diff import (Region, addition_patch, changed_lines,
+                                     changed_regions, replacement_patch)
+
+ORIGINAL = "".join(f"line {number}\n" for number in range(1, 41))
+
+
+def _git(repository, *arguments):
+    return subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *arguments],
+        cwd=repository, check=True, capture_output=True, text=True,
+    ).stdout
+
+@pytest.fixture
+def repository(tmp_path):
+    _git(tmp_path, "init", "-q")
+    (tmp_path / "main.py").write_text(ORIGINAL)
+    (tmp_path / "notes.txt").write_text("notes\n")
+    _git(tmp_path, "add", ".")
+    _git(tmp_path, "commit", "-q", "-m", "initial")
+    return tmp_path
+
+def test_changed_lines_parses_added_changed_and_removed_lines():
+    # Arrange
+    diff = "\n".join([
+        "diff --git a/main.py b/main.py",
+        "--- a/main.py",
+        "+++ b/main.py",
+        "@@ -3 +3 @@",
+        "@@ -10,0 +11,2 @@",
+        "@@ -20,2 +21,0 @@",
+        "diff --git a/gone.py b/gone.py",
+        "--- a/gone.py",
+        "+++ /dev/null",
+        "@@ -1,2 +0,0 @@",
+    ])
+
+    # Act
+    ranges = changed_lines(diff)
+
+    # Assert
+    assert ranges == {"main.py": [(2, 3), (10, 12), (21, 21)]}
+
+def test_changed_regions_merges_nearby_changes(repository):
+    # Arrange
+    lines = ORIGINAL.splitlines(keepends=True)
+    lines[4] = "changed 5\n"
+    lines[8] = "changed 9\n"
+    lines[30] = "changed 31\n"
+    (repository / "main.py").write_text("".join(lines))
+    (repository / "notes.txt").write_text("changed\n")
+
+    # Act
+    regions = changed_regions("HEAD", context=2, extensions=[".py"], cwd=str(repository))
+
+    # Assert
+    assert [(region.start, region.end) for region in regions] == [(2, 11), (28, 33)]
+    assert regions[0].text.startswith("line 3\nline 4\nchanged 5\n")
+
+@pytest.mark.parametrize("setting", ["diff.mnemonicPrefix", "diff.noprefix"])
+def test_changed_regions_ignores_configured_prefixes(repository, setting):
+    # Arrange
+    _git(repository, "config", setting, "true")
+    (repository / "main.py").write_text(ORIGINAL.replace("line 5\n", "changed 5\n"))
+
+    # Act
+    regions = changed_regions("HEAD", context=0, cwd=str(repository))
+
+    # Assert
+    assert [(region.path, region.start, region.end) for region in regions] == [("main.py", 4, 5)]
+
+def test_changed_regions_reports_unknown_revisions(repository):
+    with pytest.raises(ValueError):
+        changed_regions("missing", cwd=str(repository))
+
+def test_replacement_patch_applies_to_the_file(repository):
+    # Arrange
+    lines = ORIGINAL.splitlines(keepends=True)
+    region = Region("main.py", 2, 5, "".join(lines[2:5]))
+    end = Region("main.py", 38, 40, "".join(lines[38:40]))
+
+    # Act
+    patch = replacement_patch(
+        "main.py", ORIGINAL, [(end, "last\n"), (region, "first\nsecond")]
+    )
+
+    # Assert
+    (repository / "change.patch").write_text(patch)
+    _git(repository, "apply", "change.patch")
+    assert (repository / "main.py").read_text().splitlines()[1:5] == [
+        "line 2", "first", "second", "line 6",
+    ]
+    assert (repository / "main.py").read_text().endswith("line 38\nlast\n")
+
+def test_addition_patch_creates_a_file(repository):
+    # Act
+    patch = addition_patch("main.test.py", "def test():\n    pass")
+
+    # Assert
+    (repository / "add.patch").write_text(patch)
+    _git(repository, "apply", "add.patch")
+    assert (repository / "main.test.py").read_text() == "def test():\n    pass\n"
+
+def test_addition_patch_replaces_an_existing_file(repository):
+    # Arrange
+    (repository / "main.test.py").write_text("def test_old():\n    pass\n")
+
+    # Act
+    patch = addition_patch("main.test.py", "def test():\n    pass", "def test_old():\n    pass\n")
+
+    # Assert
+    assert patch.startswith("--- a/main.test.py\n+++ b/main.test.py\n")
+    (repository / "replace.patch").write_text(patch)
+    _git(repository, "apply", "replace.patch")
+    assert (repository / "main.test.py").read_text() == "def test():\n    pass\n"
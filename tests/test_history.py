@@ -0,0 +1,88 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import pytest
+
+from shell_craft.history import History
+
+
+@pytest.fixture
+def history():
+    history = History(':memory:')
+    yield history
+    history.close()
+
+def test_history_recalls_entries(history: History):
+    # Arrange
+    entry_id = history.add('bash', 'list files', 'ls -la')
+
+    # Act
+    history.record_execution(entry_id, 0, 'total 0\n')
+    entry = history.get(entry_id)
+
+    # Assert
+    assert (entry.prompt, entry.request, entry.response) == ('bash', 'list files', 'ls -la')
+    assert (entry.status, entry.output) == (0, 'total 0\n')
+    assert history.get(entry_id + 1) is None
+
+@pytest.mark.parametrize('indexed', [True, False])
+def test_history_search_matches_every_term(history: History, indexed: bool):
+    # Arrange
+    history.add('bash', 'list files', 'ls -la')
+    history.add('bash', 'count lines of "notes"', 'wc -l notes.txt')
+    history.add('bash', 'count files', 'ls | wc -l')
+    history._indexed = history._indexed and indexed
+
+    # Act
+    files = history.search('count files')
+    quoted = history.search('"notes" -l')
+    missing = history.search('docker')
+
+    # Assert
+    assert [entry.response for entry in files] == ['ls | wc -l']
+    assert [entry.response for entry in quoted] == ['wc -l notes.txt']
+    assert missing == []
+    assert history.search('   ') == []
+
+def test_history_search_limits_results(history: History):
+    # Arrange
+    for index in range(20):
+        history.add('bash', f'request {index}', 'echo')
+
+    # Act
+    entries = history.search('request', limit=5)
+
+    # Assert
+    assert len(entries) == 5
+
+def test_history_persists_between_sessions(tmp_path):
+    # Arrange
+    path = (tmp_path / 'history' / 'history.db').as_posix()
+    history = History(path)
+    entry_id = history.add('powershell', 'list files', 'Get-ChildItem')
+    history.close()
+
+    # Act
+    history = History(path)
+    entries = history.search('files')
+    history.close()
+
+    # Assert
+    assert [entry.id for entry in entries] == [entry_id]
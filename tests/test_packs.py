@@ -0,0 +1,151 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import json
+import os
+import unittest.mock
+
+import pytest
+
+from shell_craft.prompts import PromptRegistry
+from shell_craft.prompts.languages import LanguagePrompt
+from shell_craft.prompts.packs import PromptPacks, validate_spec
+from shell_craft.prompts.prompt import Prompt
+from shell_craft.prompts.templates import BUG_REPORT_PROMPT
+
+
+@pytest.fixture
+def packs_path(tmp_path):
+    path = tmp_path / "prompts"
+    path.mkdir()
+    (path / "ops.json").write_text(json.dumps({
+        "terraform": {"language": "Terraform", "extensions": [".tf"]},
+        "kubectl": {
+            "content": "You are kubectl.",
+            "examples": [
+                {"role": "user", "content": "list pods"},
+                {"role": "assistant", "content": "kubectl get pods"},
+            ],
+        },
+        "sql": {"content": "You are SQL.", "testing": {"content": "Test SQL."}},
+    }))
+    return path
+
+def packs(tmp_path, path, group=None) -> PromptPacks:
+    return PromptPacks(path, tmp_path / "index.json", group)
+
+def test_install_registers_prompts_of_pack_files(tmp_path, packs_path):
+    # Arrange
+    registry = PromptRegistry()
+
+    # Act
+    names = packs(tmp_path, packs_path).install(registry)
+
+    # Assert
+    assert names == ["kubectl", "sql", "terraform"]
+    assert isinstance(registry.get("terraform"), LanguagePrompt)
+    assert registry.get("terraform").extensions == (".tf",)
+    assert registry.get("kubectl").messages[-1]["content"] == "kubectl get pods"
+    assert type(registry.get("kubectl")) is Prompt
+    assert registry.get("sql").testing == Prompt(content="Test SQL.")
+
+def test_unchanged_packs_are_read_from_index(tmp_path, packs_path):
+    # Arrange
+    packs(tmp_path, packs_path).sources()
+
+    with unittest.mock.patch.object(PromptPacks, "_compile") as compile_mock:
+        # Act
+        sources = packs(tmp_path, packs_path).sources()
+
+    # Assert
+    compile_mock.assert_not_called()
+    assert sorted(sources) == ["kubectl", "sql", "terraform"]
+
+def test_changed_packs_are_compiled_again(tmp_path, packs_path):
+    # Arrange
+    packs(tmp_path, packs_path).sources()
+    pack = packs_path / "ops.json"
+    pack.write_text(json.dumps({"helm": {"language": "Helm"}}))
+    os.utime(pack, ns=(0, pack.stat().st_mtime_ns + 1))
+
+    # Act
+    sources = packs(tmp_path, packs_path).sources()
+
+    # Assert
+    assert sorted(sources) == ["helm"]
+
+def test_invalid_packs_are_reported_once(tmp_path, packs_path, capsys):
+    # Arrange
+    (packs_path / "broken.json").write_text(json.dumps({"x": {"examples": []}}))
+
+    # Act
+    first = packs(tmp_path, packs_path).sources()
+    second = packs(tmp_path, packs_path).sources()
+
+    # Assert
+    assert sorted(first) == sorted(second) == ["kubectl", "sql", "terraform"]
+    assert capsys.readouterr().err.count("broken.json") == 1
+
+def test_install_keeps_builtin_prompts_and_removes_deleted_packs(tmp_path, packs_path):
+    # Arrange
+    registry = PromptRegistry()
+    registry.register("terraform", BUG_REPORT_PROMPT)
+    prompt_packs = packs(tmp_path, packs_path)
+    prompt_packs.install(registry)
+
+    # Act
+    (packs_path / "ops.json").unlink()
+    prompt_packs.install(registry)
+
+    # Assert
+    assert registry.get("terraform") is BUG_REPORT_PROMPT
+    assert registry.names == ["terraform"]
+
+def test_entry_points_are_indexed_until_import_path_changes(tmp_path):
+    # Arrange
+    registry = PromptRegistry()
+    references = {"bugs": "shell_craft.prompts.templates:BUG_REPORT_PROMPT"}
+
+    with unittest.mock.patch(
+        "shell_craft.prompts.packs._entry_points", return_value=references
+    ) as entry_points_mock:
+        # Act
+        packs(tmp_path, tmp_path / "missing", "group").install(registry)
+        packs(tmp_path, tmp_path / "missing", "group").install(registry)
+        with unittest.mock.patch(
+            "shell_craft.prompts.packs._path_mtimes", return_value={}
+        ):
+            packs(tmp_path, tmp_path / "missing", "group").install(registry)
+
+    # Assert
+    assert registry.get("bugs") is BUG_REPORT_PROMPT
+    assert entry_points_mock.call_count == 2
+
+@pytest.mark.parametrize("spec", [
+    [],
+    {"content": 1},
+    {"content": "x", "examples": [{"role": "robot", "content": "x"}]},
+    {"content": "x", "refactoring": {}},
+    {"language": ""},
+    {"language": "Terraform", "extensions": ["tf"]},
+])
+def test_validate_spec_rejects_invalid_prompts(spec):
+    with pytest.raises(ValueError):
+        validate_spec(spec, "test")
@@ -0,0 +1,95 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import pytest
+
+from shell_craft.patch import (PatchError, apply_patch, parse_hunks,
+                               unified_diff)
+
+ORIGINAL = "".join(f"line {number}\n" for number in range(1, 31))
+
+
+@pytest.mark.parametrize("changed", [
+    ORIGINAL.replace("line 5\n", "line five\n").replace("line 20\n", ""),
+    ORIGINAL + "line 31",
+    ORIGINAL[:-1],
+    "line 0\n" + ORIGINAL,
+])
+def test_apply_patch_round_trips_unified_diffs(changed):
+    # Act
+    patched = apply_patch(ORIGINAL, unified_diff(ORIGINAL, changed, "a/x", "b/x"))
+
+    # Assert
+    assert patched == changed
+
+def test_apply_patch_places_hunks_with_wrong_line_numbers():
+    # Arrange
+    patch = "\n".join([
+        "```diff",
+        "--- a/code.py",
+        "+++ b/code.py",
+        "@@ -1,3 +1,3 @@",
+        " line 11",
+        "-line 12",
+        "+line twelve",
+        "",
+        "@@ -2,2 +2,2 @@",
+        " line 25   ",
+        "-line 26",
+        "+line twenty six",
+        "```",
+    ])
+
+    # Act
+    patched = apply_patch(ORIGINAL, patch)
+
+    # Assert
+    assert patched == ORIGINAL.replace("line 12\n", "line twelve\n").replace(
+        "line 26\n", "line twenty six\n"
+    )
+
+def test_apply_patch_prefers_the_match_nearest_the_claimed_line():
+    # Arrange
+    original = "x\nreturn\n" * 3
+
+    # Act
+    patched = apply_patch(original, "@@ -5,2 +5,2 @@\n x\n-return\n+return 1\n")
+
+    # Assert
+    assert patched == "x\nreturn\nx\nreturn\nx\nreturn 1\n"
+
+@pytest.mark.parametrize("patch", [
+    "",
+    "Here is the refactored code:\nprint()",
+    "@@ -1,1 +1,1 @@\n-line 99\n+line 1\n",
+    "@@ -1,1 +1,1 @@\n-line 1\nplain text\n",
+])
+def test_apply_patch_rejects_patches_that_do_not_apply(patch):
+    with pytest.raises(PatchError):
+        apply_patch(ORIGINAL, patch)
+
+def test_parse_hunks_reads_missing_newline_markers():
+    # Act
+    hunks = parse_hunks("@@ -1 +1 @@\n-a\n\\ No newline at end of file\n+b\n")
+
+    # Assert
+    assert (hunks[0].old, hunks[0].new) == (["a"], ["b"])
+    assert not hunks[0].old_newline
+    assert hunks[0].new_newline
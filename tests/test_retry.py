@@ -0,0 +1,155 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import unittest.mock
+from typing import Optional
+
+import openai
+import pytest
+
+from shell_craft.services import OpenAIService, OpenAISettings
+from shell_craft.services.retry import RateLimiter, RetryPolicy, parse_duration
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def settings() -> OpenAISettings:
+    return OpenAISettings(
+        api_key="test",
+        model="test",
+        count=1,
+        temperature=1.0,
+        messages=[],
+        max_retries=2,
+    )
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2", 2.0),
+        ("0.5", 0.5),
+        ("20ms", 0.02),
+        ("1.5s", 1.5),
+        ("6m0s", 360.0),
+        ("1h2m", 3720.0),
+    ]
+)
+def test_parse_duration(value: str, expected: float):
+    assert parse_duration(value) == pytest.approx(expected)
+
+@pytest.mark.parametrize("value", ["soon", "1x", "", None])
+def test_parse_duration_invalid(value: Optional[str]):
+    assert parse_duration(value) is None
+
+def test_retry_policy_prefers_server_delay():
+    assert RetryPolicy().delay(5, retry_after=3.0) == 3.0
+
+def test_retry_policy_caps_backoff():
+    assert 0 <= RetryPolicy(base_delay=1, max_delay=4).delay(10) <= 4
+
+def test_rate_limiter_spaces_requests():
+    # Arrange
+    limiter = RateLimiter(requests_per_minute=60, clock=Clock())
+
+    # Act
+    delays = [limiter.reserve() for _ in range(62)]
+
+    # Assert
+    assert delays[:60] == [0.0] * 60
+    assert delays[60:] == pytest.approx([1.0, 2.0])
+
+def test_rate_limiter_limits_tokens():
+    # Arrange
+    clock = Clock()
+    limiter = RateLimiter(tokens_per_minute=600, clock=clock)
+    limiter.reserve(600)
+
+    # Act
+    delay = limiter.reserve(100)
+    clock.now = 10
+    refilled = limiter.reserve(0)
+
+    # Assert
+    assert delay == pytest.approx(10.0)
+    assert refilled == 0.0
+
+def test_rate_limiter_pause():
+    # Arrange
+    limiter = RateLimiter(clock=Clock())
+
+    # Act
+    limiter.pause(5)
+
+    # Assert
+    assert limiter.reserve() == 5
+
+def test_service_retries_rate_limited_requests(settings: OpenAISettings):
+    # Arrange
+    service = OpenAIService(settings)
+    error = openai.error.RateLimitError("slow down", headers={"retry-after": "0"})
+    response = {"choices": [{"message": {"content": "ls"}}]}
+    with unittest.mock.patch("openai.ChatCompletion.create") as create:
+        create.side_effect = [error, error, response]
+
+        # Act
+        results = service.query("list files")
+
+    # Assert
+    assert results == ["ls"]
+    assert create.call_count == 3
+
+def test_service_gives_up_after_max_retries(settings: OpenAISettings):
+    # Arrange
+    service = OpenAIService(settings)
+    error = openai.error.ServiceUnavailableError("down", headers={"retry-after": "0"})
+    with unittest.mock.patch("openai.ChatCompletion.create") as create:
+        create.side_effect = error
+
+        # Act / Assert
+        with pytest.raises(openai.error.ServiceUnavailableError):
+            service.query("list files")
+
+    assert create.call_count == 3
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        openai.error.AuthenticationError("bad key"),
+        openai.error.InvalidRequestError("bad request", param=None),
+        openai.error.RateLimitError("no quota", code="insufficient_quota"),
+    ]
+)
+def test_service_does_not_retry_client_errors(settings: OpenAISettings, error: Exception):
+    # Arrange
+    service = OpenAIService(settings)
+    with unittest.mock.patch("openai.ChatCompletion.create") as create:
+        create.side_effect = error
+
+        # Act / Assert
+        with pytest.raises(type(error)):
+            service.query("list files")
+
+    create.assert_called_once()
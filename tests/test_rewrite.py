@@ -0,0 +1,67 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import asyncio
+
+from shell_craft.chunking import Chunks
+from shell_craft.cli.rewrite import Rewriter
+
+
+class _Service:
+    def __init__(self, responses):
+        self.responses = responses
+        self.messages = []
+
+    async def query_all(self, messages):
+        self.messages += messages
+        return [[self.responses[message]] for message in messages]
+
+
+def test_rewrite_applies_diffs_and_falls_back_to_whole_chunks():
+    # Arrange
+    chunks = Chunks(["a = 1\n\n", "b = 2\n\n", "c = 3\n"])
+    messages = chunks.messages()
+    diff = _Service({
+        messages[0]: "@@ -1 +1 @@\n-a = 1\n+a = 10\n",
+        messages[1]: "@@ -1 +1 @@\n-b = 20\n+b = 2\n",
+        messages[2]: "",
+    })
+    whole = _Service({messages[1]: "b = 200"})
+    rewriter = Rewriter(whole, diff)
+
+    # Act
+    result = asyncio.run(rewriter.rewrite(chunks))
+
+    # Assert
+    assert result == "a = 10\n\nb = 200\n\nc = 3\n"
+    assert whole.messages == [messages[1]]
+    assert rewriter.fallbacks == 1
+
+def test_generate_joins_responses():
+    # Arrange
+    chunks = Chunks(["a\n", "b\n"], "")
+    messages = chunks.messages()
+    rewriter = Rewriter(_Service({messages[0]: "test a\n", messages[1]: "test b"}))
+
+    # Act
+    result = asyncio.run(rewriter.generate(chunks))
+
+    # Assert
+    assert result == "test a\ntest b"
@@ -0,0 +1,285 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import asyncio
+import json
+import os
+import time
+import unittest.mock
+
+import pytest
+
+from shell_craft.services import (AsyncOpenAIService, OpenAIService,
+                                  OpenAISettings, ResponseCache, StreamDelta)
+from shell_craft.tracing import Tracer
+
+
+@pytest.fixture
+def settings() -> OpenAISettings:
+    return OpenAISettings(
+        api_key="test",
+        model="test",
+        count=1,
+        temperature=1.0,
+        messages=[{"role": "user", "content": "test"}],
+    )
+
+@pytest.fixture
+def cache(tmp_path) -> ResponseCache:
+    return ResponseCache(path=tmp_path, ttl=60, max_entries=2)
+
+def completion(*contents: str) -> dict:
+    return {
+        "choices": [
+            {"message": {"content": content}}
+            for content in contents
+        ]
+    }
+
+def run(service: AsyncOpenAIService, awaitable):
+    async def _run():
+        try:
+            return await awaitable
+        finally:
+            await service.aclose()
+
+    return asyncio.run(_run())
+
+def test_cache_returns_stored_value(cache: ResponseCache):
+    # Arrange
+    key = ResponseCache.key({"message": "test"})
+
+    # Act
+    cache.set(key, ["ls"])
+
+    # Assert
+    assert cache.get(key) == ["ls"]
+    assert cache.stats.hits == 1
+
+def test_cache_misses_unknown_key(cache: ResponseCache):
+    assert cache.get(ResponseCache.key({"message": "test"})) is None
+    assert cache.stats.misses == 1
+
+def test_cache_key_ignores_dictionary_order():
+    assert ResponseCache.key({"a": 1, "b": 2}) == ResponseCache.key({"b": 2, "a": 1})
+
+def test_cache_expires_entries(cache: ResponseCache, tmp_path):
+    # Arrange
+    key = ResponseCache.key({"message": "test"})
+    cache.set(key, ["ls"])
+    entry = tmp_path / f"{key}.json"
+    entry.write_text(json.dumps({"created": time.time() - 120, "value": ["ls"]}))
+
+    # Act
+    result = cache.get(key)
+
+    # Assert
+    assert result is None
+    assert not entry.exists()
+
+def test_cache_evicts_least_recently_used(cache: ResponseCache, tmp_path):
+    # Arrange
+    keys = [ResponseCache.key({"message": str(index)}) for index in range(3)]
+    for index, key in enumerate(keys[:2]):
+        cache.set(key, [str(index)])
+        os.utime(tmp_path / f"{key}.json", (index, time.time() - 10 + index))
+
+    # Act
+    cache.set(keys[2], ["2"])
+
+    # Assert
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[1]) == ["1"]
+    assert cache.stats.evictions == 1
+
+def test_cache_disabled_with_zero_ttl(tmp_path):
+    # Arrange
+    cache = ResponseCache(path=tmp_path, ttl=0)
+    key = ResponseCache.key({"message": "test"})
+
+    # Act
+    cache.set(key, ["ls"])
+
+    # Assert
+    assert cache.get(key) is None
+
+def test_service_answers_repeated_query_from_cache(settings: OpenAISettings, cache: ResponseCache):
+    # Arrange
+    service = OpenAIService(settings, cache=cache)
+    with unittest.mock.patch("openai.ChatCompletion.create") as create:
+        create.return_value = completion("ls")
+
+        # Act
+        first = service.query("list files")
+        second = service.query("list files")
+
+    # Assert
+    assert first == second == ["ls"]
+    create.assert_called_once()
+
+def test_service_records_token_usage_on_span(settings: OpenAISettings):
+    # Arrange
+    service = OpenAIService(settings)
+    tracer = Tracer()
+    with unittest.mock.patch("openai.ChatCompletion.create") as create:
+        create.return_value = completion("ls") | {
+            "usage": {"prompt_tokens": 12, "completion_tokens": 3, "total_tokens": 15}
+        }
+
+        # Act
+        with tracer.activate():
+            service.query("list files")
+
+    # Assert
+    query, request = tracer.spans
+    assert (query.name, request.name) == ("openai.query", "openai.request")
+    assert request.parent == query.id
+    assert query.attributes == {
+        "model": "test",
+        "prompt_tokens": 12,
+        "completion_tokens": 3,
+    }
+
+def test_service_without_cache_always_queries(settings: OpenAISettings):
+    # Arrange
+    service = OpenAIService(settings)
+    with unittest.mock.patch("openai.ChatCompletion.create") as create:
+        create.return_value = completion("ls")
+
+        # Act
+        service.query("list files")
+        service.query("list files")
+
+    # Assert
+    assert create.call_count == 2
+
+def test_service_streams_deltas(settings: OpenAISettings, cache: ResponseCache):
+    # Arrange
+    service = OpenAIService(settings, cache=cache)
+    chunks = [
+        {"choices": [{"index": 0, "delta": {"role": "assistant"}}]},
+        {"choices": [{"index": 0, "delta": {"content": "ls"}}]},
+        {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]},
+    ]
+    with unittest.mock.patch("openai.ChatCompletion.create") as create:
+        create.return_value = iter(chunks)
+
+        # Act
+        deltas = list(service.stream("list files"))
+        cached = list(service.stream("list files"))
+
+    # Assert
+    assert deltas == [StreamDelta(0, "ls"), StreamDelta(0, "", finished=True)]
+    assert cached == [StreamDelta(0, "ls", finished=True)]
+    create.assert_called_once()
+
+def test_async_service_answers_repeated_query_from_cache(settings: OpenAISettings, cache: ResponseCache):
+    # Arrange
+    service = AsyncOpenAIService(settings, cache=cache)
+    with unittest.mock.patch("openai.ChatCompletion.acreate") as acreate:
+        acreate.return_value = completion("ls")
+
+        # Act
+        results = run(service, service.query_all(["list files", "list files"]))
+        cached = run(service, service.query("list files"))
+
+    # Assert
+    assert results == [["ls"], ["ls"]]
+    assert cached == ["ls"]
+    assert cache.stats.hits >= 1
+
+def test_async_service_limits_concurrency(settings: OpenAISettings):
+    # Arrange
+    service = AsyncOpenAIService(settings, concurrency=2)
+    running, peak = 0, 0
+
+    async def acreate(**kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return completion(kwargs["messages"][-1]["content"])
+
+    with unittest.mock.patch("openai.ChatCompletion.acreate", acreate):
+        # Act
+        results = run(service, service.query_all([str(index) for index in range(6)]))
+
+    # Assert
+    assert results == [[str(index)] for index in range(6)]
+    assert peak == 2
+
+def test_async_service_cancels_remaining_queries_on_failure(settings: OpenAISettings):
+    # Arrange
+    service = AsyncOpenAIService(settings)
+    cancelled = []
+
+    async def acreate(**kwargs):
+        if kwargs["messages"][-1]["content"] == "fail":
+            raise RuntimeError("fail")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with unittest.mock.patch("openai.ChatCompletion.acreate", acreate):
+        # Act / Assert
+        with pytest.raises(RuntimeError):
+            run(service, service.query_all(["slow", "fail", "slow"]))
+
+    assert len(cancelled) == 2
+
+def test_services_with_settings_share_connection_pool(settings: OpenAISettings):
+    # Arrange
+    service = OpenAIService(settings)
+
+    # Act
+    other = service.with_settings(settings)
+
+    # Assert
+    assert other._session is service._session
+
+def test_service_sends_requests_through_pooled_session(settings: OpenAISettings):
+    # Arrange
+    service = OpenAIService(settings)
+    sessions = []
+
+    def create(**kwargs):
+        from openai import api_requestor
+        sessions.append(api_requestor._thread_context.session)
+        return completion("ls")
+
+    with unittest.mock.patch("openai.ChatCompletion.create", create):
+        # Act
+        service.query("list files")
+
+    # Assert
+    assert sessions == [service._session]
+
+def test_service_warm_up_opens_connection(settings: OpenAISettings):
+    # Arrange
+    service = OpenAIService(settings)
+    with unittest.mock.patch.object(service._session, "head") as head:
+        # Act
+        service.warm_up().join()
+
+    # Assert
+    head.assert_called_once()
@@ -0,0 +1,61 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ['aiohttp', 'openai', 'psutil', 'requests']
+IMPORT_BUDGET = 0.25
+
+
+def _import_times(*arguments: str) -> dict[str, int]:
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'shell_craft', *arguments],
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+        env=os.environ | {'SHELLCRAFT_NO_DAEMON': '1'},
+    )
+    return {
+        match.group(2).strip(): int(match.group(1))
+        for match in re.finditer(
+            r'^import time:\s+\d+ \|\s+(\d+) \|(.+)$',
+            process.stderr,
+            re.MULTILINE,
+        )
+    }
+
+
+@pytest.fixture(scope='module')
+def help_import_times() -> dict[str, int]:
+    return _import_times('--help')
+
+
+@pytest.mark.parametrize('module', HEAVY_MODULES)
+def test_help_does_not_import_heavy_modules(help_import_times, module):
+    assert module not in help_import_times
+
+
+def test_help_import_time_budget(help_import_times):
+    assert help_import_times['shell_craft.cli'] < IMPORT_BUDGET * 1_000_000
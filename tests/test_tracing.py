@@ -0,0 +1,109 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import io
+import itertools
+import json
+
+from shell_craft.tracing import Tracer, annotate, span
+
+
+def tracer() -> Tracer:
+    return Tracer(clock=itertools.count().__next__)
+
+def test_spans_are_not_recorded_without_tracer():
+    # Act
+    with span("phase") as current:
+        annotate(tokens=1)
+
+    # Assert
+    assert current.id == -1
+
+def test_spans_record_nesting_and_duration():
+    # Arrange
+    traced = tracer()
+
+    # Act
+    with traced.activate():
+        with span("outer"):
+            with span("inner", model="test"):
+                annotate(tokens=3)
+        with span("after"):
+            pass
+
+    # Assert
+    outer, inner, after = traced.spans
+    assert (outer.parent, inner.parent, after.parent) == (None, outer.id, None)
+    assert (outer.depth, inner.depth) == (0, 1)
+    assert inner.attributes == {"model": "test", "tokens": 3}
+    assert outer.duration == 3
+    assert inner.duration == 1
+
+def test_span_ends_when_phase_raises():
+    # Arrange
+    traced = tracer()
+
+    # Act
+    with traced.activate():
+        try:
+            with span("failing"):
+                raise ValueError()
+        except ValueError:
+            pass
+
+    # Assert
+    assert traced.spans[0].end is not None
+
+def test_write_json_writes_a_line_per_span():
+    # Arrange
+    traced = tracer()
+    with traced.activate():
+        with span("outer"):
+            with span("inner", cached=True):
+                pass
+    file = io.StringIO()
+
+    # Act
+    traced.write_json(file)
+
+    # Assert
+    lines = [json.loads(line) for line in file.getvalue().splitlines()]
+    assert [line["name"] for line in lines] == ["outer", "inner"]
+    assert lines[1]["parent"] == lines[0]["id"]
+    assert lines[1]["cached"] is True
+    assert {line["trace"] for line in lines} == {traced.id}
+
+def test_write_table_indents_children():
+    # Arrange
+    traced = tracer()
+    with traced.activate():
+        with span("outer"):
+            with span("inner", tokens=2):
+                pass
+    file = io.StringIO()
+
+    # Act
+    traced.write_table(file)
+
+    # Assert
+    header, outer, inner = file.getvalue().splitlines()
+    assert outer.startswith("outer")
+    assert inner.startswith("  inner")
+    assert inner.endswith("tokens=2")
@@ -0,0 +1,184 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import asyncio
+import io
+import json
+import pathlib
+
+import pytest
+
+from shell_craft.cli.rewrite import Rewriter
+from shell_craft.cli.tree import (MANIFEST_NAME, find_files, result_path,
+                                  run_tree)
+from shell_craft.services import AsyncOpenAIService, OpenAISettings
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "src"
+    (root / "package").mkdir(parents=True)
+    (root / ".git").mkdir()
+    (root / "main.py").write_text("def main():\n    pass\n")
+    (root / "package" / "util.py").write_text("def util():\n    pass\n")
+    (root / "package" / "notes.txt").write_text("notes\n")
+    (root / ".git" / "hook.py").write_text("pass\n")
+    return root
+
+@pytest.fixture
+def queries(monkeypatch):
+    messages = []
+
+    async def query(self, message):
+        messages.append(message)
+        return [f"# documented\n{message}"]
+
+    monkeypatch.setattr(AsyncOpenAIService, "query", query)
+    return messages
+
+def _run(root, fingerprint="a", output_dir=None, in_place=False, sub_prompt="document"):
+    service = AsyncOpenAIService(
+        OpenAISettings(api_key="test", model="test", count=1, temperature=1, messages=[])
+    )
+    return asyncio.run(run_tree(
+        root,
+        Rewriter(service),
+        [".py"],
+        sub_prompt,
+        fingerprint,
+        output_dir=output_dir,
+        in_place=in_place,
+        output=io.StringIO(),
+    ))
+
+def test_find_files_skips_hidden_and_generated_files(tree):
+    # Arrange
+    (tree / "main.documented.py").write_text("")
+
+    # Act
+    files = list(find_files(tree, [".py"], "document"))
+
+    # Assert
+    assert [file.relative for file in files] == ["main.py", "package/util.py"]
+    assert files[0].output == tree / "main.documented.py"
+
+@pytest.mark.parametrize("source, expected", [
+    ("pkg/main.py", "pkg/test_main.py"),
+    ("main.go", "main_test.go"),
+    ("Main.java", "MainTest.java"),
+    ("Program.cs", "ProgramTests.cs"),
+    ("main.js", "main.test.js"),
+])
+def test_result_path_names_tests_for_their_runner(source, expected):
+    # Act
+    path = result_path(pathlib.PurePosixPath(source), "test")
+
+    # Assert
+    assert path.as_posix() == expected
+
+def test_find_files_skips_tests_when_generating_tests(tree, tmp_path):
+    # Arrange
+    (tree / "test_main.py").write_text("")
+
+    # Act
+    files = list(find_files(tree, [".py"], "test"))
+    mirrored = list(find_files(tree, [".py"], "test", tmp_path / "out"))
+
+    # Assert
+    assert [file.relative for file in files] == ["main.py", "package/util.py"]
+    assert files[0].output == tree / "test_main.py"
+    assert mirrored[1].output == tmp_path / "out" / "package" / "test_util.py"
+
+def test_run_tree_writes_results_next_to_sources(tree, queries):
+    # Act
+    summary = _run(tree)
+
+    # Assert
+    assert (summary.processed, summary.unchanged, summary.failed) == (2, 0, 0)
+    assert (tree / "package" / "util.documented.py").read_text() == (
+        "# documented\ndef util():\n    pass\n"
+    )
+    manifest = json.loads((tree / MANIFEST_NAME).read_text())
+    assert sorted(manifest["files"]["document"]) == ["main.py", "package/util.py"]
+
+def test_run_tree_only_processes_changed_files(tree, queries):
+    # Arrange
+    _run(tree)
+    (tree / "main.py").write_text("def main():\n    return 1\n")
+    queries.clear()
+
+    # Act
+    summary = _run(tree)
+
+    # Assert
+    assert (summary.processed, summary.unchanged) == (1, 1)
+    assert queries == ["def main():\n    return 1\n"]
+
+def test_run_tree_processes_everything_when_settings_change(tree, queries):
+    # Arrange
+    _run(tree)
+
+    # Act
+    summary = _run(tree, fingerprint="b")
+
+    # Assert
+    assert (summary.processed, summary.unchanged) == (2, 0)
+
+def test_run_tree_keeps_the_manifest_of_other_sub_prompts(tree, queries):
+    # Arrange
+    _run(tree)
+    _run(tree, sub_prompt="test")
+    queries.clear()
+
+    # Act
+    summary = _run(tree)
+
+    # Assert
+    assert summary.unchanged == 2
+    assert "def main():\n    pass\n" not in queries
+    manifest = json.loads((tree / MANIFEST_NAME).read_text())
+    assert sorted(manifest["files"]) == ["document", "test"]
+    assert (tree / "package" / "test_util.py").exists()
+
+def test_run_tree_mirrors_tree_into_output_dir(tree, tmp_path, queries):
+    # Arrange
+    output_dir = tmp_path / "out"
+    _run(tree, output_dir=output_dir)
+    (tree / "package" / "util.py").unlink()
+
+    # Act
+    summary = _run(tree, output_dir=output_dir)
+
+    # Assert
+    assert (output_dir / "main.py").exists()
+    assert summary.unchanged == 1
+    manifest = json.loads((output_dir / MANIFEST_NAME).read_text())
+    assert list(manifest["files"]["document"]) == ["main.py"]
+    assert not (tree / MANIFEST_NAME).exists()
+
+def test_run_tree_in_place_records_the_written_content(tree, queries):
+    # Act
+    first = _run(tree, in_place=True)
+    second = _run(tree, in_place=True)
+
+    # Assert
+    assert (first.processed, second.unchanged) == (2, 2)
+    assert (tree / "main.py").read_text() == "# documented\ndef main():\n    pass\n"
+    assert not (tree / "main.documented.py").exists()
@@ -0,0 +1,83 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import shutil
+
+import pytest
+
+from shell_craft.validation import (_run, get_validator, strip_fence,
+                                    validate, validate_all)
+
+
+@pytest.mark.parametrize('prompt, valid, invalid, checker', [
+    ('bash', 'ls | wc -l', 'if then fi (', 'bash'),
+    ('PYTHON_PROMPT', 'print(1)', 'def (', None),
+    ('go', 'package main\n\nfunc main() {}\n', 'package main\nfunc main( {', 'gofmt'),
+    ('javascript', 'let x = 1;', 'let = ;', 'node'),
+])
+def test_validate_checks_syntax(prompt, valid, invalid, checker):
+    if checker and not shutil.which(checker):
+        pytest.skip(f'{checker} is not installed')
+
+    # Act
+    accepted = validate(prompt, valid)
+    rejected = validate(prompt, invalid)
+
+    # Assert
+    assert accepted is None
+    assert rejected
+
+def test_validate_accepts_languages_without_a_checker():
+    # Act
+    error = validate('java', 'not java {')
+
+    # Assert
+    assert get_validator('java') is None
+    assert error is None
+
+def test_strip_fence_removes_markdown_fences():
+    # Act
+    code = strip_fence('```bash\nls -la\n```\n')
+
+    # Assert
+    assert code == 'ls -la'
+    assert strip_fence('ls ```') == 'ls ```'
+
+def test_validate_all_checks_every_candidate():
+    # Arrange
+    validator = get_validator('python')
+
+    # Act
+    errors = validate_all(validator, ['print(1)', 'def (', '```python\nx = 1\n```'])
+
+    # Assert
+    assert errors[0] is None
+    assert errors[1]
+    assert errors[2] is None
+
+def test_validation_timeouts_are_errors():
+    if not shutil.which('sleep'):
+        pytest.skip('sleep is not installed')
+
+    # Act
+    error = _run(['sleep', '5'], '', 0.1)
+
+    # Assert
+    assert error == 'validation timed out after 0.1 seconds'
@@ -0,0 +1,99 @@
+# Copyright (c) 2023 Johnathan P. Irvin and contributors
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+import os
+
+import pytest
+
+from shell_craft.watcher import FileWatcher
+
+
+@pytest.fixture(params=[True, False], ids=["inotify", "polling"])
+def use_inotify(request) -> bool:
+    return request.param
+
+def touch(path, content: str = "{}") -> None:
+    mtime = path.stat().st_mtime_ns if path.exists() else 0
+    path.write_text(content)
+    os.utime(path, ns=(0, mtime + 1_000_000_000))
+
+def test_unchanged_files_are_not_reported(tmp_path, use_inotify):
+    # Arrange
+    touch(tmp_path / "config.json")
+    watcher = FileWatcher([str(tmp_path / "config.json")], use_inotify)
+
+    # Act
+    changed = watcher.changed()
+
+    # Assert
+    watcher.close()
+    assert not changed
+
+def test_written_files_are_reported_once(tmp_path, use_inotify):
+    # Arrange
+    path = tmp_path / "config.json"
+    touch(path)
+    watcher = FileWatcher([str(path)], use_inotify)
+
+    # Act
+    touch(path, '{"openai_model": "gpt-4"}')
+    first, second = watcher.changed(), watcher.changed()
+
+    # Assert
+    watcher.close()
+    assert (first, second) == (True, False)
+
+def test_replaced_and_created_files_are_reported(tmp_path, use_inotify):
+    # Arrange
+    path = tmp_path / "config.json"
+    watcher = FileWatcher([str(path)], use_inotify)
+
+    # Act
+    touch(tmp_path / "config.json.tmp")
+    os.replace(tmp_path / "config.json.tmp", path)
+
+    # Assert
+    assert watcher.changed()
+    watcher.close()
+
+def test_other_files_are_ignored(tmp_path, use_inotify):
+    # Arrange
+    watcher = FileWatcher([str(tmp_path / "config.json")], use_inotify)
+
+    # Act
+    touch(tmp_path / "other.json")
+
+    # Assert
+    assert not watcher.changed()
+    watcher.close()
+
+def test_files_in_missing_directories_are_polled(tmp_path):
+    # Arrange
+    path = tmp_path / "missing" / "config.json"
+    watcher = FileWatcher([str(path)])
+
+    # Act
+    path.parent.mkdir()
+    touch(path)
+
+    # Assert
+    assert watcher.polling
+    assert watcher.changed()
+    watcher.close()